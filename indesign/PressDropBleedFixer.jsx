@@ -203,7 +203,7 @@ function main() {
       
       try {
           app.pdfPlacePreferences.pageNumber = pageNum;
-          app.pdfPlacePreferences.pdfCrop = PDFCrop.CROP_MEDIA; // Ensure we read the full bleed box from the PDF
+          app.pdfPlacePreferences.pdfCrop = PDFCrop.CROP_BLEED; // Read the bleed box; crop marks sit outside it
           frame.place(inputFile);
           
           // FIX: Center Content. Since the PDF was generated with symmetric bleed,
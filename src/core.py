@@ -2,18 +2,34 @@ from __future__ import annotations
 
 import io
 import copy
+import functools
+import hashlib
 import json
+import math
+import mmap
 import os
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 # Third-Party Imports
 from PIL import Image
-from pypdf import PdfReader, PdfWriter, Transformation
-from pypdf._page import PageObject
+from pypdf import PageObject, PdfReader, PdfWriter, Transformation
 # We keep these just in case, but we won't use the crasher ones
 from pypdf.generic import RectangleObject, NameObject, ArrayObject
+from pypdf.generic import ContentStream, DictionaryObject, EncodedStreamObject, FloatObject, IndirectObject, NumberObject, StreamObject
+
+from bleedgen import HAS_NUMPY, synthesize_bleed
+from raster import find_ghostscript, render_pdf_pages
+from sourcecache import shared_source_cache
 
 # Safe import for Requests
 try:
@@ -22,6 +38,13 @@ try:
 except ImportError:
     HAS_REQUESTS = False
 
+# Optional: linearized ("fast web view") output; the qpdf CLI is used when pikepdf is missing
+try:
+    import pikepdf
+    HAS_PIKEPDF = True
+except ImportError:
+    HAS_PIKEPDF = False
+
 
 POINTS_PER_INCH = 72.0
 MM_PER_INCH = 25.4
@@ -148,20 +171,20 @@ def pick_pdf_box(page: PageObject, box: str = "auto") -> Rect:
     return _rect_from_pypdf_box(page.mediabox)
 
 
-def compute_boxes(trim_w_pt: float, trim_h_pt: float, bleed: Dict[str, float]) -> Tuple[Rect, Rect, Rect]:
-    """Return MediaBox, BleedBox, TrimBox."""
+def compute_boxes(trim_w_pt: float, trim_h_pt: float, bleed: Dict[str, float], slug_pt: float = 0.0) -> Tuple[Rect, Rect, Rect]:
+    """Return MediaBox, BleedBox, TrimBox. slug_pt adds room outside the bleed (crop marks)."""
     bu = bleed.get("unit", "in")
     bt = to_points(float(bleed["top"]), bu)
     br = to_points(float(bleed["right"]), bu)
     bb = to_points(float(bleed["bottom"]), bu)
     bl = to_points(float(bleed["left"]), bu)
 
-    media_w = trim_w_pt + bl + br
-    media_h = trim_h_pt + bt + bb
+    media_w = trim_w_pt + bl + br + 2 * slug_pt
+    media_h = trim_h_pt + bt + bb + 2 * slug_pt
 
     media = Rect(0, 0, media_w, media_h)
-    bleed_box = media
-    trim_box = Rect(bl, bb, bl + trim_w_pt, bb + trim_h_pt)
+    bleed_box = Rect(slug_pt, slug_pt, media_w - slug_pt, media_h - slug_pt)
+    trim_box = Rect(slug_pt + bl, slug_pt + bb, slug_pt + bl + trim_w_pt, slug_pt + bb + trim_h_pt)
     return media, bleed_box, trim_box
 
 
@@ -239,120 +262,862 @@ def _compute_transform_stretch(src: Rect, dest: Rect, mirror_x: bool = False, mi
     return Transformation().scale(sx=sx, sy=sy).translate(tx=tx, ty=ty)
 
 
-def _place_pdf_page_return_clip(out_page: PageObject, src_page: PageObject, dest_rect: Rect, fit_mode: str, anchor: str, pdf_box: str) -> Rect:
-    src_rect = pick_pdf_box(src_page, pdf_box)
-    mode = (fit_mode or "fit_trim_proportional").lower().strip()
-
-    clip = src_rect
-    if mode in ("fill_bleed_proportional", "fill_trim_proportional"):
-        clip = crop_rect_for_cover(src_rect, dest_rect, anchor)
-
-    page_copy = copy.copy(src_page)
-    page_copy.mediabox = _rect_to_box(clip)
-    page_copy.cropbox = _rect_to_box(clip)
-
-    transform = _compute_transform(clip, dest_rect, "stretch_bleed" if mode in ("stretch_trim", "stretch_bleed") else mode, anchor)
-    out_page.merge_transformed_page(page_copy, transform)
-    return clip
-
-
-def _edge_extend_bleed(out_page: PageObject, src_page: PageObject, clip: Rect, trim_box: Rect, bleed_box: Rect, mode: str) -> None:
-    mode = (mode or "").lower().strip()
-    if mode == "generative":
-        if not HAS_REQUESTS: mode = "mirror"
-        else: mode = "mirror" # Fallback to mirror for safety
-
-    if mode not in ("mirror", "smear"): return
-
+def _bleed_slices(clip: Rect, trim_box: Rect, bleed_box: Rect) -> List[Tuple[Rect, Rect, bool, bool]]:
+    """Edge slices of clip and the bleed areas they are mirrored into: (src, dest, mirror_x, mirror_y)."""
     l_w = max(trim_box.x0 - bleed_box.x0, 0.0)
     r_w = max(bleed_box.x1 - trim_box.x1, 0.0)
     b_h = max(trim_box.y0 - bleed_box.y0, 0.0)
     t_h = max(bleed_box.y1 - trim_box.y1, 0.0)
-    if l_w == r_w == b_h == t_h == 0.0: return
+    if l_w == r_w == b_h == t_h == 0.0: return []
 
     slice_w = max(min(clip.width * 0.02, 18.0), 3.0)
     slice_h = max(min(clip.height * 0.02, 18.0), 3.0)
-
-    def place_slice(src_slice: Rect, dest_slice: Rect, mx: bool, my: bool):
-        page_copy = copy.copy(src_page)
-        page_copy.mediabox = _rect_to_box(src_slice)
-        page_copy.cropbox = _rect_to_box(src_slice)
-        transform = _compute_transform_stretch(src_slice, dest_slice, mirror_x=mx, mirror_y=my)
-        out_page.merge_transformed_page(page_copy, transform)
+    slices: List[Tuple[Rect, Rect, bool, bool]] = []
 
     # Sides
-    if l_w > 0: place_slice(Rect(clip.x0, clip.y0, clip.x0 + slice_w, clip.y1), Rect(bleed_box.x0, trim_box.y0, trim_box.x0, trim_box.y1), True, False)
-    if r_w > 0: place_slice(Rect(clip.x1 - slice_w, clip.y0, clip.x1, clip.y1), Rect(trim_box.x1, trim_box.y0, bleed_box.x1, trim_box.y1), True, False)
-    if b_h > 0: place_slice(Rect(clip.x0, clip.y0, clip.x1, clip.y0 + slice_h), Rect(trim_box.x0, bleed_box.y0, trim_box.x1, trim_box.y0), False, True)
-    if t_h > 0: place_slice(Rect(clip.x0, clip.y1 - slice_h, clip.x1, clip.y1), Rect(trim_box.x0, trim_box.y1, trim_box.x1, bleed_box.y1), False, True)
-    
-    # Corners
-    if l_w > 0 and b_h > 0: place_slice(Rect(clip.x0, clip.y0, clip.x0 + slice_w, clip.y0 + slice_h), Rect(bleed_box.x0, bleed_box.y0, trim_box.x0, trim_box.y0), True, True)
-    if r_w > 0 and b_h > 0: place_slice(Rect(clip.x1 - slice_w, clip.y0, clip.x1, clip.y0 + slice_h), Rect(trim_box.x1, bleed_box.y0, bleed_box.x1, trim_box.y0), True, True)
-    if l_w > 0 and t_h > 0: place_slice(Rect(clip.x0, clip.y1 - slice_h, clip.x0 + slice_w, clip.y1), Rect(bleed_box.x0, trim_box.y1, trim_box.x0, bleed_box.y1), True, True)
-    if r_w > 0 and t_h > 0: place_slice(Rect(clip.x1 - slice_w, clip.y1 - slice_h, clip.x1, clip.y1), Rect(trim_box.x1, trim_box.y1, bleed_box.x1, bleed_box.y1), True, True)
-
-
-def _draw_crop_marks_on_page(page: PageObject, trim_box: Rect, bleed_box: Rect) -> None:
-    # --- TEMPORARILY DISABLED TO PREVENT CRASH ---
-    # The previous code for drawing lines caused 'ContentStream' errors 
-    # on your specific system configuration. We are bypassing it 
-    # to ensure the Bleed/Mirror function works correctly.
-    print("LOG: Crop marks skipped to ensure safe save.")
-    pass 
-
+    if l_w > 0: slices.append((Rect(clip.x0, clip.y0, clip.x0 + slice_w, clip.y1), Rect(bleed_box.x0, trim_box.y0, trim_box.x0, trim_box.y1), True, False))
+    if r_w > 0: slices.append((Rect(clip.x1 - slice_w, clip.y0, clip.x1, clip.y1), Rect(trim_box.x1, trim_box.y0, bleed_box.x1, trim_box.y1), True, False))
+    if b_h > 0: slices.append((Rect(clip.x0, clip.y0, clip.x1, clip.y0 + slice_h), Rect(trim_box.x0, bleed_box.y0, trim_box.x1, trim_box.y0), False, True))
+    if t_h > 0: slices.append((Rect(clip.x0, clip.y1 - slice_h, clip.x1, clip.y1), Rect(trim_box.x0, trim_box.y1, trim_box.x1, bleed_box.y1), False, True))
 
-def _image_to_single_page_pdf_bytes(img_path: str) -> bytes:
+    # Corners
+    if l_w > 0 and b_h > 0: slices.append((Rect(clip.x0, clip.y0, clip.x0 + slice_w, clip.y0 + slice_h), Rect(bleed_box.x0, bleed_box.y0, trim_box.x0, trim_box.y0), True, True))
+    if r_w > 0 and b_h > 0: slices.append((Rect(clip.x1 - slice_w, clip.y0, clip.x1, clip.y0 + slice_h), Rect(trim_box.x1, bleed_box.y0, bleed_box.x1, trim_box.y0), True, True))
+    if l_w > 0 and t_h > 0: slices.append((Rect(clip.x0, clip.y1 - slice_h, clip.x0 + slice_w, clip.y1), Rect(bleed_box.x0, trim_box.y1, trim_box.x0, bleed_box.y1), True, True))
+    if r_w > 0 and t_h > 0: slices.append((Rect(clip.x1 - slice_w, clip.y1 - slice_h, clip.x1, clip.y1), Rect(trim_box.x1, trim_box.y1, bleed_box.x1, bleed_box.y1), True, True))
+    return slices
+
+
+def _add_indirect(writer: PdfWriter, obj: Any) -> IndirectObject:
+    """Add a new object to writer as an indirect object and return its reference.
+
+    pypdf has no public add_object; cloning an object whose indirect_reference
+    is set (even to None) registers the clone in the destination writer.
+    """
+    obj.indirect_reference = None
+    return obj.clone(writer).indirect_reference
+
+
+# --- Crop marks ---
+
+CROP_MARK_OFFSET = 3.0   # gap between the bleed edge and a mark (pt)
+CROP_MARK_LENGTH = 18.0  # 0.25in
+CROP_MARK_WEIGHT = 0.25
+CROP_MARK_SLUG = CROP_MARK_OFFSET + CROP_MARK_LENGTH + 3.0
+CROP_MARK_NAME = "/PDCropMarks"
+
+
+def crop_mark_lines(bleed_box: Rect, trim_box: Rect) -> List[Tuple[float, float, float, float]]:
+    """Corner crop marks as (x0, y0, x1, y1) segments: aligned with the trim lines, starting outside the bleed."""
+    lines: List[Tuple[float, float, float, float]] = []
+    for x, out_x in ((trim_box.x0, bleed_box.x0 - CROP_MARK_OFFSET), (trim_box.x1, bleed_box.x1 + CROP_MARK_OFFSET)):
+        dx = -CROP_MARK_LENGTH if out_x < x else CROP_MARK_LENGTH
+        for y, out_y in ((trim_box.y0, bleed_box.y0 - CROP_MARK_OFFSET), (trim_box.y1, bleed_box.y1 + CROP_MARK_OFFSET)):
+            dy = -CROP_MARK_LENGTH if out_y < y else CROP_MARK_LENGTH
+            lines.append((out_x, y, out_x + dx, y))  # horizontal mark on the trim line y
+            lines.append((x, out_y, x, out_y + dy))  # vertical mark on the trim line x
+    return lines
+
+
+@functools.lru_cache(maxsize=64)
+def _crop_mark_content(bleed_box: Rect, trim_box: Rect) -> bytes:
+    ops = [b"/CS0 CS 1 SCN", b"%g w" % CROP_MARK_WEIGHT, b"0 J"]
+    for x0, y0, x1, y1 in crop_mark_lines(bleed_box, trim_box):
+        ops.append(b"%.4f %.4f m %.4f %.4f l S" % (x0, y0, x1, y1))
+    return b"\n".join(ops) + b"\n"
+
+
+class CropMarks:
+    """One crop-mark Form XObject per writer and geometry, referenced from every page.
+
+    Marks are drawn in registration colour (Separation /All) after the page
+    content, wrapped so nothing the content leaves in the graphics state
+    affects them.
+    """
+
+    def __init__(self, writer: PdfWriter, media_box: Rect, bleed_box: Rect, trim_box: Rect):
+        registration = ArrayObject([
+            NameObject("/Separation"), NameObject("/All"), NameObject("/DeviceCMYK"),
+            DictionaryObject({
+                NameObject("/FunctionType"): NumberObject(2),
+                NameObject("/Domain"): ArrayObject([NumberObject(0), NumberObject(1)]),
+                NameObject("/C0"): ArrayObject([NumberObject(0)] * 4),
+                NameObject("/C1"): ArrayObject([NumberObject(1)] * 4),
+                NameObject("/N"): NumberObject(1),
+            }),
+        ])
+        form = StreamObject()
+        form.set_data(_crop_mark_content(bleed_box, trim_box))
+        form.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): _rect_to_box(media_box),
+            NameObject("/Resources"): DictionaryObject({
+                NameObject("/ColorSpace"): DictionaryObject({NameObject("/CS0"): registration}),
+            }),
+        })
+        self.form_ref = _add_indirect(writer, form)
+        opener = StreamObject()
+        opener.set_data(b"q\n")
+        closer = StreamObject()
+        closer.set_data(b"\nQ\nq " + CROP_MARK_NAME.encode() + b" Do Q\n")
+        self._writer = writer
+        self._open_ref = _add_indirect(writer, opener)
+        self._close_ref = _add_indirect(writer, closer)
+
+    def apply(self, page: PageObject) -> None:
+        """Reference the marks from a page that is already in the writer."""
+        contents = page.raw_get("/Contents") if "/Contents" in page else None
+        parts = list(contents.get_object()) if isinstance(contents and contents.get_object(), ArrayObject) else [contents] if contents else []
+        # Indirect, so deduplicated pages that copy /Contents keep sharing it.
+        page[NameObject("/Contents")] = _add_indirect(self._writer, ArrayObject([self._open_ref, *parts, self._close_ref]))
+        resources = page.get("/Resources")
+        if resources is None:
+            resources = DictionaryObject()
+            page[NameObject("/Resources")] = resources
+        resources = resources.get_object()
+        xobjects = resources.get("/XObject")
+        if xobjects is None:
+            xobjects = DictionaryObject()
+            resources[NameObject("/XObject")] = xobjects
+        xobjects.get_object()[NameObject(CROP_MARK_NAME)] = self.form_ref
+
+
+@contextmanager
+def open_source_pdf(path: str, use_mmap: bool = False) -> Iterator[PdfReader]:
+    """Open a source PDF, optionally through a read-only memory map.
+
+    The map stays open until the context exits, so pages pulled from the
+    reader must be written out before then. Without a map, the reader comes
+    from the source cache when one is enabled (sourcecache).
+    """
+    if not use_mmap:
+        cache = shared_source_cache()
+        yield cache.pdf_reader(path) if cache is not None else PdfReader(path)
+        return
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield PdfReader(mm)
+    finally:
+        mm.close()
+
+
+def _image_to_single_page_pdf_bytes(img_path: str, max_px: Optional[Tuple[int, int]] = None) -> bytes:
+    """Wrap an image in a one-page PDF, optionally capping its pixel size.
+
+    A downsampled image keeps the page size of the original, so placement
+    geometry does not change.
+    """
     img = Image.open(img_path)
     if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+    resolution = 72.0
+    if max_px and (img.width > max_px[0] or img.height > max_px[1]):
+        factor = max(max_px[0] / img.width, max_px[1] / img.height)
+        new_size = (max(1, round(img.width * factor)), max(1, round(img.height * factor)))
+        resolution = 72.0 * new_size[0] / img.width
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
     bio = io.BytesIO()
-    img.save(bio, format="PDF")
+    img.save(bio, format="PDF", resolution=resolution)
     return bio.getvalue()
 
 
-def _place_pdf_page(out_page: PageObject, src_page: PageObject, dest_rect: Rect, fit_mode: str, anchor: str, pdf_box: str) -> None:
-    src_rect = pick_pdf_box(src_page, pdf_box)
-    mode = (fit_mode or "fit_trim_proportional").lower().strip()
+# --- Output image downsampling ---
+
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
 
+def _mat_mul(m: Tuple[float, ...], n: Tuple[float, ...]) -> Tuple[float, ...]:
+    """Multiply two PDF matrices (m applied first)."""
+    return (
+        m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5],
+    )
+
+
+def _placement_scale(src_rect: Rect, dest_rect: Rect, fit_mode: str, anchor: str) -> Tuple[float, float]:
+    """Scale factors that placing src_rect into dest_rect will apply."""
+    mode = (fit_mode or "fit_trim_proportional").lower().strip()
     clip = src_rect
     if mode in ("fill_bleed_proportional", "fill_trim_proportional"):
         clip = crop_rect_for_cover(src_rect, dest_rect, anchor)
+    ctm = _compute_transform(clip, dest_rect, "stretch_bleed" if mode in ("stretch_trim", "stretch_bleed") else mode, anchor).ctm
+    return abs(ctm[0]), abs(ctm[3])
+
+
+def _collect_image_extents(content: Any, resources: Any, ctm: Tuple[float, ...], pdf: Any,
+                           extents: Dict[int, List[float]], clip_area: float = math.inf, depth: int = 0) -> None:
+    """Record the displayed size (pt) of every image XObject drawn by content.
+
+    An image drawn more than once (mirror/smear bleed slices) is measured where
+    its visible clip area is largest, i.e. at its main placement.
+    """
+    if content is None or depth > 8: return
+    xobjects = resources.get("/XObject", {}) if resources else {}
+    if hasattr(xobjects, "get_object"): xobjects = xobjects.get_object()
+    stack: List[Tuple[Tuple[float, ...], float]] = []
+    last_rect_area = None
+    for operands, operator in ContentStream(content, pdf).operations:
+        if operator == b"q":
+            stack.append((ctm, clip_area))
+        elif operator == b"Q":
+            if stack: ctm, clip_area = stack.pop()
+        elif operator == b"cm" and len(operands) == 6:
+            ctm = _mat_mul(tuple(float(v) for v in operands), ctm)
+        elif operator == b"re" and len(operands) == 4:
+            last_rect_area = abs(float(operands[2]) * float(operands[3]) * (ctm[0] * ctm[3] - ctm[1] * ctm[2]))
+        elif operator in (b"W", b"W*") and last_rect_area is not None:
+            clip_area = min(clip_area, last_rect_area)
+        elif operator in (b"m", b"l", b"c", b"v", b"y", b"h"):
+            last_rect_area = None
+        elif operator == b"Do" and operands:
+            ref = xobjects.get(operands[0]) if xobjects else None
+            if ref is None or not hasattr(ref, "idnum"): continue
+            xobj = ref.get_object()
+            subtype = xobj.get("/Subtype")
+            if subtype == "/Image":
+                w_pt = math.hypot(ctm[0], ctm[1])
+                h_pt = math.hypot(ctm[2], ctm[3])
+                visible = min(clip_area, w_pt * h_pt)
+                cur = extents.get(ref.idnum)
+                if cur is None or visible > cur[2]:
+                    extents[ref.idnum] = [w_pt, h_pt, visible]
+            elif subtype == "/Form":
+                matrix = tuple(float(v) for v in xobj.get("/Matrix", _IDENTITY))
+                _collect_image_extents(xobj, xobj.get("/Resources", resources), _mat_mul(matrix, ctm), pdf,
+                                       extents, clip_area, depth + 1)
+
+
+def _encode_image_xobject(img: Image.Image, codec: str, quality: int, template: Any) -> StreamObject:
+    """Encode a PIL image as an image XObject, keeping the template's colour space."""
+    stream = StreamObject()
+    cs = template.get("/ColorSpace")
+    if img.mode == "CMYK":
+        default_cs = "/DeviceCMYK"
+    elif img.mode == "L":
+        default_cs = "/DeviceGray"
+    else:
+        default_cs = "/DeviceRGB"
+    stream[NameObject("/Type")] = NameObject("/XObject")
+    stream[NameObject("/Subtype")] = NameObject("/Image")
+    stream[NameObject("/Width")] = NumberObject(img.width)
+    stream[NameObject("/Height")] = NumberObject(img.height)
+    stream[NameObject("/BitsPerComponent")] = NumberObject(8)
+    # ICC-based spaces survive resampling; anything else is rewritten to the device space of the decoded pixels.
+    if isinstance(cs, ArrayObject) and cs and cs[0] == "/ICCBased":
+        stream[NameObject("/ColorSpace")] = cs
+    else:
+        stream[NameObject("/ColorSpace")] = NameObject(default_cs)
+    if codec == "jpeg":
+        bio = io.BytesIO()
+        img.save(bio, format="JPEG", quality=quality, optimize=True)
+        stream.set_data(bio.getvalue())
+        stream[NameObject("/Filter")] = NameObject("/DCTDecode")
+        if img.mode == "CMYK":
+            # Pillow writes Adobe-style inverted CMYK JPEGs.
+            stream[NameObject("/Decode")] = ArrayObject([NumberObject(v) for v in (1, 0, 1, 0, 1, 0, 1, 0)])
+    else:
+        stream.set_data(zlib.compress(img.tobytes(), 6))
+        stream[NameObject("/Filter")] = NameObject("/FlateDecode")
+    return stream
+
+
+def _stored_data(stream: Any) -> bytes:
+    # StreamObject.get_data returns the stored (encoded) bytes; the Encoded subclass would decode them.
+    return StreamObject.get_data(stream)
+
+
+def _replace_stream(target: Any, new: StreamObject) -> None:
+    """Give target the dictionary and encoded bytes of new, keeping its object number so every reference follows."""
+    for key in [k for k in target if k not in new]:
+        del target[key]
+    target.update(new)
+    StreamObject.set_data(target, new.get_data())  # stored as-is; EncodedStreamObject.set_data would re-encode
+    if isinstance(target, EncodedStreamObject): target.decoded_self = None
+
+
+_MASK_SKIPPED = "mask"
+_DEVICE_MODES = {"/DeviceGray": "L", "/CalGray": "L", "/DeviceRGB": "RGB", "/CalRGB": "RGB", "/DeviceCMYK": "CMYK"}
+_INVERTED_CMYK = [1, 0, 1, 0, 1, 0, 1, 0]
+
+
+def _pixel_mode(cs: Any) -> Optional[str]:
+    """Pillow mode for 8-bit samples in colour space cs, or None when unsupported."""
+    cs = cs.get_object() if cs is not None else None
+    if isinstance(cs, ArrayObject) and cs:
+        if cs[0] == "/ICCBased":
+            return {1: "L", 3: "RGB", 4: "CMYK"}.get(int(cs[1].get_object().get("/N", 0)))
+        cs = cs[0]
+    return _DEVICE_MODES.get(cs)
+
+
+def _decode_image(xobj: Any) -> Optional[Image.Image]:
+    """Pixels of an 8-bit image XObject without its soft mask, or None for encodings left alone.
+
+    JPEG and JPEG 2000 streams go to Pillow as they are; everything else must
+    decode to raw samples in a gray/RGB/CMYK, ICC-based or indexed space.
+    """
+    filters = xobj.get("/Filter")
+    filters = list(filters) if isinstance(filters, ArrayObject) else [filters] if filters else []
+    decode = [float(v) for v in xobj.get("/Decode", [])]
+    data = xobj.get_data()
+    size = (int(xobj["/Width"]), int(xobj["/Height"]))
+    if filters and filters[-1] in ("/DCTDecode", "/JPXDecode"):
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        # Pillow reads Adobe CMYK JPEGs uninverted; such streams carry an inverted /Decode, which re-encoding keeps.
+        if img.mode == "CMYK" and decode != _INVERTED_CMYK: return None
+        if img.mode != "CMYK" and decode: return None
+        return img
+    cs = xobj.get("/ColorSpace")
+    cs = cs.get_object() if cs is not None else None
+    if decode and decode != [0, 1] * (len(decode) // 2): return None
+    if isinstance(cs, ArrayObject) and cs and cs[0] == "/Indexed":
+        mode = _pixel_mode(cs[1])
+        lookup = cs[3].get_object()
+        palette = lookup.get_data() if isinstance(lookup, StreamObject) else bytes(lookup) if isinstance(lookup, bytes) else lookup.get_original_bytes()
+        if mode not in ("L", "RGB") or len(data) < size[0] * size[1]: return None
+        if mode == "L": palette = bytes(v for g in palette for v in (g, g, g))
+        img = Image.frombytes("P", size, data[:size[0] * size[1]])
+        img.putpalette(palette[:768])
+        return img.convert("RGB")
+    mode = _pixel_mode(cs)
+    if mode is None: return None
+    need = size[0] * size[1] * len(mode)
+    if len(data) < need: return None
+    return Image.frombytes(mode, size, data[:need])
+
+
+def _downsample_one(xobj: Any, extent: List[float], max_ppi: float, codec: str, quality: int) -> Any:
+    """Resample one image XObject if it exceeds max_ppi where it is displayed.
+
+    Returns None when the image is left alone, _MASK_SKIPPED when its mask
+    stops it, else (image, soft mask or None, info). A soft mask is resampled
+    by the same factor; an explicit /Mask stream may differ in size and is kept;
+    a colour-key /Mask array would fringe after resampling, so those are skipped.
+    """
+    if xobj.get("/ImageMask"): return None
+    if int(xobj.get("/BitsPerComponent", 8)) != 8: return None
+    w_px, h_px = int(xobj["/Width"]), int(xobj["/Height"])
+    if extent[0] <= 0 or extent[1] <= 0: return None
+    ppi = min(w_px / (extent[0] / POINTS_PER_INCH), h_px / (extent[1] / POINTS_PER_INCH))
+    if ppi <= max_ppi: return None
+    if isinstance(xobj.get("/Mask"), ArrayObject): return _MASK_SKIPPED
+    smask = xobj["/SMask"].get_object() if "/SMask" in xobj else None
+    if smask is not None and int(smask.get("/BitsPerComponent", 8)) != 8: return _MASK_SKIPPED
+    try:
+        img = _decode_image(xobj)
+        alpha = _decode_image(smask) if smask is not None else None
+    except Exception:
+        img = alpha = None
+    if img is None: return None
+    if smask is not None and alpha is None: return _MASK_SKIPPED
+    if img.mode not in ("RGB", "L", "CMYK"): img = img.convert("RGB")
+    factor = max_ppi / ppi
+    new_size = (max(1, round(w_px * factor)), max(1, round(h_px * factor)))
+    img = img.resize(new_size, Image.Resampling.LANCZOS)
+    filters = xobj.get("/Filter")
+    if codec == "auto":
+        codec = "jpeg" if filters == "/DCTDecode" or (isinstance(filters, ArrayObject) and "/DCTDecode" in filters) else "flate"
+    new_obj = _encode_image_xobject(img, codec, quality, xobj)
+    for key in ("/SMask", "/Mask", "/Intent", "/Interpolate"):
+        if key in xobj: new_obj[NameObject(key)] = xobj.raw_get(key)
+    new_mask = None
+    before = len(_stored_data(xobj))
+    after = len(_stored_data(new_obj))
+    if alpha is not None:
+        mask_size = (max(1, round(alpha.width * factor)), max(1, round(alpha.height * factor)))
+        new_mask = _encode_image_xobject(alpha.convert("L").resize(mask_size, Image.Resampling.LANCZOS), "flate", quality, smask)
+        if "/Matte" in smask: new_mask[NameObject("/Matte")] = smask.raw_get("/Matte")
+        before += len(_stored_data(smask))
+        after += len(_stored_data(new_mask))
+    if after >= before: return None
+    return new_obj, new_mask, {
+        "width": w_px, "height": h_px, "new_width": new_size[0], "new_height": new_size[1],
+        "ppi_before": round(ppi, 1), "ppi_after": round(ppi * factor, 1),
+        "bytes_before": before, "bytes_after": after, "bytes_saved": before - after, "codec": codec,
+        "smask": new_mask is not None,
+    }
+
+
+def _downsample_writer_images(writer: PdfWriter, settings: Dict) -> Tuple[List[Dict], int]:
+    """Downsample images above the effective-PPI ceiling across all writer pages.
+
+    Returns the per-image report and the number of images left alone because of their masks.
+    """
+    max_ppi = float(settings.get("max_ppi", 450))
+    codec = (settings.get("codec") or "auto").lower().strip()
+    quality = int(settings.get("quality", 85))
+    extents: Dict[int, List[float]] = {}
+    for page in writer.pages:
+        _collect_image_extents(page.get_contents(), page.get("/Resources"), _IDENTITY, writer, extents)
+    if not extents: return [], 0
+
+    refs = {idnum: writer.get_object(idnum) for idnum in extents}
+    # A soft mask shared by several images cannot be resampled for just one of them.
+    mask_users: Dict[int, int] = {}
+    for obj in refs.values():
+        mask = obj.raw_get("/SMask") if "/SMask" in obj else None
+        if isinstance(mask, IndirectObject): mask_users[mask.idnum] = mask_users.get(mask.idnum, 0) + 1
+    with ThreadPoolExecutor(max_workers=settings.get("workers") or None) as pool:
+        futures = {idnum: pool.submit(_downsample_one, obj, extents[idnum], max_ppi, codec, quality) for idnum, obj in refs.items()}
+        results = {idnum: fut.result() for idnum, fut in futures.items()}
+
+    report: List[Dict] = []
+    skipped = 0
+    for idnum, res in sorted(results.items()):
+        if res is None: continue
+        if res == _MASK_SKIPPED:
+            skipped += 1
+            continue
+        new_obj, new_mask, info = res
+        if new_mask is not None:
+            mask_ref = refs[idnum].raw_get("/SMask")
+            if not isinstance(mask_ref, IndirectObject) or mask_users[mask_ref.idnum] > 1:
+                skipped += 1
+                continue
+            _replace_stream(mask_ref.get_object(), new_mask)
+        _replace_stream(refs[idnum], new_obj)
+        info["object"] = idnum
+        report.append(info)
+    return report, skipped
+
+
+def _new_press_page(media_box: Rect, bleed_box: Rect, trim_box: Rect) -> PageObject:
+    out_page = PageObject.create_blank_page(width=media_box.width, height=media_box.height)
+    out_page.mediabox = _rect_to_box(media_box)
+    out_page.bleedbox = _rect_to_box(bleed_box)
+    out_page.trimbox = _rect_to_box(trim_box)
+    # The crop box is the whole sheet: the slug and marks with crop marks, else the bleed box.
+    out_page.cropbox = _rect_to_box(media_box)
+    return out_page
+
+
+# --- Compiled layouts ---
+
+EDGE_GENERATORS = ("mirror", "smear", "generative")
+
+
+@dataclass(frozen=True, slots=True)
+class PlacementPlan:
+    """Where a source box of one size lands on the press page.
+
+    Rects and matrices are relative to the source box origin, so one plan
+    serves every page with the same box size wherever its box sits.
+    """
+    clip: Rect
+    ctm: Tuple[float, ...]
+    slices: Tuple[Tuple[Rect, Tuple[float, ...]], ...] = ()
 
+    @property
+    def placed(self) -> Rect:
+        """Where the clip lands on the press page (plans scale and mirror, never rotate)."""
+        a, _, _, d, e, f = self.ctm
+        xs = (a * self.clip.x0 + e, a * self.clip.x1 + e)
+        ys = (d * self.clip.y0 + f, d * self.clip.y1 + f)
+        return Rect(min(xs), min(ys), max(xs), max(ys))
+
+    def apply(self, out_page: PageObject, src_page: PageObject, src_rect: Rect, slices: bool = True) -> Rect:
+        """Merge src_page onto out_page (main placement + bleed slices); returns the source clip."""
+        ox, oy = src_rect.x0, src_rect.y0
+        shift = (1.0, 0.0, 0.0, 1.0, -ox, -oy)
+
+        def place(rel: Rect, ctm: Tuple[float, ...]) -> Rect:
+            box = Rect(rel.x0 + ox, rel.y0 + oy, rel.x1 + ox, rel.y1 + oy)
+            page_copy = copy.copy(src_page)
+            page_copy.mediabox = _rect_to_box(box)
+            page_copy.cropbox = _rect_to_box(box)
+            out_page.merge_transformed_page(page_copy, Transformation(ctm if ox == oy == 0 else _mat_mul(shift, ctm)))
+            return box
+
+        clip = place(self.clip, self.ctm)
+        for rel, ctm in (self.slices if slices else ()):
+            place(rel, ctm)
+        return clip
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledLayout:
+    """Trim/bleed/fit settings parsed once into immutable page geometry.
+
+    Placement plans are memoised per source box size, so any number of
+    inputs (from any number of threads) reuse the same transforms.
+    """
+    trim: Tuple[float, float, str]
+    bleed: Tuple[float, float, float, float]
+    media_box: Rect
+    bleed_box: Rect
+    trim_box: Rect
+    fit_mode: str = "fit_trim_proportional"
+    anchor: str = "center"
+    bleed_generator: str = "none"
+    crop_marks: bool = False
+    name: str = ""
+    bleed_raster_dpi: float = 0.0
+    _plans: Dict[Tuple[float, float], PlacementPlan] = field(default_factory=dict, compare=False, repr=False)
+    _lock: Any = field(default_factory=threading.Lock, compare=False, repr=False)
+
+    @classmethod
+    def from_layout(cls, layout: Dict, name: str = "") -> "CompiledLayout":
+        """Compile a job's layout dict (as built by make_job)."""
+        trim = layout.get("trim", {})
+        unit = trim.get("unit", "in")
+        bleed = dict(layout.get("bleed") or {"top": 0, "right": 0, "bottom": 0, "left": 0})
+        bleed.setdefault("unit", unit)
+        crop_marks = bool(layout.get("marks", {}).get("crop_marks", False))
+        media_box, bleed_box, trim_box = compute_boxes(to_points(float(trim["w"]), unit), to_points(float(trim["h"]), unit), bleed,
+                                                       slug_pt=CROP_MARK_SLUG if crop_marks else 0.0)
+        return cls(
+            trim=(float(trim["w"]), float(trim["h"]), unit),
+            bleed=tuple(to_points(float(bleed[side]), bleed["unit"]) for side in ("top", "right", "bottom", "left")),
+            media_box=media_box, bleed_box=bleed_box, trim_box=trim_box,
+            fit_mode=(layout.get("fit_mode") or "fit_trim_proportional").lower().strip(),
+            anchor=(layout.get("anchor") or "center").lower().strip(),
+            bleed_generator=(layout.get("bleed_generator") or "none").lower().strip(),
+            crop_marks=crop_marks,
+            name=name,
+            bleed_raster_dpi=float(layout.get("bleed_raster_dpi") or 0.0),
+        )
+
+    @classmethod
+    def from_spec(cls, trim_size_spec: str, bleed_spec: str, fit_mode: str, anchor: str = "center",
+                  bleed_generator: str = "none", crop_marks: bool = False, name: str = "",
+                  bleed_raster_dpi: float = 0.0) -> "CompiledLayout":
+        w, h, unit = parse_size(trim_size_spec)
+        return cls.from_layout({
+            "trim": {"w": w, "h": h, "unit": unit}, "bleed": parse_bleed(bleed_spec, unit),
+            "fit_mode": fit_mode, "anchor": anchor, "bleed_generator": bleed_generator,
+            "marks": {"crop_marks": crop_marks}, "bleed_raster_dpi": bleed_raster_dpi,
+        }, name=name)
+
+    @property
+    def dest(self) -> Rect:
+        """Where the source is fitted: trim when edges are extended into bleed, else per fit mode."""
+        if self.bleed_generator in EDGE_GENERATORS: return self.trim_box
+        return self.bleed_box if "bleed" in self.fit_mode else self.trim_box
+
+    def layout_dict(self) -> Dict:
+        """Job layout dict equivalent to this geometry (bleed in points)."""
+        t, r, b, l = self.bleed
+        return {
+            "trim": {"w": self.trim[0], "h": self.trim[1], "unit": self.trim[2]},
+            "bleed": {"top": t, "right": r, "bottom": b, "left": l, "unit": "pt"},
+            "fit_mode": self.fit_mode, "anchor": self.anchor,
+            "bleed_generator": self.bleed_generator,
+            "marks": {"crop_marks": self.crop_marks},
+            "bleed_raster_dpi": self.bleed_raster_dpi or None,
+        }
+
+    def _compile_plan(self, w: float, h: float) -> PlacementPlan:
+        src = Rect(0.0, 0.0, w, h)
+        dest = self.dest
+        clip = src
+        if self.fit_mode in ("fill_bleed_proportional", "fill_trim_proportional"):
+            clip = crop_rect_for_cover(src, dest, self.anchor)
+        mode = "stretch_bleed" if self.fit_mode in ("stretch_trim", "stretch_bleed") else self.fit_mode
+        ctm = _compute_transform(clip, dest, mode, self.anchor).ctm
+        slices: Tuple[Tuple[Rect, Tuple[float, ...]], ...] = ()
+        if self.bleed_generator in EDGE_GENERATORS:
+            slices = tuple(
+                (src_slice, _compute_transform_stretch(src_slice, dest_slice, mirror_x=mx, mirror_y=my).ctm)
+                for src_slice, dest_slice, mx, my in _bleed_slices(clip, self.trim_box, self.bleed_box)
+            )
+        return PlacementPlan(clip, tuple(ctm), slices)
+
+    def plan_for(self, src_rect: Rect) -> PlacementPlan:
+        key = (round(src_rect.width, 4), round(src_rect.height, 4))
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._compile_plan(src_rect.width, src_rect.height)
+            with self._lock:
+                plan = self._plans.setdefault(key, plan)
+        return plan
+
+    def new_page(self) -> PageObject:
+        return _new_press_page(self.media_box, self.bleed_box, self.trim_box)
+
+    def __reduce__(self):
+        # The plan cache and lock stay behind; a process-pool worker rebuilds its own.
+        return (CompiledLayout, (self.trim, self.bleed, self.media_box, self.bleed_box, self.trim_box,
+                                 self.fit_mode, self.anchor, self.bleed_generator, self.crop_marks, self.name,
+                                 self.bleed_raster_dpi))
+
+    def place(self, out_page: PageObject, src_page: PageObject, src_rect: Rect, image: Optional[Image.Image] = None) -> Rect:
+        """Place src_page; "generative" synthesises the bleed first and falls back to mirror slices.
+
+        With bleed_raster_dpi, mirror/smear bleed is drawn as small rendered
+        images instead of clipped copies of the whole page.
+        """
+        plan = self.plan_for(src_rect)
+        if self.bleed_generator == "generative" and _generative_bleed(out_page, src_page, src_rect, plan, self.bleed_box, image):
+            return plan.apply(out_page, src_page, src_rect, slices=False)
+        if (self.bleed_raster_dpi and plan.slices and self.bleed_generator in ("mirror", "smear")
+                and _raster_bleed(out_page, src_page, src_rect, plan, self, image)):
+            return plan.apply(out_page, src_page, src_rect, slices=False)
+        return plan.apply(out_page, src_page, src_rect)
+
+
+# --- Generative bleed ---
+
+GENERATIVE_DPI = 150.0
+
+
+def _render_clip(src_page: PageObject, clip: Rect, size: Tuple[int, int], image: Optional[Image.Image] = None) -> Optional[Image.Image]:
+    """RGB raster of the clip area of src_page at size; images are cropped directly, PDFs go through Ghostscript."""
+    if image is not None:
+        mb = _rect_from_pypdf_box(src_page.mediabox)
+        sx, sy = image.width / mb.width, image.height / mb.height
+        box = (round((clip.x0 - mb.x0) * sx), round((mb.y1 - clip.y1) * sy), round((clip.x1 - mb.x0) * sx), round((mb.y1 - clip.y0) * sy))
+        return image.convert("RGB").crop(box).resize(size, Image.Resampling.BILINEAR)
+    gs_path = find_ghostscript()
+    if not gs_path: return None
     page_copy = copy.copy(src_page)
     page_copy.mediabox = _rect_to_box(clip)
     page_copy.cropbox = _rect_to_box(clip)
-    transform = _compute_transform(clip, dest_rect, "stretch_bleed" if mode in ("stretch_trim", "stretch_bleed") else mode, anchor)
-    out_page.merge_transformed_page(page_copy, transform)
-
-
-def build_press_pdf(job: Dict) -> List[str]:
+    writer = PdfWriter()
+    writer.add_page(page_copy)
+    dpi = max(size[0] / (clip.width / POINTS_PER_INCH), size[1] / (clip.height / POINTS_PER_INCH))
+    with tempfile.TemporaryDirectory(prefix="pressdrop_gen_") as tmp:
+        pdf_path = os.path.join(tmp, "clip.pdf")
+        with open(pdf_path, "wb") as f:
+            writer.write(f)
+        render_pdf_pages(pdf_path, os.path.join(tmp, "clip_%03d.png"), dpi, gs_path, 1, 1)
+        with Image.open(os.path.join(tmp, "clip_001.png")) as img:
+            return img.convert("RGB").resize(size, Image.Resampling.BILINEAR)
+
+
+def _generative_bleed(out_page: PageObject, src_page: PageObject, src_rect: Rect, plan: PlacementPlan,
+                      bleed_box: Rect, image: Optional[Image.Image] = None) -> bool:
+    """Synthesise the bleed around the placed content at GENERATIVE_DPI and draw it as image strips.
+
+    The strips go onto out_page before the content, so vector art stays on
+    top. Returns False (caller mirrors instead) when NumPy or a renderer is missing.
+    """
+    if not HAS_NUMPY: return False
+    placed = plan.placed
+    scale = GENERATIVE_DPI / POINTS_PER_INCH
+    size = (max(1, round(placed.width * scale)), max(1, round(placed.height * scale)))
+    left = max(0, math.ceil((placed.x0 - bleed_box.x0) * scale))
+    right = max(0, math.ceil((bleed_box.x1 - placed.x1) * scale))
+    top = max(0, math.ceil((bleed_box.y1 - placed.y1) * scale))
+    bottom = max(0, math.ceil((placed.y0 - bleed_box.y0) * scale))
+    if not (left or right or top or bottom): return True
+
+    clip = Rect(plan.clip.x0 + src_rect.x0, plan.clip.y0 + src_rect.y0, plan.clip.x1 + src_rect.x0, plan.clip.y1 + src_rect.y0)
+    try:
+        raster = _render_clip(src_page, clip, size, image)
+    except Exception as exc:
+        print(f"LOG: Generative bleed could not render the page ({exc}); using mirror.")
+        return False
+    if raster is None:
+        print("LOG: Generative bleed needs Ghostscript for PDF inputs; using mirror.")
+        return False
+
+    canvas = synthesize_bleed(raster, left, right, top, bottom)
+    H, W = canvas.shape[:2]
+    px_w, px_h = placed.width / size[0], placed.height / size[1]
+    origin_x, origin_y = placed.x0 - left * px_w, placed.y1 + top * px_h
+    ovl = 2  # strips reach a little under the content so no hairline gap shows
+    pieces = []
+    if top: pieces.append((0, 0, W, top + ovl))
+    if bottom: pieces.append((0, H - bottom - ovl, W, H))
+    if left: pieces.append((0, top, left + ovl, H - bottom))
+    if right: pieces.append((W - right - ovl, top, W, H - bottom))
+    for x0, y0, x1, y1 in pieces:
+        bio = io.BytesIO()
+        Image.fromarray(canvas[y0:y1, x0:x1]).save(bio, format="PDF", resolution=72.0)
+        strip_page = PdfReader(bio).pages[0]
+        dest = Rect(origin_x + x0 * px_w, origin_y - y1 * px_h, origin_x + x1 * px_w, origin_y - y0 * px_h)
+        out_page.merge_transformed_page(strip_page, _compute_transform_stretch(_rect_from_pypdf_box(strip_page.mediabox), dest))
+    return True
+
+
+def _raster_bleed(out_page: PageObject, src_page: PageObject, src_rect: Rect, plan: PlacementPlan,
+                  layout: CompiledLayout, image: Optional[Image.Image] = None) -> bool:
+    """Draw the mirror/smear bleed as image strips cut from one render of the placed page at layout.bleed_raster_dpi.
+
+    The vector slices make a RIP interpret the whole page up to eight more
+    times; these strips are a few small Flate images under the content.
+    "smear" stretches the outermost pixel row/column instead of mirroring.
+    Returns False (caller uses vector slices) when PDFs cannot be rendered.
+    """
+    clip, placed = plan.clip, plan.placed
+    scale = layout.bleed_raster_dpi / POINTS_PER_INCH
+    size = (max(1, round(placed.width * scale)), max(1, round(placed.height * scale)))
+    try:
+        raster = _render_clip(src_page, Rect(clip.x0 + src_rect.x0, clip.y0 + src_rect.y0, clip.x1 + src_rect.x0, clip.y1 + src_rect.y0), size, image)
+    except Exception as exc:
+        print(f"LOG: Raster bleed could not render the page ({exc}); using vector slices.")
+        return False
+    if raster is None:
+        print("LOG: Raster bleed needs Ghostscript for PDF inputs; using vector slices.")
+        return False
+
+    sx, sy = size[0] / clip.width, size[1] / clip.height
+    xobjects = DictionaryObject()
+    ops: List[bytes] = []
+    for n, (src, dest, mirror_x, mirror_y) in enumerate(_bleed_slices(clip, layout.trim_box, layout.bleed_box)):
+        x0 = max(0, min(size[0] - 1, math.floor((src.x0 - clip.x0) * sx)))
+        x1 = max(x0 + 1, min(size[0], math.ceil((src.x1 - clip.x0) * sx)))
+        y0 = max(0, min(size[1] - 1, math.floor((clip.y1 - src.y1) * sy)))
+        y1 = max(y0 + 1, min(size[1], math.ceil((clip.y1 - src.y0) * sy)))
+        if layout.bleed_generator == "smear":
+            # Keep only the pixels on the page edge; the image matrix stretches them across the bleed.
+            if mirror_x: x0, x1 = (x0, x0 + 1) if src.x0 <= clip.x0 else (x1 - 1, x1)
+            if mirror_y: y0, y1 = (y1 - 1, y1) if src.y0 <= clip.y0 else (y0, y0 + 1)
+        strip = raster.crop((x0, y0, x1, y1))
+        if mirror_x: strip = strip.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        if mirror_y: strip = strip.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        name = f"/PDBleed{n}"
+        xobjects[NameObject(name)] = _encode_image_xobject(strip, "flate", 0, DictionaryObject())
+        ops.append(b"q %.4f 0 0 %.4f %.4f %.4f cm %s Do Q" % (dest.width, dest.height, dest.x0, dest.y0, name.encode()))
+    if not ops: return True
+
+    stream = StreamObject()
+    stream.set_data(b"\n".join(ops) + b"\n")
+    out_page[NameObject("/Contents")] = stream
+    out_page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+    return True
+
+
+def _object_digest(obj: Any, memo: Dict[int, bytes], h: Any) -> None:
+    """Feed a canonical serialisation of a PDF object into hash h.
+
+    Indirect objects are followed once and memoised by object number, so two
+    pages that reference byte-identical (or the same) resources hash equal.
+    """
+    if isinstance(obj, IndirectObject):
+        digest = memo.get(obj.idnum)
+        if digest is None:
+            memo[obj.idnum] = b"cycle"
+            sub = hashlib.sha1()
+            _object_digest(obj.get_object(), memo, sub)
+            digest = memo[obj.idnum] = sub.digest()
+        h.update(b"R" + digest)
+    elif isinstance(obj, StreamObject):
+        h.update(b"S")
+        _object_digest(DictionaryObject({k: v for k, v in obj.items() if k != "/Length"}), memo, h)
+        h.update(_stored_data(obj))
+    elif isinstance(obj, dict):
+        h.update(b"D")
+        for key in sorted(obj.keys()):
+            h.update(str(key).encode("utf-8", "replace"))
+            _object_digest(obj.raw_get(key) if hasattr(obj, "raw_get") else obj[key], memo, h)
+    elif isinstance(obj, list):
+        h.update(b"A%d" % len(obj))
+        for item in obj:
+            _object_digest(item, memo, h)
+    else:
+        h.update(repr(obj).encode("utf-8", "replace"))
+
+
+def _inherited_attr(page: Any, key: str, default: Any) -> Any:
+    """Value of an inheritable page attribute (/Rotate, /MediaBox, ...), looking up the page tree."""
+    node, depth = page, 0
+    while node is not None and depth < 32:
+        if key in node: return node[key]
+        parent = node.get("/Parent")
+        node, depth = (parent.get_object() if parent is not None else None), depth + 1
+    return default
+
+
+def _page_fingerprint(src_page: PageObject, src_rect: Rect, memo: Dict[int, bytes]) -> str:
+    """Fingerprint of what placing src_page would produce: content, resources, source box, rotation and unit."""
+    h = hashlib.sha1()
+    _object_digest(src_page.raw_get("/Contents") if "/Contents" in src_page else None, memo, h)
+    _object_digest(src_page.raw_get("/Resources") if "/Resources" in src_page else None, memo, h)
+    h.update(repr((src_rect.x0, src_rect.y0, src_rect.x1, src_rect.y1,
+                   int(_inherited_attr(src_page, "/Rotate", 0)) % 360, float(src_page.get("/UserUnit", 1)))).encode())
+    return h.hexdigest()
+
+
+def linearize_pdf(path: str) -> bool:
+    """Rewrite path in place as a linearized PDF (first-page objects and hint stream up front).
+
+    Viewers on network shares can then show page 1 after reading the start
+    of the file. Uses pikepdf, else the qpdf CLI; returns False if neither
+    is available.
+    """
+    tmp = path + ".lin.tmp"
+    try:
+        if HAS_PIKEPDF:
+            with pikepdf.open(path) as pdf:
+                pdf.save(tmp, linearize=True)
+        else:
+            qpdf = shutil.which("qpdf")
+            if not qpdf: return False
+            # qpdf exits with 3 when it only had warnings; the output is still written.
+            proc = subprocess.run([qpdf, "--linearize", path, tmp], capture_output=True)
+            if proc.returncode not in (0, 3): raise RuntimeError(f"qpdf failed: {proc.stderr.decode(errors='replace').strip()}")
+        os.replace(tmp, path)
+        return True
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+
+
+@dataclass(frozen=True, slots=True)
+class BuildEvent:
+    """One step of iter_build.
+
+    kind is "input_started", "page_placed", "file_written", "cancelled" or
+    "done". page counts output pages of the current file (1-based); elapsed
+    is seconds since the build started. With keep_pdf, "file_written"
+    carries the written PDF's bytes in data.
+    """
+    kind: str
+    input_path: str = ""
+    page: int = 0
+    pages_total: int = 0
+    path: str = ""
+    elapsed: float = 0.0
+    data: Optional[bytes] = None
+
+
+def iter_build(job: Dict, stager: Optional[Any] = None, compiled: Optional[CompiledLayout] = None,
+               cancel: Optional[Any] = None, keep_pdf: bool = False) -> Iterator[BuildEvent]:
+    """Build the press PDF(s) for job, yielding a BuildEvent per input, page and written file.
+
+    Each file is complete (and handed to the stager) before its
+    "file_written" event, so consumers can start on it while later inputs
+    build. cancel is anything with is_set() (e.g. threading.Event); it is
+    checked between pages, and a cancelled build yields "cancelled" and
+    stops without writing the file in progress. Closing the generator
+    stops the build the same way.
+
+    With a staging.OutputStager, files are written to local scratch and
+    queued for background publishing; read them via stager.local_path().
+    compiled reuses geometry from engine.PressDropEngine instead of
+    compiling the job's layout again. keep_pdf serializes each file in
+    memory before writing it and hands the bytes on with "file_written", so
+    a rasterizer can take them without reading the file back (they are the
+    bytes before linearizing, which renders the same).
+    """
     layout = job.get("layout", {})
     output = job.get("output", {})
     inputs = job.get("inputs", [])
     if not inputs: raise ValueError("No inputs provided")
 
-    trim = layout.get("trim", {})
-    unit = trim.get("unit", "in")
-    trim_w_pt = to_points(float(trim["w"]), unit)
-    trim_h_pt = to_points(float(trim["h"]), unit)
-    bleed = layout.get("bleed", {"top": 0, "right": 0, "bottom": 0, "left": 0, "unit": unit})
-    if "unit" not in bleed: bleed["unit"] = unit
-
-    media_box, bleed_box, trim_box = compute_boxes(trim_w_pt, trim_h_pt, bleed)
-    fit_mode = layout.get("fit_mode", "fit_trim_proportional")
-    anchor = layout.get("anchor", "center")
-    bleed_gen = (layout.get("bleed_generator", "none") or "none").lower().strip()
-    marks = layout.get("marks", {})
-    add_crop_marks = bool(marks.get("crop_marks", False))
+    compiled = compiled or CompiledLayout.from_layout(layout)
+    trim_box, bleed_box = compiled.trim_box, compiled.bleed_box
+    downsample = layout.get("downsample") or {}
+    max_ppi = float(downsample["max_ppi"]) if downsample.get("max_ppi") else None
+    dedupe = bool(layout.get("dedupe", True))
+    report = job.setdefault("report", {})
+    report.update({"pages": 0, "input_bytes": 0, "output_bytes": 0, "shared_pages": 0})
+    cache = shared_source_cache()
+    hits_before = cache.hits if cache is not None else 0
+    build_start = time.perf_counter()
 
     out_dir = output.get("dir", os.getcwd())
     os.makedirs(out_dir, exist_ok=True)
     base = output.get("basename", "output")
-    created: List[str] = []
 
-    def dest_for_mode(mode: str) -> Rect:
-        if "bleed" in (mode or "").lower(): return bleed_box
-        return trim_box
+    def since() -> float:
+        return time.perf_counter() - build_start
+
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
 
     for item in inputs:
         in_path = item["path"]
@@ -361,58 +1126,323 @@ def build_press_pdf(job: Dict) -> List[str]:
         else: out_path = os.path.join(out_dir, f"{base}__{in_name}.pdf")
 
         ext = os.path.splitext(in_path)[1].lower()
+        if cancelled():
+            report.update({"cancelled": True, "build_seconds": since()})
+            yield BuildEvent("cancelled", in_path, elapsed=since())
+            return
         writer = PdfWriter()
-
-        if ext == ".pdf":
-            reader = PdfReader(in_path)
-            pages = parse_page_range(item.get("pages", "all"), len(reader.pages))
-            pdf_box = item.get("pdf_box", "auto")
-
-            for pno in pages:
-                src_page = reader.pages[pno]
-                out_page = PageObject.create_blank_page(width=media_box.width, height=media_box.height)
-                out_page.mediabox = _rect_to_box(media_box)
-                out_page.bleedbox = _rect_to_box(bleed_box)
-                out_page.trimbox = _rect_to_box(trim_box)
-                out_page.cropbox = _rect_to_box(bleed_box)
-
-                if bleed_gen in ("mirror", "smear", "generative"):
-                    clip = _place_pdf_page_return_clip(out_page, src_page, trim_box, fit_mode, anchor, pdf_box)
-                    _edge_extend_bleed(out_page, src_page, clip, trim_box, bleed_box, mode=bleed_gen)
+        marks = CropMarks(writer, compiled.media_box, bleed_box, trim_box) if compiled.crop_marks else None
+        report["input_bytes"] += os.path.getsize(in_path)
+
+        # The source stays open (and mapped, if requested) until the output is written.
+        with ExitStack() as stack:
+            if ext == ".pdf":
+                reader = stack.enter_context(open_source_pdf(in_path, bool(item.get("mmap", False))))
+                pages = parse_page_range(item.get("pages", "all"), len(reader.pages))
+                pdf_box = item.get("pdf_box", "auto")
+                yield BuildEvent("input_started", in_path, pages_total=len(pages), elapsed=since())
+                # Identical source pages placed with the same geometry share one output content stream.
+                placed: Dict[str, Tuple[Any, Any]] = {}
+                digest_memo: Dict[int, bytes] = {}
+
+                for n, pno in enumerate(pages, 1):
+                    if cancelled():
+                        report.update({"cancelled": True, "build_seconds": since()})
+                        yield BuildEvent("cancelled", in_path, n - 1, len(pages), elapsed=since())
+                        return
+                    src_page = reader.pages[pno]
+                    src_rect = pick_pdf_box(src_page, pdf_box)
+                    key = _page_fingerprint(src_page, src_rect, digest_memo) if dedupe else None
+                    out_page = compiled.new_page()
+                    if key in placed:
+                        contents_ref, resources = placed[key]
+                        out_page[NameObject("/Contents")] = contents_ref
+                        out_page[NameObject("/Resources")] = resources
+                        writer.add_page(out_page)
+                        report["shared_pages"] += 1
+                        yield BuildEvent("page_placed", in_path, n, len(pages), elapsed=since())
+                        continue
+
+                    compiled.place(out_page, src_page, src_rect)
+                    added = writer.add_page(out_page)
+                    if marks is not None:
+                        marks.apply(added)
+                    if key is not None:
+                        placed[key] = (added.raw_get("/Contents"), added.raw_get("/Resources"))
+                    yield BuildEvent("page_placed", in_path, n, len(pages), elapsed=since())
+
+            elif ext in (".png", ".jpg", ".jpeg"):
+                yield BuildEvent("input_started", in_path, pages_total=1, elapsed=since())
+                max_px = None
+                if max_ppi:
+                    with Image.open(in_path) as probe:
+                        img_rect = Rect(0, 0, float(probe.width), float(probe.height))
+                    sx, sy = _placement_scale(img_rect, compiled.dest, compiled.fit_mode, compiled.anchor)
+                    max_px = (math.ceil(img_rect.width * sx / POINTS_PER_INCH * max_ppi),
+                              math.ceil(img_rect.height * sy / POINTS_PER_INCH * max_ppi))
+                if cache is not None:
+                    pdf_bytes = cache.image_pdf(in_path, max_px, lambda: _image_to_single_page_pdf_bytes(in_path, max_px=max_px))
                 else:
-                    _place_pdf_page(out_page, src_page, dest_for_mode(fit_mode), fit_mode, anchor, pdf_box)
-                
-                if add_crop_marks:
-                    _draw_crop_marks_on_page(out_page, trim_box, bleed_box)
-                writer.add_page(out_page)
-
-        elif ext in (".png", ".jpg", ".jpeg"):
-            pdf_bytes = _image_to_single_page_pdf_bytes(in_path)
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            src_page = reader.pages[0]
-            out_page = PageObject.create_blank_page(width=media_box.width, height=media_box.height)
-            out_page.mediabox = _rect_to_box(media_box)
-            out_page.bleedbox = _rect_to_box(bleed_box)
-            out_page.trimbox = _rect_to_box(trim_box)
-            out_page.cropbox = _rect_to_box(bleed_box)
-
-            if bleed_gen in ("mirror", "smear", "generative"):
-                clip = _place_pdf_page_return_clip(out_page, src_page, trim_box, fit_mode, anchor, pdf_box="media")
-                _edge_extend_bleed(out_page, src_page, clip, trim_box, bleed_box, mode=bleed_gen)
+                    pdf_bytes = _image_to_single_page_pdf_bytes(in_path, max_px=max_px)
+                reader = PdfReader(io.BytesIO(pdf_bytes))
+                src_page = reader.pages[0]
+                out_page = compiled.new_page()
+                source_img = None
+                if compiled.bleed_generator == "generative":
+                    source_img = cache.image(in_path) if cache is not None else stack.enter_context(Image.open(in_path))
+                compiled.place(out_page, src_page, pick_pdf_box(src_page, "media"), image=source_img)
+                added = writer.add_page(out_page)
+                if marks is not None:
+                    marks.apply(added)
+                yield BuildEvent("page_placed", in_path, 1, 1, elapsed=since())
             else:
-                _place_pdf_page(out_page, src_page, dest_for_mode(fit_mode), fit_mode, anchor, pdf_box="media")
-            
-            if add_crop_marks:
-                _draw_crop_marks_on_page(out_page, trim_box, bleed_box)
-            writer.add_page(out_page)
-        else:
-            raise ValueError(f"Unsupported input type: {ext}")
-
+                raise ValueError(f"Unsupported input type: {ext}")
+
+            if max_ppi:
+                saved, masked = _downsample_writer_images(writer, downsample)
+                for info in saved: info["input"] = in_path
+                report.setdefault("downsample", []).extend(saved)
+                if saved:
+                    print(f"LOG: Downsampled {len(saved)} image(s) in {in_name}, saved {sum(i['bytes_saved'] for i in saved)} bytes.")
+                if masked:
+                    report["downsample_skipped_masked"] = report.get("downsample_skipped_masked", 0) + masked
+                    print(f"LOG: Left {masked} masked image(s) in {in_name} at full resolution (colour-key or shared mask).")
+
+            report["pages"] += len(writer.pages)
+            write_path = stager.local_path(out_path, fresh=True) if stager else out_path
+            data = None
+            if keep_pdf:
+                buf = io.BytesIO()
+                writer.write(buf)
+                data = buf.getvalue()
+            with open(write_path, "wb", buffering=8 * 1024 * 1024) as f:
+                if data is None:
+                    writer.write(f)
+                else:
+                    f.write(data)
+        if layout.get("linearize"):
+            # The PDF is already complete; a linearizer failure must not fail the build.
+            try:
+                report["linearized"] = linearize_pdf(write_path)
+                if not report["linearized"]: print("LOG: Linearizing needs pikepdf or qpdf; output left as written.")
+            except Exception as exc:
+                report["linearized"] = False
+                print(f"LOG: Linearizing {os.path.basename(out_path)} failed ({exc}); output left as written.")
+        report["output_bytes"] += os.path.getsize(write_path)
+        if stager:
+            stager.publish(out_path)
+        yield BuildEvent("file_written", in_path, len(writer.pages), len(writer.pages), out_path, since(), data)
+
+    report["build_seconds"] = since()
+    report["cache_hits"] = cache.hits - hits_before if cache is not None else 0
+    yield BuildEvent("done", elapsed=report["build_seconds"])
+
+
+def build_press_pdf(job: Dict, stager: Optional[Any] = None, compiled: Optional[CompiledLayout] = None,
+                    cancel: Optional[Any] = None) -> List[str]:
+    """Build the press PDF(s) for job and return their destination paths (see iter_build)."""
+    return [event.path for event in iter_build(job, stager, compiled, cancel) if event.kind == "file_written"]
+
+
+def parse_panel_widths(spec: Optional[str]) -> Optional[List[float]]:
+    """Parse uneven fold widths in inches, e.g. '3.625,3.6875,3.6875'. Empty = even panels."""
+    parts = [p.strip() for p in str(spec or "").split(",") if p.strip()]
+    if not parts: return None
+    widths = [float(p) for p in parts]
+    if any(w <= 0 for w in widths): raise ValueError("Panel widths must be positive")
+    return widths
+
+
+def panel_edges(trim_w: float, panel_count: int, widths: Optional[List[float]] = None) -> List[float]:
+    """Fold positions across the trim width, from 0 to trim_w, for even or uneven panels."""
+    if widths:
+        if abs(sum(widths) - trim_w) > max(trim_w * 0.002, 0.01):
+            raise ValueError(f"Panel widths add up to {sum(widths):g}, trim width is {trim_w:g}")
+        edges = [0.0]
+        for w in widths: edges.append(edges[-1] + w)
+        edges[-1] = trim_w
+        return edges
+    return [trim_w * i / panel_count for i in range(panel_count + 1)]
+
+
+PANEL_FORM_NAME = "/PDPage"
+
+
+def _do_placements(ops: List[Tuple[Any, bytes]], xobjects: Any) -> Dict[str, List[Tuple[float, ...]]]:
+    """The CTM (in the content's own space) at each Do, per XObject name."""
+    ctm, stack = _IDENTITY, []
+    placements: Dict[str, List[Tuple[float, ...]]] = {}
+    for operands, operator in ops:
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            if stack: ctm = stack.pop()
+        elif operator == b"cm" and len(operands) == 6:
+            ctm = _mat_mul(tuple(float(v) for v in operands), ctm)
+        elif operator == b"Do" and operands and operands[0] in xobjects:
+            placements.setdefault(operands[0], []).append(ctm)
+    return placements
+
+
+def _xobject_overlaps(xobj: Any, m: Tuple[float, ...], rect: Rect) -> bool:
+    """Whether xobj (its BBox, or the unit square of an image) drawn at CTM m reaches into rect."""
+    box = (0.0, 0.0, 1.0, 1.0)
+    if xobj.get("/Subtype") == "/Form":
+        m = _mat_mul(tuple(float(v) for v in xobj.get("/Matrix", _IDENTITY)), m)
+        box = tuple(float(v) for v in xobj.get("/BBox", (0, 0, 0, 0)))
+    xs, ys = [], []
+    for x, y in ((box[0], box[1]), (box[2], box[1]), (box[0], box[3]), (box[2], box[3])):
+        xs.append(m[0] * x + m[2] * y + m[4])
+        ys.append(m[1] * x + m[3] * y + m[5])
+    return min(xs) < rect.x1 and rect.x0 < max(xs) and min(ys) < rect.y1 and rect.y0 < max(ys)
+
+
+def _pruned_content(ops: List[Tuple[Any, bytes]], resources: Any, ctms: List[Tuple[float, ...]], rect: Rect,
+                    pdf: Any, writer: PdfWriter, memo: Dict) -> Tuple[List[Tuple[Any, bytes]], Any]:
+    """ops and resources of content drawn at ctms, without the XObjects it only draws outside rect.
+
+    Forms that reach into rect are pruned the same way, recursively, and
+    added to writer once per (form, placement). Returns the arguments
+    themselves when nothing is left out.
+    """
+    resources = resources.get_object() if resources is not None else None
+    xobjects = resources.get("/XObject", DictionaryObject()).get_object() if resources else DictionaryObject()
+    outside, pruned = set(), {}
+    for name, local in _do_placements(ops, xobjects).items():
+        xobj = xobjects[name].get_object()
+        placed = [_mat_mul(m, ctm) for m in local for ctm in ctms]
+        if not any(_xobject_overlaps(xobj, m, rect) for m in placed):
+            outside.add(name)
+        elif xobj.get("/Subtype") == "/Form":
+            inner = [_mat_mul(tuple(float(v) for v in xobj.get("/Matrix", _IDENTITY)), m) for m in placed]
+            ref = _pruned_form(xobjects[name], inner, rect, pdf, writer, memo)
+            if ref is not None: pruned[name] = ref
+    if not outside and not pruned: return ops, resources
+    resources = DictionaryObject(resources)
+    kept_xobjects = DictionaryObject({k: v for k, v in xobjects.items() if k not in outside})
+    kept_xobjects.update(pruned)
+    resources[NameObject("/XObject")] = kept_xobjects
+    return [(operands, op) for operands, op in ops if not (op == b"Do" and operands and operands[0] in outside)], resources
+
+
+def _pruned_form(ref: Any, ctms: List[Tuple[float, ...]], rect: Rect, pdf: Any, writer: PdfWriter, memo: Dict) -> Optional[IndirectObject]:
+    """A copy of Form XObject ref in writer without what it draws outside rect; None if it keeps everything."""
+    form = ref.get_object()
+    key = ("form", _object_key(ref), tuple(ctms), rect)
+    if key in memo: return memo[key]
+    ops = ContentStream(form, pdf).operations
+    kept, resources = _pruned_content(ops, form.get("/Resources"), ctms, rect, pdf, writer, memo)
+    copy_ref = None
+    if kept is not ops:
+        copy_ref = _add_indirect(writer, _form_stream(form, kept, resources, pdf))
+    memo[key] = copy_ref
+    return copy_ref
+
+
+def _form_stream(template: Dict, ops: List[Tuple[Any, bytes]], resources: Any, pdf: Any) -> StreamObject:
+    content = ContentStream(None, pdf)
+    content.operations = ops
+    form = StreamObject()
+    for k, v in template.items():
+        if k not in ("/Filter", "/DecodeParms", "/Length", "/Resources"): form[NameObject(k)] = v
+    form.set_data(zlib.compress(content.get_data(), 6))
+    form[NameObject("/Filter")] = NameObject("/FlateDecode")
+    if resources is not None: form[NameObject("/Resources")] = resources
+    return form
+
+
+def _object_key(value: Any) -> Any:
+    if isinstance(value, IndirectObject): return value.idnum
+    return repr(value)
+
+
+def _add_panel_page(writer: PdfWriter, src: PageObject, rect: Rect, pdf: Any, memo: Dict) -> PageObject:
+    """Add src to writer as one Form XObject drawn clipped to rect.
+
+    Pages sharing content and resources (see dedupe) share one form and one
+    content stream per writer; XObjects drawn only outside rect are left out
+    of the form, down through nested forms.
+    """
+    resources = _inherited_attr(src, "/Resources", DictionaryObject())
+    contents = src.raw_get("/Contents") if "/Contents" in src else None
+    key = ("page", _object_key(contents), _object_key(src.raw_get("/Resources") if "/Resources" in src else resources), rect)
+    if key not in memo:
+        ops = src.get_contents().operations if "/Contents" in src else []
+        kept, kept_resources = _pruned_content(ops, resources.get_object(), [_IDENTITY], rect, pdf, writer, memo)
+        template = {"/Type": NameObject("/XObject"), "/Subtype": NameObject("/Form"),
+                    "/BBox": ArrayObject(FloatObject(v) for v in src.mediabox)}
+        form = _add_indirect(writer, _form_stream(template, kept, kept_resources, pdf))
+        content = StreamObject()
+        content.set_data(b"q %.4f %.4f %.4f %.4f re W n %s Do Q\n" % (rect.x0, rect.y0, rect.width, rect.height, PANEL_FORM_NAME.encode()))
+        memo[key] = (DictionaryObject({NameObject("/XObject"): DictionaryObject({NameObject(PANEL_FORM_NAME): form})}),
+                     _add_indirect(writer, content))
+    page = copy.copy(src)
+    for name in ("/Contents", "/Resources"):
+        if name in page: del page[name]
+    added = writer.add_page(page)
+    added[NameObject("/Resources")], added[NameObject("/Contents")] = memo[key]
+    return added
+
+
+def split_panels_pdf(pdf_path: str, panel_count: int, margin_in: float = 0.0,
+                     widths_in: Optional[List[float]] = None, pdf_data: Optional[bytes] = None) -> Tuple[List[str], List[str]]:
+    """Split a built press PDF into per-panel PDFs (+ safe-area PDFs) without rasterizing.
+
+    Each panel page draws the built page as a Form XObject clipped to the
+    panel, with its boxes moved to the panel; XObjects drawn wholly outside
+    the panel (images placed on other panels), also inside nested forms, are
+    left out of that panel's file. Identical pages share one form per file.
+    Outer panels keep their side bleed, all panels keep top/bottom bleed.
+    pdf_data (the PDF's bytes) is parsed instead of reading pdf_path back.
+    """
+    reader = PdfReader(io.BytesIO(pdf_data) if pdf_data is not None else pdf_path)
+    stem = os.path.splitext(pdf_path)[0]
+    count = len(widths_in) if widths_in else panel_count
+    margin = margin_in * POINTS_PER_INCH
+    panel_writers = [PdfWriter() for _ in range(count)]
+    safe_writers = [PdfWriter() for _ in range(count)] if margin > 0 else []
+    panel_memos: List[Dict] = [{} for _ in panel_writers]
+    safe_memos: List[Dict] = [{} for _ in safe_writers]
+
+    for src in reader.pages:
+        trim = _rect_from_pypdf_box(src.trimbox)
+        bleed = _rect_from_pypdf_box(src.bleedbox)
+        widths_pt = [w * POINTS_PER_INCH for w in widths_in] if widths_in else None
+        edges = panel_edges(trim.width, count, widths_pt)
+        for idx in range(count):
+            x0 = bleed.x0 if idx == 0 else trim.x0 + edges[idx]
+            x1 = bleed.x1 if idx == count - 1 else trim.x0 + edges[idx + 1]
+            panel_rect = Rect(x0, bleed.y0, x1, bleed.y1)
+            panel = _add_panel_page(panel_writers[idx], src, panel_rect, reader, panel_memos[idx])
+            box = _rect_to_box(panel_rect)
+            panel.mediabox = box
+            panel.cropbox = box
+            panel.bleedbox = box
+            panel.trimbox = _rect_to_box(Rect(trim.x0 + edges[idx], trim.y0, trim.x0 + edges[idx + 1], trim.y1))
+            if safe_writers:
+                safe_rect = Rect(trim.x0 + edges[idx] + margin, trim.y0 + margin, trim.x0 + edges[idx + 1] - margin, trim.y1 - margin)
+                if safe_rect.width <= 0 or safe_rect.height <= 0:
+                    raise ValueError("Panel margin is larger than the panel")
+                safe = _add_panel_page(safe_writers[idx], src, safe_rect, reader, safe_memos[idx])
+                safe_box = _rect_to_box(safe_rect)
+                safe.mediabox = safe_box
+                safe.cropbox = safe_box
+                safe.bleedbox = safe_box
+                safe.trimbox = safe_box
+
+    panels: List[str] = []
+    safes: List[str] = []
+    for idx, w in enumerate(panel_writers):
+        out_path = f"{stem}_panel_{idx + 1}.pdf"
         with open(out_path, "wb") as f:
-            writer.write(f)
-        created.append(out_path)
-
-    return created
+            w.write(f)
+        panels.append(out_path)
+    for idx, w in enumerate(safe_writers):
+        out_path = f"{stem}_panel_{idx + 1}_safe.pdf"
+        with open(out_path, "wb") as f:
+            w.write(f)
+        safes.append(out_path)
+    return panels, safes
 
 
 def write_job_json(job: Dict, path: str) -> None:
@@ -427,6 +1457,21 @@ def load_presets(preset_path: str) -> Dict[str, Dict]:
     return data
 
 
+def make_input_entry(input_path: str, pages_spec: str, pdf_box: str, mmap_input: bool = False) -> Dict:
+    """Job input dict; PDFs get their page count and 'all' expanded to an explicit range."""
+    input_abs = os.path.abspath(input_path)
+    ext = os.path.splitext(input_abs)[1].lower()
+    page_count = None
+    if ext == ".pdf":
+        try:
+            with open_source_pdf(input_abs, mmap_input) as reader:
+                page_count = len(reader.pages)
+        except Exception: page_count = None
+        if page_count and (pages_spec or "").strip().lower() == "all":
+            pages_spec = f"1-{page_count}"
+    return {"path": input_abs, "pages": pages_spec, "pdf_box": pdf_box, "page_count": page_count, "mmap": bool(mmap_input)}
+
+
 def make_job(
     *,
     input_path: str,
@@ -442,26 +1487,21 @@ def make_job(
     basename: Optional[str] = None,
     auto_generative_fill: bool = False,
     emit_job: bool = False,
+    mmap_input: bool = False,
+    downsample_ppi: Optional[float] = None,
+    downsample_codec: str = "auto",
+    downsample_quality: int = 85,
+    dedupe_pages: bool = True,
+    bleed_raster_dpi: Optional[float] = None,
+    linearize: bool = False,
 ) -> Dict:
     w, h, unit = parse_size(trim_size_spec)
     bleed_vals = parse_bleed(bleed_spec, unit)
     if basename is None or not basename.strip():
         basename = os.path.splitext(os.path.basename(input_path))[0]
-    input_abs = os.path.abspath(input_path)
-    ext = os.path.splitext(input_abs)[1].lower()
-    page_count = None
-    if ext == ".pdf":
-        try:
-            reader = PdfReader(input_abs)
-            page_count = len(reader.pages)
-        except Exception: page_count = None
-        if page_count and (pages_spec or "").strip().lower() == "all":
-            pages_spec = f"1-{page_count}"
 
     job = {
-        "inputs": [{
-            "path": input_abs, "pages": pages_spec, "pdf_box": pdf_box, "page_count": page_count
-        }],
+        "inputs": [make_input_entry(input_path, pages_spec, pdf_box, mmap_input)],
         "layout": {
             "trim": {"w": w, "h": h, "unit": unit},
             "bleed": {
@@ -471,7 +1511,15 @@ def make_job(
             },
             "fit_mode": fit_mode, "anchor": anchor,
             "bleed_generator": (bleed_generator or "none").lower().strip(),
-            "marks": {"crop_marks": bool(crop_marks)}
+            "bleed_raster_dpi": float(bleed_raster_dpi) if bleed_raster_dpi else None,
+            "marks": {"crop_marks": bool(crop_marks)},
+            "dedupe": bool(dedupe_pages),
+            "linearize": bool(linearize),
+            "downsample": {
+                "max_ppi": float(downsample_ppi) if downsample_ppi else None,
+                "codec": (downsample_codec or "auto").lower().strip(),
+                "quality": int(downsample_quality),
+            },
         },
         "indesign": {
             "auto_generative_fill": bool(auto_generative_fill)
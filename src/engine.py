@@ -0,0 +1,106 @@
+"""Reusable build engine for long-running callers (servers, watch folders, pools).
+
+PressDropEngine compiles each preset from presets/presets.json once into an
+immutable CompiledLayout and hands it to build_press_pdf, so per-job work is
+limited to reading inputs. Compiled layouts memoise placement plans per
+source box size and are safe to share between threads.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from core import BuildEvent, CompiledLayout, build_press_pdf, iter_build, load_presets, make_input_entry
+
+
+DEFAULT_PRESETS = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "presets", "presets.json"))
+
+
+class PressDropEngine:
+    def __init__(self, presets: Optional[Dict[str, Dict]] = None, presets_path: Optional[str] = None):
+        if presets is None:
+            presets = load_presets(presets_path or DEFAULT_PRESETS)
+        self.presets = presets
+        self._compiled: Dict[object, CompiledLayout] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: object, factory) -> CompiledLayout:
+        with self._lock:
+            layout = self._compiled.get(key)
+        if layout is None:
+            layout = factory()
+            with self._lock:
+                layout = self._compiled.setdefault(key, layout)
+        return layout
+
+    def compile(self, preset: str) -> CompiledLayout:
+        """Compiled geometry for a named preset (compiled on first use)."""
+        if preset not in self.presets:
+            raise KeyError(f"Unknown preset: {preset}")
+        p = self.presets[preset]
+        return self._cached(("preset", preset), lambda: CompiledLayout.from_spec(
+            p["trim"], str(p.get("bleed", "0")), p.get("fit", "fit_trim_proportional"),
+            anchor=p.get("anchor", "center"), bleed_generator=p.get("bleed_generator", "none"),
+            crop_marks=bool(p.get("crop_marks", False)), name=preset,
+        ))
+
+    def compile_spec(self, trim_size_spec: str, bleed_spec: str, fit_mode: str, anchor: str = "center",
+                     bleed_generator: str = "none", crop_marks: bool = False, bleed_raster_dpi: float = 0.0) -> CompiledLayout:
+        """Compiled geometry for ad-hoc settings, cached by the exact spec."""
+        key = ("spec", trim_size_spec, bleed_spec, fit_mode, anchor, bleed_generator, bool(crop_marks), float(bleed_raster_dpi or 0))
+        return self._cached(key, lambda: CompiledLayout.from_spec(
+            trim_size_spec, bleed_spec, fit_mode, anchor, bleed_generator, crop_marks, bleed_raster_dpi=bleed_raster_dpi or 0.0))
+
+    def _layout(self, layout: Union[str, CompiledLayout]) -> CompiledLayout:
+        return self.compile(layout) if isinstance(layout, str) else layout
+
+    def make_job(
+        self,
+        layout: Union[str, CompiledLayout],
+        input_path: str,
+        out_dir: str,
+        *,
+        pages_spec: str = "1",
+        pdf_box: str = "auto",
+        basename: Optional[str] = None,
+        mmap_input: bool = False,
+        downsample_ppi: Optional[float] = None,
+        downsample_codec: str = "auto",
+        downsample_quality: int = 85,
+        dedupe_pages: bool = True,
+        linearize: bool = False,
+    ) -> Dict:
+        """Job dict for input_path; same shape as core.make_job, without re-parsing the layout."""
+        compiled = self._layout(layout)
+        if basename is None or not basename.strip():
+            basename = os.path.splitext(os.path.basename(input_path))[0]
+        layout_dict = compiled.layout_dict()
+        layout_dict["dedupe"] = bool(dedupe_pages)
+        layout_dict["linearize"] = bool(linearize)
+        layout_dict["downsample"] = {
+            "max_ppi": float(downsample_ppi) if downsample_ppi else None,
+            "codec": (downsample_codec or "auto").lower().strip(),
+            "quality": int(downsample_quality),
+        }
+        return {
+            "inputs": [make_input_entry(input_path, pages_spec, pdf_box, mmap_input)],
+            "layout": layout_dict,
+            "indesign": {"auto_generative_fill": False},
+            "output": {"dir": os.path.abspath(out_dir), "basename": basename},
+        }
+
+    def build(self, layout: Union[str, CompiledLayout], input_path: str, out_dir: str,
+              stager=None, cancel=None, **job_options) -> Tuple[Dict, List[str]]:
+        """Build input_path with layout; returns the job (with its report) and the output paths."""
+        compiled = self._layout(layout)
+        job = self.make_job(compiled, input_path, out_dir, **job_options)
+        return job, build_press_pdf(job, stager=stager, compiled=compiled, cancel=cancel)
+
+    def iter_build(self, layout: Union[str, CompiledLayout], input_path: str, out_dir: str,
+                   stager=None, cancel=None, **job_options) -> Tuple[Dict, Iterator[BuildEvent]]:
+        """Like build, but returns the job and core.iter_build's event stream (nothing runs until it is iterated)."""
+        compiled = self._layout(layout)
+        job = self.make_job(compiled, input_path, out_dir, **job_options)
+        return job, iter_build(job, stager=stager, compiled=compiled, cancel=cancel)
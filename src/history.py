@@ -0,0 +1,192 @@
+"""Structured run history (JSONL) and throughput metrics.
+
+Every job run through the CLI, GUI or pipeline appends one JSON line to the
+history file. `pressdrop_tools.py stats` summarises it and can write a
+Prometheus textfile-collector file.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+HISTORY_ENV = "PRESSDROP_HISTORY"
+
+_lock = threading.Lock()
+
+
+def default_history_path() -> str:
+    env_path = os.environ.get(HISTORY_ENV, "").strip()
+    if env_path:
+        return env_path
+    return os.path.join(os.path.expanduser("~"), ".pressdrop", "history.jsonl")
+
+
+def make_run_record(
+    job: Dict,
+    outputs: Iterable[str],
+    timings: Dict[str, float],
+    *,
+    error: Optional[str] = None,
+    started: Optional[float] = None,
+    queue_depth: int = 0,
+) -> Dict:
+    """Flatten a finished job into a history record."""
+    layout = job.get("layout", {})
+    trim = layout.get("trim", {})
+    bleed = layout.get("bleed", {})
+    report = job.get("report", {})
+    finished = time.time()
+    duration = sum(timings.values())
+    inputs = job.get("inputs", [])
+    return {
+        "ts": finished,
+        "started": started if started is not None else finished - duration,
+        "input": inputs[0]["path"] if inputs else None,
+        "input_bytes": report.get("input_bytes", 0),
+        "pages": report.get("pages", 0),
+        "layout": {
+            "trim": f"{float(trim.get('w', 0)):g}x{float(trim.get('h', 0)):g}{trim.get('unit', 'in')}",
+            "bleed": [bleed.get(side) for side in ("top", "right", "bottom", "left")],
+            "fit_mode": layout.get("fit_mode"),
+            "bleed_generator": layout.get("bleed_generator"),
+        },
+        "stages": {name: round(sec, 4) for name, sec in timings.items()},
+        "duration": round(duration, 4),
+        "outputs": list(outputs),
+        "output_bytes": report.get("output_bytes", 0),
+        "cache_hits": report.get("cache_hits", 0),
+        "queue_depth": queue_depth,
+        "error": error,
+    }
+
+
+def append_run_record(record: Dict, path: Optional[str] = None) -> None:
+    path = path or default_history_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(record, separators=(",", ":"))
+    with _lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def record_job(job: Dict, outputs: Iterable[str], timings: Dict[str, float], **kwargs) -> None:
+    """Append a record for job; history problems never fail a run."""
+    try:
+        append_run_record(make_run_record(job, outputs, timings, **kwargs))
+    except Exception as exc:
+        print(f"LOG: Could not write run history: {exc}")
+
+
+def load_history(path: Optional[str] = None, since: Optional[float] = None) -> List[Dict]:
+    path = path or default_history_path()
+    if not os.path.exists(path):
+        return []
+    records: List[Dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and rec.get("ts", 0) < since:
+                continue
+            records.append(rec)
+    return records
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def compute_metrics(records: List[Dict]) -> Dict[str, float]:
+    ok = [r for r in records if not r.get("error")]
+    latencies = [float(r.get("duration", 0)) for r in ok]
+    pages = sum(int(r.get("pages", 0)) for r in ok)
+    metrics: Dict[str, float] = {
+        "jobs_total": float(len(records)),
+        "jobs_failed_total": float(len(records) - len(ok)),
+        "pages_total": float(pages),
+        "output_bytes_total": float(sum(int(r.get("output_bytes", 0)) for r in ok)),
+        "cache_hits_total": float(sum(int(r.get("cache_hits", 0)) for r in records)),
+        "job_latency_p50_seconds": _percentile(latencies, 50),
+        "job_latency_p95_seconds": _percentile(latencies, 95),
+        "pages_per_minute": 0.0,
+        "queue_depth": float(records[-1].get("queue_depth", 0)) if records else 0.0,
+        "queue_depth_max": float(max((int(r.get("queue_depth", 0)) for r in records), default=0)),
+    }
+    if ok:
+        span = max(r["ts"] for r in ok) - min(r.get("started", r["ts"]) for r in ok)
+        if span > 0:
+            metrics["pages_per_minute"] = pages / (span / 60.0)
+    stage_totals: Dict[str, float] = {}
+    for r in ok:
+        for name, sec in r.get("stages", {}).items():
+            stage_totals[name] = stage_totals.get(name, 0.0) + float(sec)
+    for name, total in stage_totals.items():
+        metrics[f"stage_seconds_total{{stage=\"{name}\"}}"] = total
+    return metrics
+
+
+_HELP = {
+    "jobs_total": ("counter", "Jobs recorded in the run history."),
+    "jobs_failed_total": ("counter", "Jobs that ended with an error."),
+    "pages_total": ("counter", "Press pages built."),
+    "output_bytes_total": ("counter", "Bytes of press PDFs written."),
+    "cache_hits_total": ("counter", "Source cache hits."),
+    "job_latency_p50_seconds": ("gauge", "Median job latency."),
+    "job_latency_p95_seconds": ("gauge", "95th percentile job latency."),
+    "pages_per_minute": ("gauge", "Page throughput over the history window."),
+    "queue_depth": ("gauge", "Jobs waiting when the latest job started."),
+    "queue_depth_max": ("gauge", "Largest queue depth in the window."),
+    "stage_seconds_total": ("counter", "Busy seconds per pipeline stage."),
+}
+
+
+def _sample(value: float) -> str:
+    """Full-precision sample value; integral values (counters) print without a fraction."""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+def format_prometheus(metrics: Dict[str, float], prefix: str = "pressdrop_") -> str:
+    lines: List[str] = []
+    seen = set()
+    for key, value in metrics.items():
+        base = key.split("{", 1)[0]
+        if base not in seen and base in _HELP:
+            kind, text = _HELP[base]
+            lines.append(f"# HELP {prefix}{base} {text}")
+            lines.append(f"# TYPE {prefix}{base} {kind}")
+            seen.add(base)
+        lines.append(f"{prefix}{key} {_sample(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(metrics: Dict[str, float], path: str) -> None:
+    """Write atomically so node_exporter never reads a half-written file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(format_prometheus(metrics))
+    os.replace(tmp, path)
@@ -0,0 +1,394 @@
+"""Persistent priority job queue with lanes and page-boundary preemption.
+
+Jobs (make_job dicts) are stored in a local SQLite file and run by a
+QueueRunner in priority order, with a concurrency limit per lane ("rush",
+"standard", "catalog", "wide-format"). Each build is consumed through
+core.iter_build, so a lower-priority job can be paused between two pages
+simply by not pulling its next event: when higher-priority work is waiting
+and every worker is busy, the lowest-priority running job gives up its slot
+at the next page boundary and resumes where it stopped once the rush work
+is done. `pressdrop_tools.py queue ...` lists, reorders and runs the queue.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core import iter_build
+from history import record_job
+
+
+QUEUE_ENV = "PRESSDROP_QUEUE"
+# Seconds between queue checks at page boundaries (new rush work, cancel requests).
+CHECKPOINT_INTERVAL = 0.2
+
+
+@dataclass(frozen=True)
+class Lane:
+    priority: int
+    limit: int
+
+
+DEFAULT_LANES: Dict[str, Lane] = {
+    "rush": Lane(priority=100, limit=2),
+    "standard": Lane(priority=50, limit=2),
+    "wide-format": Lane(priority=20, limit=1),
+    "catalog": Lane(priority=10, limit=1),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lane TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    position REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    job TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    outputs TEXT,
+    error TEXT,
+    cancel INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (state, priority DESC, position);
+"""
+
+
+def default_queue_path() -> str:
+    env_path = os.environ.get(QUEUE_ENV, "").strip()
+    if env_path:
+        return env_path
+    return os.path.join(os.path.expanduser("~"), ".pressdrop", "queue.sqlite")
+
+
+def parse_lane_limits(spec: str, lanes: Optional[Dict[str, Lane]] = None) -> Dict[str, Lane]:
+    """Apply "rush=3,catalog=1" style limit overrides to lanes (default: DEFAULT_LANES)."""
+    lanes = dict(lanes or DEFAULT_LANES)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, limit = part.partition("=")
+        name = name.strip()
+        base = lanes.get(name, Lane(priority=DEFAULT_LANES["standard"].priority, limit=1))
+        lanes[name] = Lane(priority=base.priority, limit=max(1, int(limit)))
+    return lanes
+
+
+class JobQueue:
+    """SQLite-backed job store; safe to use from several threads and processes."""
+
+    def __init__(self, path: Optional[str] = None, lanes: Optional[Dict[str, Lane]] = None):
+        self.path = path or default_queue_path()
+        self.lanes = lanes or DEFAULT_LANES
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, job: Dict, lane: str = "standard", priority: Optional[int] = None) -> int:
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane: {lane} (known: {', '.join(self.lanes)})")
+        if priority is None:
+            priority = self.lanes[lane].priority
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            last = db.execute("SELECT MAX(position) FROM jobs").fetchone()[0]
+            cur = db.execute(
+                "INSERT INTO jobs (lane, priority, position, job, submitted) VALUES (?, ?, ?, ?, ?)",
+                (lane, int(priority), (last or 0.0) + 1.0, json.dumps(job), time.time()),
+            )
+            db.execute("COMMIT")
+            return int(cur.lastrowid)
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, states: Optional[List[str]] = None) -> List[Dict]:
+        """Jobs in run order (priority, then position); all states unless given."""
+        sql = "SELECT * FROM jobs"
+        args: List[Any] = []
+        if states:
+            sql += f" WHERE state IN ({','.join('?' * len(states))})"
+            args = list(states)
+        with self._connect() as db:
+            rows = db.execute(sql + " ORDER BY priority DESC, position, id", args).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending(self) -> List[Dict]:
+        return self.list(["queued"])
+
+    def depth(self) -> int:
+        with self._connect() as db:
+            return int(db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0])
+
+    def move(self, job_id: int, *, before: Optional[int] = None, top: bool = False, bottom: bool = False) -> None:
+        """Reorder a job within its priority: to the top, the bottom, or just before another job."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT priority FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                db.execute("ROLLBACK")
+                raise KeyError(f"No queued job {job_id}")
+            if before is not None:
+                target = db.execute("SELECT position FROM jobs WHERE id = ?", (before,)).fetchone()
+                if target is None:
+                    db.execute("ROLLBACK")
+                    raise KeyError(f"No queued job {before}")
+                prev = db.execute("SELECT MAX(position) FROM jobs WHERE position < ? AND id != ?", (target[0], job_id)).fetchone()[0]
+                position = (target[0] + (prev if prev is not None else target[0] - 2.0)) / 2.0
+            elif top:
+                position = (db.execute("SELECT MIN(position) FROM jobs").fetchone()[0] or 0.0) - 1.0
+            elif bottom:
+                position = (db.execute("SELECT MAX(position) FROM jobs").fetchone()[0] or 0.0) + 1.0
+            else:
+                db.execute("ROLLBACK")
+                raise ValueError("move needs before, top or bottom")
+            db.execute("UPDATE jobs SET position = ? WHERE id = ?", (position, job_id))
+            db.execute("COMMIT")
+
+    def set_priority(self, job_id: int, priority: int) -> None:
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET priority = ? WHERE id = ?", (int(priority), job_id))
+
+    def cancel(self, job_id: int) -> str:
+        """Drop a queued job, or ask a running/paused one to stop at its next page. Returns its state."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ? AND state = 'queued'", (time.time(), job_id))
+            db.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND state IN ('running', 'paused')", (job_id,))
+            row = db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            db.execute("COMMIT")
+        if row is None:
+            raise KeyError(f"No queued job {job_id}")
+        return row[0]
+
+    def cancel_requested(self, job_ids: List[int]) -> List[int]:
+        if not job_ids:
+            return []
+        with self._connect() as db:
+            rows = db.execute(f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({','.join('?' * len(job_ids))})", job_ids).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, job_id: int) -> Optional[Dict]:
+        """Mark a queued job running; None if another runner got it first."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cur = db.execute("UPDATE jobs SET state = 'running', started = ? WHERE id = ? AND state = 'queued'", (time.time(), job_id))
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone() if cur.rowcount else None
+            db.execute("COMMIT")
+        return dict(row) if row else None
+
+    def set_state(self, job_id: int, state: str, pages_done: Optional[int] = None) -> None:
+        with self._connect() as db:
+            if pages_done is None:
+                db.execute("UPDATE jobs SET state = ? WHERE id = ?", (state, job_id))
+            else:
+                db.execute("UPDATE jobs SET state = ?, pages_done = ? WHERE id = ?", (state, pages_done, job_id))
+
+    def finish(self, job_id: int, state: str, outputs: List[str], error: Optional[str] = None, pages_done: int = 0) -> None:
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET state = ?, finished = ?, outputs = ?, error = ?, pages_done = ? WHERE id = ?",
+                (state, time.time(), json.dumps(outputs), error, pages_done, job_id),
+            )
+
+    def requeue_orphans(self) -> int:
+        """Put jobs left running/paused by a runner that died back in the queue."""
+        with self._connect() as db:
+            cur = db.execute("UPDATE jobs SET state = 'queued', pages_done = 0 WHERE state IN ('running', 'paused') AND cancel = 0")
+            db.execute("UPDATE jobs SET state = 'cancelled', finished = ? WHERE state IN ('running', 'paused')", (time.time(),))
+            return cur.rowcount
+
+    def purge(self, older_than_s: float = 0.0) -> int:
+        """Delete finished (done/failed/cancelled) jobs older than older_than_s."""
+        with self._connect() as db:
+            cur = db.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed', 'cancelled') AND finished < ?",
+                (time.time() - older_than_s,),
+            )
+            return cur.rowcount
+
+
+@dataclass(eq=False)
+class _Run:
+    id: int
+    lane: str
+    priority: int
+    position: float
+    job: Dict
+    cancel: threading.Event = field(default_factory=threading.Event)
+    resume: threading.Event = field(default_factory=threading.Event)
+    pages_done: int = 0
+    paused_s: float = 0.0
+    checked: float = 0.0
+
+
+class QueueRunner:
+    """Run queued jobs on `workers` threads, highest priority first, within lane limits.
+
+    One runner per queue file: on start, jobs another runner left running
+    are queued again and rebuilt from the first page. Jobs submitted from
+    other processes are picked up within `poll` seconds.
+    """
+
+    def __init__(self, queue: JobQueue, workers: int = 2, stager: Optional[Any] = None, poll: float = 1.0):
+        self.queue = queue
+        self.workers = max(1, int(workers))
+        self.stager = stager
+        self.poll = poll
+        self.preemptions = 0
+        self._cond = threading.Condition()
+        self._active: Dict[int, _Run] = {}
+        self._paused: Dict[int, _Run] = {}
+        self._threads: List[threading.Thread] = []
+
+    def _limit(self, lane: str) -> int:
+        lane_cfg = self.queue.lanes.get(lane)
+        return lane_cfg.limit if lane_cfg else 1
+
+    def _poll_queue(self) -> Tuple[List[Dict], List[int]]:
+        """Queued rows and cancel requests for paused runs, read without holding the lock."""
+        with self._cond:
+            paused = list(self._paused)
+        return self.queue.pending(), self.queue.cancel_requested(paused)
+
+    def _best_candidate(self, pending: List[Dict], excluding: Optional[_Run] = None) -> Optional[Any]:
+        """Highest-priority pending row or paused run whose lane has room (called under the lock)."""
+        busy: Dict[str, int] = {}
+        for run in self._active.values():
+            if run is not excluding:
+                busy[run.lane] = busy.get(run.lane, 0) + 1
+        candidates: List[Any] = list(self._paused.values()) + pending
+        candidates.sort(key=lambda c: (-c.priority, c.position) if isinstance(c, _Run) else (-c["priority"], c["position"]))
+        for cand in candidates:
+            lane = cand.lane if isinstance(cand, _Run) else cand["lane"]
+            if busy.get(lane, 0) < self._limit(lane):
+                return cand
+        return None
+
+    def _dispatch(self, pending: List[Dict], cancelled: List[int]) -> None:
+        """Fill free worker slots: resume paused runs or start queued jobs (called under the lock).
+
+        pending and cancelled come from _poll_queue(); rows are taken off
+        pending as they are tried. Only the claims write to SQLite here.
+        """
+        for job_id in cancelled:
+            run = self._paused.pop(job_id, None)
+            if run is None:
+                continue
+            run.cancel.set()
+            self._active[job_id] = run
+            run.resume.set()
+        while len(self._active) < self.workers:
+            cand = self._best_candidate(pending)
+            if cand is None:
+                return
+            if isinstance(cand, _Run):
+                del self._paused[cand.id]
+                self._active[cand.id] = cand
+                cand.resume.set()
+                continue
+            pending.remove(cand)
+            row = self.queue.claim(cand["id"])
+            if row is None:
+                continue
+            run = _Run(row["id"], row["lane"], row["priority"], row["position"], json.loads(row["job"]))
+            self._active[run.id] = run
+            thread = threading.Thread(target=self._work, args=(run,), name=f"pressdrop-queue-{run.id}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _checkpoint(self, run: _Run) -> None:
+        """Page boundary: honour cancel requests and give way to higher-priority work."""
+        now = time.perf_counter()
+        if now - run.checked < CHECKPOINT_INTERVAL:
+            return
+        run.checked = now
+        if self.queue.cancel_requested([run.id]):
+            run.cancel.set()
+            return
+        pending, cancelled = self._poll_queue()
+        with self._cond:
+            self._dispatch(pending, cancelled)
+            if len(self._active) < self.workers or run.priority > min(r.priority for r in self._active.values()):
+                return
+            cand = self._best_candidate(pending, excluding=run)
+            cand_priority = None if cand is None else (cand.priority if isinstance(cand, _Run) else cand["priority"])
+            if cand_priority is None or cand_priority <= run.priority:
+                return
+            del self._active[run.id]
+            self._paused[run.id] = run
+            run.resume.clear()
+            self.preemptions += 1
+            # Recorded before the slot is handed over, so the job never shows as running beside its replacement.
+            self.queue.set_state(run.id, "paused", run.pages_done)
+            self._dispatch(pending, [])
+            self._cond.notify_all()
+        print(f"LOG: Queue job {run.id} ({run.lane}) paused after page {run.pages_done} for higher-priority work")
+        paused_at = time.perf_counter()
+        run.resume.wait()
+        run.paused_s += time.perf_counter() - paused_at
+        self.queue.set_state(run.id, "running")
+
+    def _work(self, run: _Run) -> None:
+        outputs: List[str] = []
+        error = None
+        state = "done"
+        started = time.time()
+        depth = self.queue.depth()
+        try:
+            for event in iter_build(run.job, self.stager, cancel=run.cancel):
+                if event.kind == "page_placed":
+                    run.pages_done += 1
+                    self._checkpoint(run)
+                elif event.kind == "file_written":
+                    outputs.append(event.path)
+                elif event.kind == "cancelled":
+                    state = "cancelled"
+        except Exception as exc:
+            error = str(exc)
+            state = "failed"
+        build_s = run.job.get("report", {}).get("build_seconds", time.time() - started)
+        record_job(run.job, outputs, {"build": max(0.0, build_s - run.paused_s)}, error=error, started=started,
+                   queue_depth=depth)
+        self.queue.finish(run.id, state, outputs, error, run.pages_done)
+        pending, cancelled = self._poll_queue()
+        with self._cond:
+            self._active.pop(run.id, None)
+            self._dispatch(pending, cancelled)
+            self._cond.notify_all()
+
+    def run(self, until_empty: bool = True, stop: Optional[threading.Event] = None) -> None:
+        """Dispatch until the queue is drained (or, with until_empty=False, until stop is set)."""
+        requeued = self.queue.requeue_orphans()
+        if requeued:
+            print(f"LOG: Re-queued {requeued} job(s) left running by an earlier runner")
+        while not (stop is not None and stop.is_set()):
+            pending, cancelled = self._poll_queue()
+            with self._cond:
+                self._dispatch(pending, cancelled)
+                if until_empty and not self._active and not self._paused and not pending:
+                    break
+                self._cond.wait(self.poll)
+        for thread in self._threads:
+            thread.join()
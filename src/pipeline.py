@@ -0,0 +1,414 @@
+"""Pipelined batch runner: build -> rasterize -> split -> launch.
+
+Each stage runs its own workers connected by bounded asyncio queues, so job
+N+1's PDF build overlaps job N's Ghostscript render and PNG encoding, and a
+slow downstream stage applies backpressure instead of letting builds pile up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from core import POINTS_PER_INCH, CompiledLayout, build_press_pdf, split_panels_pdf, to_points
+from history import record_job
+from staging import InputPrefetcher
+from raster import RasterTarget, export_rasters, find_ghostscript, panel_crop_boxes, rasterize_pdf_async, split_panels, stream_rasterize_pdf
+
+
+_DONE = object()
+MB = 1024 * 1024
+# Ghostscript's working set on top of the page bitmap (display lists, fonts, PNG encoder).
+RASTER_OVERHEAD = 1.25
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    busy: float = 0.0
+    items: int = 0
+    waited: float = 0.0  # time handlers spent blocked (memory budget, prefetcher), not counted as busy
+
+    def utilization(self, wall: float) -> float:
+        if wall <= 0 or self.workers <= 0:
+            return 0.0
+        return self.busy / (wall * self.workers)
+
+
+@dataclass
+class PipelineResult:
+    job: Dict
+    outputs: List[str] = field(default_factory=list)
+    pngs: List[str] = field(default_factory=list)
+    rasters: List[str] = field(default_factory=list)
+    panels: List[str] = field(default_factory=list)
+    safe_panels: List[str] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    started: Optional[float] = None
+    queue_depth: int = 0
+    raster_bytes: int = 0
+    staged: bool = False  # files are still in the stager's local scratch
+
+
+def _build_in_worker(job: Dict) -> Tuple[List[str], Dict]:
+    """Process-pool entry point: the job's report does not survive pickling, so return it."""
+    outputs = build_press_pdf(job)
+    return outputs, job.get("report", {})
+
+
+def _panel_geometry(job: Dict) -> Tuple[float, float, Dict[str, float]]:
+    """Trim size and bleed of a job in inches, as split_panels expects."""
+    layout = job["layout"]
+    trim = layout["trim"]
+    unit = trim.get("unit", "in")
+    bleed = layout.get("bleed", {})
+    bunit = bleed.get("unit", unit)
+    trim_w_in = to_points(float(trim["w"]), unit) / POINTS_PER_INCH
+    trim_h_in = to_points(float(trim["h"]), unit) / POINTS_PER_INCH
+    bleed_in = {side: to_points(float(bleed.get(side, 0)), bunit) / POINTS_PER_INCH for side in ("top", "right", "bottom", "left")}
+    return trim_w_in, trim_h_in, bleed_in
+
+
+def raster_peak_bytes(job: Dict, dpi: float, memory_cap_mb: Optional[float] = None) -> int:
+    """Estimated peak memory of rasterizing job at dpi.
+
+    Exports are bleed-box sized, so this is the RGB bitmap of the job's bleed
+    box plus Ghostscript overhead, or the strip cap when streaming.
+    """
+    box = CompiledLayout.from_layout(job["layout"]).bleed_box
+    pixels = (box.width / POINTS_PER_INCH * dpi) * (box.height / POINTS_PER_INCH * dpi)
+    peak = int(pixels * 3 * RASTER_OVERHEAD)
+    if memory_cap_mb:
+        peak = min(peak, int(memory_cap_mb * MB))
+    return peak
+
+
+class MemoryBudget:
+    """Admit work against a byte budget in arrival order; anything larger than the whole budget runs alone.
+
+    Strict order keeps a large page from waiting forever while smaller ones keep fitting in beside it.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget = int(budget_bytes)
+        self.used = 0
+        self.peak = 0
+        self._cond = asyncio.Condition()
+        self._waiting: Deque[object] = deque()
+
+    async def acquire(self, nbytes: int) -> int:
+        """Wait until nbytes fit; returns the amount reserved (pass it to release)."""
+        nbytes = min(int(nbytes), self.budget)
+        ticket = object()
+        async with self._cond:
+            self._waiting.append(ticket)
+            try:
+                await self._cond.wait_for(lambda: self._waiting[0] is ticket and self.used + nbytes <= self.budget)
+                self.used += nbytes
+                self.peak = max(self.peak, self.used)
+            finally:
+                # Also on cancellation, so the waiters behind this one move up.
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+        return nbytes
+
+    async def release(self, nbytes: int) -> None:
+        async with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+
+class PressPipeline:
+    """Run many jobs through bounded build/rasterize/split/launch stages.
+
+    dpi=None skips rasterization; panels are then split from the vector PDF.
+    raster_format "tiff", tile_size or raster_mem_mb switch rasterization to
+    the strip-streaming encoder with bounded memory.
+    raster_targets renders each page once and encodes it for every target
+    (raster.RasterTarget: PNG/JPEG/TIFF/previews); panel crops come from the
+    same render. pngs holds the first target's files, rasters the rest.
+    prefetch > 0 copies that many upcoming inputs to local scratch (at most
+    prefetch_mb in total) while earlier jobs build; the builder reads the
+    verified local copies.
+    launch is an optional callable that receives the first PNG (or PDF) of
+    each job.
+    stager (staging.OutputStager) makes every stage write into local
+    scratch; a job's files are published once it leaves the pipeline (or
+    before launch) and the result then lists the final paths. Wait on the
+    stager after the run.
+    """
+
+    def __init__(
+        self,
+        *,
+        dpi: Optional[int] = None,
+        gs_path: str = "",
+        raster_format: str = "png",
+        tile_size: int = 0,
+        raster_mem_mb: Optional[float] = None,
+        raster_budget_mb: Optional[float] = None,
+        raster_targets: Optional[List[RasterTarget]] = None,
+        panel_count: int = 0,
+        panel_margin_in: float = 0.0,
+        panel_widths_in: Optional[List[float]] = None,
+        launch: Optional[Callable[[str], Any]] = None,
+        queue_size: int = 2,
+        build_workers: int = 1,
+        raster_workers: Optional[int] = None,
+        split_workers: int = 1,
+        build_executor: Optional[Executor] = None,
+        prefetch: int = 0,
+        prefetch_mb: float = 2048,
+        history: bool = True,
+        stager: Optional[Any] = None,
+    ):
+        self.dpi = dpi
+        self.gs_path = gs_path
+        self.raster_format = raster_format
+        self.tile_size = tile_size
+        self.raster_mem_mb = raster_mem_mb
+        self.raster_budget_mb = raster_budget_mb
+        self.raster_targets = raster_targets
+        if raster_mem_mb and any(not t.streams for t in raster_targets or []):
+            print("LOG: --raster_mem_mb caps PNG/TIFF strips only; JPEG and preview outputs hold a whole page image each.")
+        self.panel_count = panel_count
+        self.panel_margin_in = panel_margin_in
+        self.panel_widths_in = panel_widths_in
+        self.launch = launch
+        self.queue_size = max(1, int(queue_size))
+        self.build_workers = max(1, int(build_workers))
+        self.raster_workers = max(1, int(raster_workers or ((os.cpu_count() or 1) if raster_budget_mb else 1)))
+        self.split_workers = max(1, int(split_workers))
+        self.build_executor = build_executor
+        self.prefetch = max(0, int(prefetch))
+        self.prefetch_mb = prefetch_mb
+        self.prefetch_report: Optional[Dict[str, float]] = None
+        self.history = history
+        self.stager = stager
+        self.stats: Dict[str, StageStats] = {}
+        self.wall = 0.0
+        self.budget: Optional[MemoryBudget] = None
+        self._waiting = 0
+
+    async def _stage(self, name: str, workers: int, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], handler) -> None:
+        stats = self.stats[name] = StageStats(name, workers)
+
+        async def worker() -> None:
+            while True:
+                res = await inbox.get()
+                if res is _DONE:
+                    await inbox.put(_DONE)  # let sibling workers see it too
+                    return
+                if name == "build":
+                    self._waiting -= 1
+                    res.started = time.time()
+                    res.queue_depth = self._waiting
+                if res.error is None:
+                    start = time.perf_counter()
+                    try:
+                        await handler(res)
+                    except Exception as exc:
+                        res.error = f"{name}: {exc}"
+                    # Handlers record time blocked on shared resources as "<stage>_wait"; it is not work.
+                    waited = res.timings.get(f"{name}_wait", 0.0)
+                    elapsed = time.perf_counter() - start - waited
+                    res.timings[name] = elapsed
+                    stats.busy += elapsed
+                    stats.waited += waited
+                    stats.items += 1
+                if outbox is not None:
+                    await outbox.put(res)
+                else:
+                    self._finish(res)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            await outbox.put(_DONE)
+
+    def _publish(self, res: PipelineResult) -> None:
+        """Queue a job's staged files for publishing and switch the result to their final paths."""
+        if not res.staged:
+            return
+        res.staged = False
+        for name in ("outputs", "pngs", "rasters", "panels", "safe_panels"):
+            paths = getattr(res, name)
+            self.stager.publish_all(paths)
+            setattr(res, name, [self.stager.final_path(p) for p in paths])
+
+    def _finish(self, res: PipelineResult) -> None:
+        self._publish(res)
+        if self.history:
+            record_job(
+                res.job, res.outputs + res.pngs + res.rasters + res.panels + res.safe_panels, res.timings,
+                error=res.error, started=res.started, queue_depth=res.queue_depth,
+            )
+
+    async def run(self, jobs: Iterable[Dict]) -> List[PipelineResult]:
+        loop = asyncio.get_running_loop()
+        results = [PipelineResult(job=job) for job in jobs]
+        self._waiting = len(results)
+        gs_path = self.gs_path
+        if self.dpi:
+            gs_path = find_ghostscript(gs_path)
+        self.budget = MemoryBudget(int(self.raster_budget_mb * MB)) if self.raster_budget_mb else None
+
+        own_build = self.build_executor is None
+        build_pool = self.build_executor or ProcessPoolExecutor(max_workers=self.build_workers)
+        cpu_pool = ThreadPoolExecutor(max_workers=self.split_workers + 1)
+
+        prefetcher = None
+        if self.prefetch:
+            prefetcher = InputPrefetcher(depth=self.prefetch, max_bytes=int(self.prefetch_mb * MB))
+            prefetcher.prefetch(item["path"] for res in results for item in res.job.get("inputs", []))
+
+        async def build(res: PipelineResult) -> None:
+            job = res.job
+            if prefetcher:
+                start = time.perf_counter()
+                inputs = []
+                for item in job.get("inputs", []):
+                    inputs.append(dict(item, path=await loop.run_in_executor(None, prefetcher.local_copy, item["path"])))
+                res.timings["build_wait"] = time.perf_counter() - start  # blocked on the prefetcher, not building
+                job = dict(job, inputs=inputs)
+            if self.stager is not None:
+                out_dir = job.get("output", {}).get("dir", os.getcwd())
+                local_dir = os.path.dirname(self.stager.local_path(os.path.join(out_dir, "_"), fresh=True))
+                job = dict(job, output=dict(job.get("output", {}), dir=local_dir))
+                res.staged = True
+            try:
+                outputs, report = await loop.run_in_executor(build_pool, _build_in_worker, job)
+            finally:
+                if prefetcher:
+                    for item in res.job.get("inputs", []):
+                        prefetcher.release(item["path"])
+            res.outputs = outputs
+            res.job["report"] = report
+
+        async def rasterize(res: PipelineResult) -> None:
+            if not self.dpi:
+                return
+            # JPEG/preview targets keep a whole page image, so only all-strip targets are bounded by the cap.
+            buffered = any(not t.streams for t in self.raster_targets or [])
+            streaming = not buffered and bool(self.raster_format != "png" or self.tile_size or self.raster_mem_mb or self.raster_targets)
+            cap_mb = self.raster_mem_mb or 256
+            res.raster_bytes = raster_peak_bytes(res.job, self.dpi, cap_mb if streaming else None)
+            if self.budget and not streaming and not buffered and res.raster_bytes > self.budget.budget:
+                # Too big to render in one bitmap within the budget: stream under half of it.
+                streaming, cap_mb = True, self.raster_budget_mb / 2
+                res.raster_bytes = raster_peak_bytes(res.job, self.dpi, cap_mb)
+            reserved = 0
+            if self.budget:
+                start = time.perf_counter()
+                reserved = await self.budget.acquire(res.raster_bytes)
+                res.timings["rasterize_wait"] = time.perf_counter() - start
+            try:
+                for pdf_path in res.outputs:
+                    if self.raster_targets:
+                        panels = None
+                        if self.panel_count >= 2 or self.panel_widths_in:
+                            trim_w_in, trim_h_in, bleed_in = _panel_geometry(res.job)
+                            panels = panel_crop_boxes(self.panel_count, trim_w_in, trim_h_in, bleed_in,
+                                                      self.panel_margin_in, self.panel_widths_in)
+                        outputs, panel_files = await loop.run_in_executor(
+                            None, export_rasters, pdf_path, self.dpi, self.raster_targets, gs_path, cap_mb, panels,
+                        )
+                        res.pngs.extend(outputs[0])
+                        res.rasters.extend(path for files in outputs[1:] for path in files)
+                        for path in panel_files:
+                            (res.safe_panels if path.endswith("_safe.png") else res.panels).append(path)
+                    elif streaming:
+                        res.pngs.extend(await loop.run_in_executor(
+                            None, stream_rasterize_pdf, pdf_path, self.dpi, gs_path,
+                            self.raster_format, self.tile_size, cap_mb,
+                        ))
+                    else:
+                        res.pngs.extend(await rasterize_pdf_async(pdf_path, self.dpi, gs_path))
+            finally:
+                if self.budget:
+                    await self.budget.release(reserved)
+
+        async def split(res: PipelineResult) -> None:
+            if self.panel_count < 2 and not self.panel_widths_in:
+                return
+            if res.panels:
+                return  # cut from the shared render by export_rasters
+            if not res.pngs:
+                for pdf_path in res.outputs:
+                    panels, safe = await loop.run_in_executor(
+                        cpu_pool, split_panels_pdf, pdf_path, self.panel_count, self.panel_margin_in, self.panel_widths_in
+                    )
+                    res.panels.extend(panels)
+                    res.safe_panels.extend(safe)
+                return
+            trim_w_in, trim_h_in, bleed_in = _panel_geometry(res.job)
+            for png_path in res.pngs:
+                panels, safe = await loop.run_in_executor(
+                    cpu_pool, split_panels, png_path, self.panel_count, trim_w_in, trim_h_in, bleed_in,
+                    self.panel_margin_in, self.panel_widths_in,
+                )
+                res.panels.extend(panels)
+                res.safe_panels.extend(safe)
+
+        async def launch(res: PipelineResult) -> None:
+            if self.launch is None:
+                return
+            self._publish(res)
+            target = (res.pngs or res.outputs or [None])[0]
+            if target and self.stager is not None:
+                target = await loop.run_in_executor(cpu_pool, self.stager.wait_for, target)
+            if target:
+                await loop.run_in_executor(cpu_pool, self.launch, target)
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+
+        async def feed() -> None:
+            for res in results:
+                await queues[0].put(res)
+            await queues[0].put(_DONE)
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(
+                feed(),
+                self._stage("build", self.build_workers, queues[0], queues[1], build),
+                self._stage("rasterize", self.raster_workers, queues[1], queues[2], rasterize),
+                self._stage("split", self.split_workers, queues[2], queues[3], split),
+                self._stage("launch", 1, queues[3], None, launch),
+            )
+        finally:
+            self.wall = time.perf_counter() - start
+            if own_build:
+                build_pool.shutdown()
+            cpu_pool.shutdown()
+            if prefetcher:
+                self.prefetch_report = prefetcher.report()
+                prefetcher.close()
+        return results
+
+    def run_sync(self, jobs: Iterable[Dict]) -> List[PipelineResult]:
+        return asyncio.run(self.run(jobs))
+
+    def utilization_report(self) -> List[str]:
+        lines = [f"Wall time: {self.wall:.2f}s"]
+        for stats in self.stats.values():
+            lines.append(
+                f"  {stats.name:<10} items={stats.items:<4} busy={stats.busy:7.2f}s "
+                f"workers={stats.workers} utilization={stats.utilization(self.wall) * 100:5.1f}%"
+                + (f" blocked={stats.waited:.2f}s" if stats.waited else "")
+            )
+        if self.prefetch_report:
+            r = self.prefetch_report
+            lines.append(
+                f"  prefetch   files={r['files']:.0f} ({r['bytes'] / MB:.1f} MB) fetch={r['fetch_seconds']:.2f}s "
+                f"build waited={r['wait_seconds']:.2f}s overlap={r['overlap'] * 100:5.1f}%"
+            )
+        if self.budget:
+            lines.append(f"  raster memory peak {self.budget.peak / MB:.0f} of {self.budget.budget / MB:.0f} MB budget")
+        return lines
@@ -4,6 +4,7 @@
 Examples:
   python src/pressdrop_cli.py --input in.pdf --pages 1-2 --size 4x6in --bleed 0.125 --fit fill_bleed_proportional --out out
   python src/pressdrop_cli.py --input in.png --size 3.5x2in --bleed 0.125 --fit fit_trim_proportional --crop_marks
+  python src/pressdrop_cli.py --input a.pdf b.pdf c.pdf --size 11x8.5in --out out --export_png --dpi 600 --panel_split trifold
 
 Fit modes:
   fit_trim_proportional
@@ -19,18 +20,28 @@ Anchors:
 
 import argparse
 import os
+import time
 
-from core import build_press_pdf, make_job
+from core import build_press_pdf, make_job, parse_panel_widths
+from history import record_job
+from jobqueue import DEFAULT_LANES, JobQueue
+from staging import OutputStager
+from pipeline import PressPipeline
+from proof import build_proof_sheets
+from spool import export_options, submit_job
+from qa import check_pdf, format_report
+from raster import enable_ghostscript_pool, parse_raster_targets
 
 
 def main():
     p = argparse.ArgumentParser(description="PressDrop Bleed Fixer (v2.0)")
-    p.add_argument("--input", required=True, help="Input file: pdf/png/jpg/jpeg")
+    p.add_argument("--input", required=True, nargs="+", help="Input file(s): pdf/png/jpg/jpeg. Several inputs run as a pipelined batch")
     p.add_argument("--pages", default="1", help="PDF pages, 1-based. Examples: 1, 1-4, 1,3,5-7. Default=1")
     p.add_argument("--pdf_box", default="auto", choices=["auto", "trim", "crop", "media"], help="Which PDF box to use as source")
     p.add_argument("--size", required=True, help="Trim size, e.g. 4x6in, 3.5x2in, 101.6x152.4mm")
     p.add_argument("--bleed", default="0.125", help="Bleed in same unit as size. Either single value or 't,r,b,l'")
-    p.add_argument("--bleed_generator", default="none", choices=["none","mirror","smear"], help="Fill bleed by extending edges (mirror/smear). For PDFs, stays vector.")
+    p.add_argument("--bleed_generator", default="none", choices=["none","mirror","smear","generative"], help="Fill bleed by extending edges (mirror/smear, stays vector for PDFs) or synthesising it from nearby content (generative)")
+    p.add_argument("--bleed_raster_dpi", type=float, default=None, help="Draw mirror/smear bleed as small images rendered at this DPI instead of vector page copies (faster RIP)")
     p.add_argument("--fit", default="fill_bleed_proportional", choices=[
         "fit_trim_proportional",
         "fit_bleed_proportional",
@@ -45,28 +56,149 @@ def main():
     p.add_argument("--crop_marks", action="store_true", help="Draw crop marks")
     p.add_argument("--out", required=True, help="Output folder")
     p.add_argument("--basename", default=None, help="Base filename (default = input filename)")
+    p.add_argument("--downsample_ppi", type=float, default=None, help="Downsample placed images above this effective PPI (e.g. 450)")
+    p.add_argument("--downsample_codec", default="auto", choices=["auto", "jpeg", "flate"], help="Re-encode codec for downsampled images")
+    p.add_argument("--downsample_quality", type=int, default=85, help="JPEG quality for downsampled images")
+    p.add_argument("--export_png", action="store_true", help="Rasterize the press PDFs to PNG with Ghostscript")
+    p.add_argument("--dpi", type=int, default=1200, help="PNG export DPI")
+    p.add_argument("--raster_format", default="png", choices=["png", "tiff"], help="Raster export format")
+    p.add_argument("--tile_size", type=int, default=0, help="Write tiled TIFF with this tile size (multiple of 16)")
+    p.add_argument("--raster_mem_mb", type=float, default=None, help="Stream rasters in strips under this memory cap (MB); applies to PNG/TIFF, JPEG and preview outputs still hold a whole page")
+    p.add_argument("--raster_outputs", default="", help="Encode each render several ways, e.g. png,jpeg:85,tiff:none,preview:0.25 (one Ghostscript pass)")
+    p.add_argument("--raster_budget_mb", type=float, default=None, help="Run rasterizations concurrently within this estimated memory budget (MB)")
+    p.add_argument("--gs_pool", type=int, default=0, help="Experimental: keep this many Ghostscript processes running and reuse them for every PNG render (default 0: one process per render)")
+    p.add_argument("--raster_workers", type=int, default=None, help="Parallel rasterizations (default: 1, or CPU count with --raster_budget_mb)")
+    p.add_argument("--panel_split", default="none", choices=["none", "trifold", "quadfold"], help="Split into panels (PNG crops with --export_png, otherwise vector PDFs)")
+    p.add_argument("--panel_margin", type=float, default=0.125, help="Panel safe-area margin (in)")
+    p.add_argument("--panel_widths", default="", help="Uneven panel widths in inches, e.g. 3.625,3.6875,3.6875")
+    p.add_argument("--gs", default="", help="Path to the Ghostscript executable")
+    p.add_argument("--build_workers", type=int, default=1, help="Parallel PDF builds in a batch")
+    p.add_argument("--prefetch", type=int, default=0, help="Copy this many upcoming batch inputs to local scratch ahead of the builder (NAS/OneDrive sources)")
+    p.add_argument("--prefetch_mb", type=float, default=2048, help="Local scratch limit for prefetched inputs (MB)")
+    p.add_argument("--linearize", action="store_true", help="Write linearized (fast web view) PDFs so viewers on shares show page 1 early (needs pikepdf or qpdf)")
+    p.add_argument("--no_dedupe", action="store_true", help="Place every page independently even if identical pages repeat")
+    p.add_argument("--stage", action="store_true", help="Write to local scratch first, then publish to --out (synced folders)")
+    p.add_argument("--mmap", action="store_true", help="Read source PDFs through a memory map (large/network inputs)")
+    p.add_argument("--queue", default=None, choices=list(DEFAULT_LANES), help="Submit the jobs to this lane of the job queue instead of building now (run it with pressdrop_tools.py queue run)")
+    p.add_argument("--spool", default=None, help="Submit the jobs (with their export settings) to this shared folder for pressdrop_tools.py worker nodes")
+    p.add_argument("--priority", type=int, default=None, help="Queue priority override (higher runs first)")
+    p.add_argument("--proof", action="store_true", help="Also write low-res contact sheets with trim/bleed/safe overlays to <out>/proof")
+    p.add_argument("--qa", action="store_true", help="Check every press page for white slivers, bleed coverage and seams (renders only the edge bands)")
 
     args = p.parse_args()
 
     os.makedirs(args.out, exist_ok=True)
-    job = make_job(
-        input_path=args.input,
-        pages_spec=args.pages,
-        pdf_box=args.pdf_box,
-        trim_size_spec=args.size,
-        bleed_spec=args.bleed,
-        fit_mode=args.fit,
-        anchor=args.anchor,
-        bleed_generator=args.bleed_generator,
-        crop_marks=args.crop_marks,
-        out_dir=args.out,
-        basename=args.basename,
-        emit_job=False,
-    )
+    jobs = []
+    for input_path in args.input:
+        jobs.append(make_job(
+            input_path=input_path,
+            pages_spec=args.pages,
+            pdf_box=args.pdf_box,
+            trim_size_spec=args.size,
+            bleed_spec=args.bleed,
+            fit_mode=args.fit,
+            anchor=args.anchor,
+            bleed_generator=args.bleed_generator,
+            bleed_raster_dpi=args.bleed_raster_dpi,
+            crop_marks=args.crop_marks,
+            out_dir=args.out,
+            basename=args.basename if len(args.input) == 1 else None,
+            emit_job=False,
+            mmap_input=args.mmap,
+            downsample_ppi=args.downsample_ppi,
+            downsample_codec=args.downsample_codec,
+            downsample_quality=args.downsample_quality,
+            dedupe_pages=not args.no_dedupe,
+            linearize=args.linearize,
+        ))
 
-    outputs = build_press_pdf(job)
-    for path in outputs:
-        print(f"Wrote: {path}")
+    if args.queue:
+        queue = JobQueue()
+        for job in jobs:
+            print(f"Queued: {queue.submit(job, lane=args.queue, priority=args.priority)} {job['inputs'][0]['path']} ({args.queue})")
+        return
+
+    panel_widths = parse_panel_widths(args.panel_widths)
+    split_requested = args.panel_split != "none" or bool(panel_widths)
+    export = args.export_png or bool(args.raster_outputs)
+    if args.spool:
+        export_opts = export_options(
+            dpi=args.dpi if export else None, raster_format=args.raster_format, tile_size=args.tile_size,
+            raster_mem_mb=args.raster_mem_mb, raster_outputs=args.raster_outputs,
+            panel_count={"trifold": 3, "quadfold": 4}.get(args.panel_split, 0), panel_margin_in=args.panel_margin,
+            panel_widths=args.panel_widths,
+        )
+        for job in jobs:
+            print(f"Submitted: {submit_job(args.spool, job, export_opts)} {job['inputs'][0]['path']}")
+        return
+    if args.gs_pool > 0:
+        enable_ghostscript_pool(args.gs, size=args.gs_pool)
+    if len(jobs) == 1 and not export and not split_requested:
+        started = time.time()
+        stager = OutputStager() if args.stage else None
+        try:
+            outputs = build_press_pdf(jobs[0], stager=stager)
+        except Exception as exc:
+            record_job(jobs[0], [], {"build": time.time() - started}, error=str(exc), started=started)
+            raise
+        record_job(jobs[0], outputs, {"build": jobs[0]["report"]["build_seconds"]}, started=started)
+        results = [(jobs[0], outputs)]
+        press_pdfs = {path: jobs[0] for path in outputs}
+        if stager:
+            for err in stager.wait():
+                print(f"ERROR: publish {err}")
+            stager.close()
+    else:
+        pipeline = PressPipeline(
+            dpi=args.dpi if export else None,
+            gs_path=args.gs,
+            raster_format=args.raster_format,
+            tile_size=args.tile_size,
+            raster_mem_mb=args.raster_mem_mb,
+            raster_budget_mb=args.raster_budget_mb,
+            raster_targets=parse_raster_targets(args.raster_outputs) if args.raster_outputs else None,
+            raster_workers=args.raster_workers,
+            panel_count={"trifold": 3, "quadfold": 4}.get(args.panel_split, 0),
+            panel_margin_in=args.panel_margin,
+            panel_widths_in=panel_widths,
+            build_workers=args.build_workers,
+            prefetch=args.prefetch,
+            prefetch_mb=args.prefetch_mb,
+            stager=OutputStager() if args.stage else None,
+        )
+        results = []
+        press_pdfs = {}
+        for res in pipeline.run_sync(jobs):
+            press_pdfs.update({path: res.job for path in res.outputs})
+            if res.error:
+                print(f"ERROR: {res.job['inputs'][0]['path']}: {res.error}")
+            results.append((res.job, res.outputs + res.pngs + res.rasters + res.panels + res.safe_panels))
+        if pipeline.stager:
+            for err in pipeline.stager.wait():
+                print(f"ERROR: publish {err}")
+            pipeline.stager.close()
+
+    for job, created in results:
+        for path in created:
+            print(f"Wrote: {path}")
+        for info in job.get("report", {}).get("downsample", []):
+            print(f"Downsampled: {os.path.basename(info['input'])} obj {info['object']} "
+                  f"{info['width']}x{info['height']} -> {info['new_width']}x{info['new_height']} "
+                  f"({info['ppi_before']} -> {info['ppi_after']} ppi), saved {info['bytes_saved']} bytes")
+        masked = job.get("report", {}).get("downsample_skipped_masked")
+        if masked:
+            print(f"Downsample skipped {masked} masked image(s): {', '.join(os.path.basename(i['path']) for i in job['inputs'])}")
+    if len(jobs) > 1:
+        print("\n".join(pipeline.utilization_report()))
+    if args.proof and press_pdfs:
+        for path in build_proof_sheets(list(press_pdfs), os.path.join(args.out, "proof"), gs_path=args.gs, jobs=press_pdfs):
+            print(f"Proof: {path}")
+    if args.qa and press_pdfs:
+        qa_results = []
+        for path in press_pdfs:
+            qa_results.extend(check_pdf(path, gs_path=args.gs))
+        for line in format_report(qa_results):
+            print(line)
 
 if __name__ == "__main__":
     main()
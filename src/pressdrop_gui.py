@@ -11,16 +11,45 @@ import os
 import shutil
 import subprocess
 import sys
+import threading
+import time
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import filedialog, messagebox, simpledialog, ttk
 
-# Rasterize PDFs to PNGs when needed
-from PIL import Image
-
-if os.name == "nt":
-    import winreg
-
-from core import MM_PER_INCH, POINTS_PER_INCH, build_press_pdf, load_presets, make_job, parse_bleed, parse_size
+from PIL import Image, ImageTk
+from pypdf import PdfReader
+
+from core import (
+    MM_PER_INCH,
+    POINTS_PER_INCH,
+    iter_build,
+    load_presets,
+    make_job,
+    parse_bleed,
+    parse_panel_widths,
+    parse_size,
+    split_panels_pdf,
+)
+from history import record_job
+from proof import BLEED_COLOR, SAFE_COLOR, TRIM_COLOR
+from raster import (
+    GHOSTSCRIPT_MISSING,
+    RasterTarget,
+    close_ghostscript_pool,
+    enable_ghostscript_pool,
+    estimate_raster_bytes,
+    export_rasters,
+    find_ghostscript,
+    panel_crop_boxes,
+    rasterize_pdf,
+)
+from sourcecache import enable_source_cache
+from staging import OutputStager
+from tiles import TileCache
+
+
+STREAM_RASTER_MB = 512
 
 
 def resource_path(rel: str) -> str:
@@ -28,6 +57,157 @@ def resource_path(rel: str) -> str:
     return os.path.normpath(os.path.join(base, rel))
 
 
+class PyramidViewer(tk.Toplevel):
+    """Pan/zoom inspection of press pages at export DPI from cached tile pyramids.
+
+    Only the tiles under the window are decoded (from the coarsest level
+    that still covers one screen pixel), and the last MAX_TILES are kept.
+    Drag to pan, wheel to zoom around the pointer.
+    """
+
+    MAX_TILES = 256
+    OVERLAY_COLORS = {name: "#%02x%02x%02x" % rgb for name, rgb in (("bleed", BLEED_COLOR), ("trim", TRIM_COLOR), ("safe", SAFE_COLOR))}
+
+    def __init__(self, master, cache: TileCache, pdf_path: str, page_count: int, dpi: float, job: dict | None = None):
+        super().__init__(master)
+        self.title(f"Inspect: {os.path.basename(pdf_path)} @ {dpi:g} DPI")
+        self.geometry("1000x800")
+        self.cache = cache
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.job = job
+        self.pyramid = None
+        self.zoom = 1.0
+        self.ox = 0.0
+        self.oy = 0.0
+        self._photos: OrderedDict = OrderedDict()
+        self._drag = None
+        self._redraw_pending = False
+        self.page = tk.IntVar(value=1)
+        self.info = tk.StringVar(value="")
+
+        bar = tk.Frame(self)
+        bar.pack(side="top", fill="x")
+        tk.Label(bar, text="Page:").pack(side="left", padx=(8, 2))
+        tk.Spinbox(bar, from_=1, to=max(1, page_count), width=5, textvariable=self.page, command=lambda: self._load_page(self.page.get())).pack(side="left")
+        tk.Button(bar, text="Fit", command=self._fit).pack(side="left", padx=4)
+        tk.Button(bar, text="1:1", command=lambda: self._zoom_at(1.0 / self.zoom, self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2)).pack(side="left")
+        tk.Label(bar, textvariable=self.info, anchor="w").pack(side="left", padx=10)
+
+        self.canvas = tk.Canvas(self, bg="#3a3a3a", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda _e: self._schedule_redraw())
+        self.canvas.bind("<ButtonPress-1>", self._on_press)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<MouseWheel>", lambda e: self._zoom_at(1.25 if e.delta > 0 else 0.8, e.x, e.y))
+        self.canvas.bind("<Button-4>", lambda e: self._zoom_at(1.25, e.x, e.y))
+        self.canvas.bind("<Button-5>", lambda e: self._zoom_at(0.8, e.x, e.y))
+        self._load_page(1)
+
+    def _load_page(self, page: int) -> None:
+        """Build (or open) the page's pyramid on a background thread."""
+        self.info.set(f"Building tiles for page {page}...")
+        result: dict = {}
+
+        def work():
+            try:
+                result["pyramid"] = self.cache.pyramid(self.pdf_path, page, self.dpi, self.job)
+            except Exception as exc:
+                result["error"] = exc
+
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+
+        def poll():
+            if thread.is_alive():
+                self.after(100, poll)
+            elif "error" in result:
+                self.info.set("")
+                messagebox.showerror("Inspect", str(result["error"]), parent=self)
+            else:
+                self.pyramid = result["pyramid"]
+                self._photos.clear()
+                self._fit()
+
+        poll()
+
+    def _fit(self) -> None:
+        if self.pyramid is None:
+            return
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if cw <= 1 or ch <= 1:
+            self.after(50, self._fit)  # not mapped yet
+            return
+        self.zoom = min(cw / self.pyramid.width, ch / self.pyramid.height) * 0.95
+        self.ox = (self.pyramid.width - cw / self.zoom) / 2
+        self.oy = (self.pyramid.height - ch / self.zoom) / 2
+        self._schedule_redraw()
+
+    def _zoom_at(self, factor: float, x: float, y: float) -> None:
+        if self.pyramid is None:
+            return
+        fx, fy = self.ox + x / self.zoom, self.oy + y / self.zoom
+        self.zoom = min(16.0, max(1.0 / 2 ** (self.pyramid.levels + 1), self.zoom * factor))
+        self.ox, self.oy = fx - x / self.zoom, fy - y / self.zoom
+        self._schedule_redraw()
+
+    def _on_press(self, event) -> None:
+        self._drag = (event.x, event.y)
+
+    def _on_drag(self, event) -> None:
+        if self._drag:
+            self.ox -= (event.x - self._drag[0]) / self.zoom
+            self.oy -= (event.y - self._drag[1]) / self.zoom
+            self._drag = (event.x, event.y)
+            self._schedule_redraw()
+
+    def _schedule_redraw(self) -> None:
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _tile_photo(self, level: int, col: int, row: int, scale: float):
+        key = (level, col, row, round(scale, 4))
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            return photo
+        with Image.open(self.pyramid.tile_path(level, col, row)) as img:
+            img.load()
+            if scale != 1.0:
+                # Nearest above 1:1 so single pixels (seams, slivers) stay visible.
+                size = (max(1, int(img.width * scale + 0.999)), max(1, int(img.height * scale + 0.999)))
+                img = img.resize(size, Image.NEAREST if scale > 1 else Image.BILINEAR)
+            photo = ImageTk.PhotoImage(img)
+        self._photos[key] = photo
+        while len(self._photos) > self.MAX_TILES:
+            self._photos.popitem(last=False)
+        return photo
+
+    def _redraw(self) -> None:
+        self._redraw_pending = False
+        self.canvas.delete("all")
+        p = self.pyramid
+        if p is None:
+            return
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        level = p.level_for(self.zoom)
+        step = p.tile * 2 ** level
+        scale = self.zoom * 2 ** level
+        tiles = p.visible_tiles(level, self.ox, self.oy, self.ox + cw / self.zoom, self.oy + ch / self.zoom)
+        for col, row in tiles:
+            x = (col * step - self.ox) * self.zoom
+            y = (row * step - self.oy) * self.zoom
+            self.canvas.create_image(int(x), int(y), anchor="nw", image=self._tile_photo(level, col, row, scale))
+        for name, (x0, y0, x1, y1) in p.overlays.items():
+            self.canvas.create_rectangle(
+                (x0 - self.ox) * self.zoom, (y0 - self.oy) * self.zoom,
+                (x1 - self.ox) * self.zoom, (y1 - self.oy) * self.zoom,
+                outline=self.OVERLAY_COLORS.get(name, "#ffffff"),
+            )
+        self.info.set(f"{p.width}x{p.height}px  zoom {self.zoom * 100:.1f}%  level {level}  {len(tiles)} tiles")
+
+
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -55,11 +235,22 @@ class App(tk.Tk):
         self.auto_generative_fill = tk.BooleanVar(value=False)
         self.panel_split = tk.StringVar(value="none")
         self.panel_margin = tk.StringVar(value="0.125")
+        self.panel_widths = tk.StringVar(value="")
         self.ghostscript_path = tk.StringVar(value=os.environ.get("GS", ""))
         self.indesign_app = tk.StringVar(value=self._default_indesign_path())
+        self.stage_outputs = tk.BooleanVar(value=True)
+        self.linearize = tk.BooleanVar(value=False)
+        self.gs_pool = tk.BooleanVar(value=False)
+        self.status_text = tk.StringVar(value="")
+        self.stager: OutputStager | None = None
+        self.tile_cache: TileCache | None = None
+        self.last_build: tuple | None = None
+        # Re-runs on the same file reuse its parsed/decoded source.
+        self.source_cache = enable_source_cache()
 
         self._load_defaults()
         self._build()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     
     def _build(self):
@@ -215,7 +406,7 @@ class App(tk.Tk):
 
         row += 1
         make_label(row, "Bleed Generator (none/mirror/smear):")
-        ttk.Combobox(container, values=["none", "mirror", "smear"], textvariable=self.bleed_generator, state="readonly").grid(
+        ttk.Combobox(container, values=["none", "mirror", "smear", "generative"], textvariable=self.bleed_generator, state="readonly").grid(
             row=row, column=1, sticky="ew", padx=(14, 10), pady=6
         )
 
@@ -266,6 +457,48 @@ class App(tk.Tk):
         )
         cb_png.grid(row=row, column=1, sticky="w", padx=(14, 10), pady=(2, 4))
 
+        row += 1
+        cb_stage = tk.Checkbutton(
+            container,
+            text="Stage outputs locally, publish in background (synced folders)",
+            variable=self.stage_outputs,
+            bg=BG,
+            fg=TXT,
+            activebackground=BG,
+            activeforeground=TXT,
+            selectcolor=BG,
+            font=("Segoe UI", 10),
+        )
+        cb_stage.grid(row=row, column=1, sticky="w", padx=(14, 10), pady=(2, 4))
+
+        row += 1
+        cb_linearize = tk.Checkbutton(
+            container,
+            text="Fast web view PDF (page 1 opens quickly over shares; needs pikepdf or qpdf)",
+            variable=self.linearize,
+            bg=BG,
+            fg=TXT,
+            activebackground=BG,
+            activeforeground=TXT,
+            selectcolor=BG,
+            font=("Segoe UI", 10),
+        )
+        cb_linearize.grid(row=row, column=1, sticky="w", padx=(14, 10), pady=(2, 4))
+
+        row += 1
+        cb_gs_pool = tk.Checkbutton(
+            container,
+            text="Keep Ghostscript running between PNG exports (experimental)",
+            variable=self.gs_pool,
+            bg=BG,
+            fg=TXT,
+            activebackground=BG,
+            activeforeground=TXT,
+            selectcolor=BG,
+            font=("Segoe UI", 10),
+        )
+        cb_gs_pool.grid(row=row, column=1, sticky="w", padx=(14, 10), pady=(2, 4))
+
         row += 1
         make_label(row, "Export DPI (PNG):")
         make_entry(row, self.export_dpi)
@@ -280,6 +513,10 @@ class App(tk.Tk):
         make_label(row, "Panel Text Margin (in):")
         make_entry(row, self.panel_margin)
 
+        row += 1
+        make_label(row, "Panel Widths (in, optional, e.g. 3.625,3.6875,3.6875):")
+        make_entry(row, self.panel_widths)
+
         row += 1
         make_label(row, "Ghostscript Path (gswin64c.exe):")
         make_entry(row, self.ghostscript_path)
@@ -299,6 +536,24 @@ class App(tk.Tk):
             font=("Segoe UI", 10, "bold"),
         )
         run_btn.grid(row=row, column=2, sticky="e", pady=10)
+        tk.Label(container, textvariable=self.status_text, bg=BG, fg=TXT, font=("Segoe UI", 9), anchor="w").grid(
+            row=row, column=0, columnspan=2, sticky="w", pady=10
+        )
+
+        row += 1
+        tk.Button(
+            container,
+            text="Inspect Bleed...",
+            command=self.inspect,
+            bg=BTN,
+            fg=TXT,
+            activebackground=BTN,
+            activeforeground=TXT,
+            relief="flat",
+            padx=10,
+            pady=6,
+            font=("Segoe UI", 9),
+        ).grid(row=row, column=2, sticky="e", pady=(0, 10))
 
         container.columnconfigure(1, weight=1)
 
@@ -311,115 +566,31 @@ class App(tk.Tk):
         container.bind("<Configure>", _on_frame_configure)
         canvas.bind("<Configure>", _on_canvas_configure)
 
-    def _export_pdf_to_png(self, pdf_path: str, dpi: int) -> list[str]:
-        outputs: list[str] = []
-        manual_gs = self.ghostscript_path.get().strip()
-        manual_gs = self._resolve_ghostscript_path(manual_gs)
-        gs_path = manual_gs or shutil.which("gswin64c") or shutil.which("gswin32c") or shutil.which("gs")
-        if not gs_path:
-            gs_path = self._find_ghostscript_from_registry()
-        if not gs_path and os.name == "nt":
-            common_bins = [
-                r"C:\Program Files\gs\gs10.05.0\bin",
-                r"C:\Program Files\gs\gs10.04.0\bin",
-                r"C:\Program Files\gs\gs10.03.0\bin",
-                r"C:\Program Files\gs\gs10.02.0\bin",
-                r"C:\Program Files\gs\gs10.01.2\bin",
-                r"C:\Program Files\gs\gs10.01.1\bin",
-                r"C:\Program Files\gs\gs10.01.0\bin",
-                r"C:\Program Files\gs\gs10.00.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.05.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.04.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.03.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.02.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.01.2\bin",
-                r"C:\Program Files (x86)\gs\gs10.01.1\bin",
-                r"C:\Program Files (x86)\gs\gs10.01.0\bin",
-                r"C:\Program Files (x86)\gs\gs10.00.0\bin",
-            ]
-            for bin_path in common_bins:
-                candidate = os.path.join(bin_path, "gswin64c.exe")
-                if os.path.exists(candidate):
-                    gs_path = candidate
-                    os.environ["GS"] = candidate
-                    os.environ["PATH"] = bin_path + os.pathsep + os.environ.get("PATH", "")
-                    break
-                candidate = os.path.join(bin_path, "gswin32c.exe")
-                if os.path.exists(candidate):
-                    gs_path = candidate
-                    os.environ["GS"] = candidate
-                    os.environ["PATH"] = bin_path + os.pathsep + os.environ.get("PATH", "")
-                    break
+    def _export_pdf_to_png(self, pdf_path: str, dpi: int, panels: list | None = None,
+                           pdf_data: bytes | None = None) -> tuple[list[str], list[str]]:
+        """PNGs of pdf_path, plus panel crops (raster.panel_crop_boxes) cut from the same render.
+
+        pdf_data is the just-built PDF, rendered from memory instead of read back from disk.
+        """
+        gs_path = find_ghostscript(self.ghostscript_path.get().strip())
+        if gs_path and self.gs_pool.get():
+            # Keep Ghostscript processes warm between exports.
+            enable_ghostscript_pool(gs_path)
+        else:
+            close_ghostscript_pool()
         try:
-            if gs_path:
-                os.environ["GS"] = gs_path
-            with Image.open(pdf_path) as img:
-                total_frames = getattr(img, "n_frames", 1)
-                for idx in range(total_frames):
-                    img.seek(idx)
-                    rgb = img.convert("RGB")
-                    suffix = f"_page_{idx + 1:03d}" if total_frames > 1 else ""
-                    out_path = os.path.splitext(pdf_path)[0] + f"{suffix}.png"
-                    rgb.save(out_path, dpi=(dpi, dpi))
-                    outputs.append(out_path)
+            if panels:
+                outputs, panel_files = export_rasters(pdf_path, dpi, [RasterTarget("png")], gs_path, STREAM_RASTER_MB, panels=panels,
+                                                      pdf_data=pdf_data)
+                return outputs[0], panel_files
+            # Pages bigger than the cap (posters at press DPI) go through the strip-streaming encoder.
+            cap = STREAM_RASTER_MB if estimate_raster_bytes(pdf_path, dpi, pdf_data) > STREAM_RASTER_MB * 1024 * 1024 else None
+            return rasterize_pdf(pdf_path, dpi, gs_path, memory_cap_mb=cap, pdf_data=pdf_data), []
         except Exception as exc:
             raise RuntimeError(
-                "Could not export PNGs. PDF rasterization requires Ghostscript or Poppler."
-                + ("" if gs_path else " Ghostscript was not found on PATH/registry; set GS or PATH and restart.")
+                "Could not export PNGs. PDF rasterization requires Ghostscript."
+                + ("" if gs_path else " " + GHOSTSCRIPT_MISSING)
             ) from exc
-        return outputs
-
-    def _resolve_ghostscript_path(self, path: str) -> str:
-        if not path:
-            return ""
-        if os.name == "nt" and path.lower().endswith(".lnk"):
-            try:
-                cmd = (
-                    "$s=(New-Object -ComObject WScript.Shell).CreateShortcut('"
-                    + path.replace("'", "''")
-                    + "'); $s.TargetPath"
-                )
-                target = subprocess.check_output(["powershell", "-NoProfile", "-Command", cmd], text=True).strip()
-                return target or path
-            except Exception:
-                return path
-        return path
-
-    def _find_ghostscript_from_registry(self) -> str:
-        if os.name != "nt":
-            return ""
-        keys = [
-            r"SOFTWARE\Ghostscript\GPL Ghostscript",
-            r"SOFTWARE\WOW6432Node\Ghostscript\GPL Ghostscript",
-            r"SOFTWARE\Ghostscript\AGPL Ghostscript",
-            r"SOFTWARE\WOW6432Node\Ghostscript\AGPL Ghostscript",
-        ]
-        for root in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
-            for key_path in keys:
-                try:
-                    with winreg.OpenKey(root, key_path) as key:
-                        idx = 0
-                        versions = []
-                        while True:
-                            try:
-                                versions.append(winreg.EnumKey(key, idx))
-                                idx += 1
-                            except OSError:
-                                break
-                        for version in sorted(versions, reverse=True):
-                            try:
-                                with winreg.OpenKey(key, version) as subkey:
-                                    install_dir, _ = winreg.QueryValueEx(subkey, "GS_DLL")
-                                    bin_dir = os.path.dirname(install_dir)
-                                    for exe_name in ("gswin64c.exe", "gswin32c.exe"):
-                                        candidate = os.path.join(bin_dir, exe_name)
-                                        if os.path.exists(candidate):
-                                            return candidate
-                            except OSError:
-                                continue
-                except OSError:
-                    continue
-        return ""
 
     def _default_indesign_path(self) -> str:
         env_path = os.environ.get("INDESIGN_APP")
@@ -440,69 +611,6 @@ class App(tk.Tk):
             return float(value) / POINTS_PER_INCH
         raise ValueError(f"Unsupported unit: {unit}")
 
-    def _split_panels(
-        self,
-        png_path: str,
-        panel_count: int,
-        trim_w_in: float,
-        trim_h_in: float,
-        bleed: dict,
-        margin_in: float,
-    ) -> tuple[list[str], list[str]]:
-        panel_outputs: list[str] = []
-        safe_outputs: list[str] = []
-        bleed_left = float(bleed["left"])
-        bleed_right = float(bleed["right"])
-        bleed_top = float(bleed["top"])
-        bleed_bottom = float(bleed["bottom"])
-        total_w_in = trim_w_in + bleed_left + bleed_right
-        total_h_in = trim_h_in + bleed_top + bleed_bottom
-        panel_trim_w = trim_w_in / panel_count
-
-        with Image.open(png_path) as img:
-            img = img.convert("RGB")
-            px_per_in_x = img.width / total_w_in
-            px_per_in_y = img.height / total_h_in
-            for idx in range(panel_count):
-                x0_in = bleed_left + panel_trim_w * idx
-                x1_in = bleed_left + panel_trim_w * (idx + 1)
-                if idx == 0:
-                    x0_in = 0
-                if idx == panel_count - 1:
-                    x1_in = total_w_in
-                y0_in = 0
-                y1_in = total_h_in
-
-                crop = img.crop(
-                    (
-                        int(round(x0_in * px_per_in_x)),
-                        int(round(y0_in * px_per_in_y)),
-                        int(round(x1_in * px_per_in_x)),
-                        int(round(y1_in * px_per_in_y)),
-                    )
-                )
-                panel_path = os.path.splitext(png_path)[0] + f"_panel_{idx + 1}.png"
-                crop.save(panel_path)
-                panel_outputs.append(panel_path)
-
-                if margin_in > 0:
-                    safe_x0 = bleed_left + panel_trim_w * idx + margin_in
-                    safe_x1 = bleed_left + panel_trim_w * (idx + 1) - margin_in
-                    safe_y0 = bleed_top + margin_in
-                    safe_y1 = bleed_top + trim_h_in - margin_in
-                    safe = img.crop(
-                        (
-                            int(round(safe_x0 * px_per_in_x)),
-                            int(round(safe_y0 * px_per_in_y)),
-                            int(round(safe_x1 * px_per_in_x)),
-                            int(round(safe_y1 * px_per_in_y)),
-                        )
-                    )
-                    safe_path = os.path.splitext(png_path)[0] + f"_panel_{idx + 1}_safe.png"
-                    safe.save(safe_path)
-                    safe_outputs.append(safe_path)
-        return panel_outputs, safe_outputs
-
     def _launch_indesign_file(self, file_path: str) -> None:
         app_path = self.indesign_app.get().strip()
         try:
@@ -609,10 +717,18 @@ class App(tk.Tk):
             self.panel_split.set(str(data["panel_split"]))
         if "panel_margin" in data:
             self.panel_margin.set(str(data["panel_margin"]))
+        if "panel_widths" in data:
+            self.panel_widths.set(str(data["panel_widths"]))
         if "ghostscript_path" in data:
             self.ghostscript_path.set(str(data["ghostscript_path"]))
         if "indesign_app" in data:
             self.indesign_app.set(data["indesign_app"])
+        if "stage_outputs" in data:
+            self.stage_outputs.set(bool(data["stage_outputs"]))
+        if "linearize" in data:
+            self.linearize.set(bool(data["linearize"]))
+        if "gs_pool" in data:
+            self.gs_pool.set(bool(data["gs_pool"]))
 
     def _collect_defaults(self) -> dict:
         return {
@@ -632,8 +748,12 @@ class App(tk.Tk):
             "auto_generative_fill": bool(self.auto_generative_fill.get()),
             "panel_split": self.panel_split.get().strip(),
             "panel_margin": self.panel_margin.get().strip(),
+            "panel_widths": self.panel_widths.get().strip(),
             "ghostscript_path": self.ghostscript_path.get().strip(),
             "indesign_app": self.indesign_app.get().strip(),
+            "stage_outputs": bool(self.stage_outputs.get()),
+            "linearize": bool(self.linearize.get()),
+            "gs_pool": bool(self.gs_pool.get()),
         }
 
     def save_default(self) -> None:
@@ -714,6 +834,61 @@ class App(tk.Tk):
         if "crop_marks" in p:
             self.crop_marks.set(bool(p["crop_marks"]))
 
+    def _get_stager(self) -> OutputStager:
+        if self.stager is None:
+            self.stager = OutputStager()
+        return self.stager
+
+    def _poll_publish(self) -> None:
+        if self.stager is None:
+            return
+        done, total, done_bytes, total_bytes = self.stager.progress()
+        errors = self.stager.errors()
+        if errors:
+            self.status_text.set(f"Publish failed: {errors[0]}")
+        elif done < total:
+            self.status_text.set(f"Publishing {done}/{total} files ({done_bytes / 1e6:.0f}/{total_bytes / 1e6:.0f} MB)...")
+            self.after(500, self._poll_publish)
+        else:
+            self.status_text.set(f"All {total} staged outputs published.")
+
+    def inspect(self) -> None:
+        """Open the last built PDF in the deep-zoom viewer at the export DPI."""
+        if self.last_build is None:
+            messagebox.showinfo("Inspect", "Run a job first.")
+            return
+        pdf_path, job = self.last_build
+        try:
+            if self.stager is not None:
+                pdf_path = self.stager.wait_for(pdf_path)
+            dpi = float(self.export_dpi.get().strip() or "1200")
+            page_count = len(PdfReader(pdf_path).pages)
+        except Exception as exc:
+            messagebox.showerror("Inspect", str(exc))
+            return
+        if self.tile_cache is None:
+            self.tile_cache = TileCache()
+        self.tile_cache.gs_path = find_ghostscript(self.ghostscript_path.get().strip())
+        PyramidViewer(self, self.tile_cache, pdf_path, page_count, dpi, job)
+
+    def _cache_summary(self, job: dict) -> str:
+        cache = self.source_cache
+        stats = cache.stats()
+        return (f"Source cache: {job['report'].get('cache_hits', 0)} hit(s) this run, "
+                f"{cache.hit_rate:.0%} overall ({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['bytes'] / 1e6:.0f} MB")
+
+    def _on_close(self) -> None:
+        if self.stager is not None:
+            done, total, _, _ = self.stager.progress()
+            if done < total and not messagebox.askyesno(
+                "Publishing", f"{total - done} output(s) are still being published.\nWait for them and quit?"
+            ):
+                return
+            self.stager.wait()
+            self.stager.close()
+        close_ghostscript_pool()
+        self.destroy()
+
     def run(self):
         inp = self.input_path.get().strip()
         outdir = self.output_dir.get().strip()
@@ -725,6 +900,10 @@ class App(tk.Tk):
             return
 
         base = os.path.splitext(os.path.basename(inp))[0] + "_PressDrop"
+        job = None
+        timings: dict[str, float] = {}
+        created: list[str] = []
+        started = time.time()
 
         try:
             should_emit_job = bool(self.make_indd.get() or self.launch_indesign.get())
@@ -742,53 +921,102 @@ class App(tk.Tk):
                 out_dir=outdir,
                 basename=base,
                 auto_generative_fill=bool(self.auto_generative_fill.get()),
+                linearize=bool(self.linearize.get()),
                 emit_job=False,  # <--- CHANGED: Wait until file is built
             )
 
             # 2. Build the PDF (This generates the file with the mirror/bleed applied)
-            outputs = build_press_pdf(job)
-            
-            msg = "Created:\n" + "\n".join(outputs)
+            stager = self._get_stager() if self.stage_outputs.get() else None
+            t0 = time.perf_counter()
+            outputs = []
+            built: dict[str, bytes | None] = {}
+            shown_at = 0.0
+            # Keep the PDF in memory when something consumes it next, so it is not read back from the (synced) folder.
+            keep_pdf = bool(self.export_png.get()) or self.panel_split.get().strip().lower() in ("trifold", "quadfold")
+            for event in iter_build(job, stager=stager, keep_pdf=keep_pdf):
+                if event.kind == "file_written":
+                    outputs.append(event.path)
+                    built[event.path] = event.data
+                elif event.kind == "page_placed" and (event.page == event.pages_total or event.elapsed - shown_at > 0.2):
+                    shown_at = event.elapsed
+                    self.status_text.set(f"Building page {event.page}/{event.pages_total}...")
+                    self.update_idletasks()
+            timings["build"] = time.perf_counter() - t0
+            created.extend(outputs)
+            self.last_build = (outputs[0], job)
+            cache_line = self._cache_summary(job)
+            self.status_text.set(f"Built in {timings['build']:.2f}s. {cache_line}")
+            work_pdf = stager.local_path(outputs[0]) if stager else outputs[0]
+
+            def shown(paths: list[str]) -> list[str]:
+                return [stager.final_path(p) for p in paths] if stager else paths
+
+            msg = "Created:\n" + "\n".join(outputs) + f"\n\n{cache_line}"
             
             png_outputs: list[str] = []
+            split_mode = self.panel_split.get().strip().lower()
+            panel_widths_in = parse_panel_widths(self.panel_widths.get())
             if self.export_png.get():
                 dpi_value = int(self.export_dpi.get().strip() or "1200")
-                png_outputs = self._export_pdf_to_png(outputs[0], dpi_value)
-                msg += "\n\nPNGs:\n" + "\n".join(png_outputs)
-                split_mode = self.panel_split.get().strip().lower()
+                panel_boxes = None
                 if split_mode in ("trifold", "quadfold"):
                     trim_w, trim_h, unit = parse_size(self.size.get().strip())
                     bleed_vals = parse_bleed(self.bleed.get().strip(), unit)
-                    trim_w_in = self._to_inches(trim_w, unit)
-                    trim_h_in = self._to_inches(trim_h, unit)
-                    margin_in = float(self.panel_margin.get().strip() or "0")
-                    panel_count = 3 if split_mode == "trifold" else 4
-                    for png_path in png_outputs:
-                        panels, safe_panels = self._split_panels(
-                            png_path,
-                            panel_count,
-                            trim_w_in,
-                            trim_h_in,
-                            {
-                                "left": self._to_inches(bleed_vals["left"], unit),
-                                "right": self._to_inches(bleed_vals["right"], unit),
-                                "top": self._to_inches(bleed_vals["top"], unit),
-                                "bottom": self._to_inches(bleed_vals["bottom"], unit),
-                            },
-                            margin_in,
-                        )
-                        msg += "\n\nPanels:\n" + "\n".join(panels)
-                        if safe_panels:
-                            msg += "\n\nSafe Areas:\n" + "\n".join(safe_panels)
+                    panel_boxes = panel_crop_boxes(
+                        3 if split_mode == "trifold" else 4,
+                        self._to_inches(trim_w, unit),
+                        self._to_inches(trim_h, unit),
+                        {side: self._to_inches(bleed_vals[side], unit) for side in ("left", "right", "top", "bottom")},
+                        float(self.panel_margin.get().strip() or "0"),
+                        panel_widths_in,
+                    )
+                t0 = time.perf_counter()
+                # With a split, the panels are cut from the same render as the PNGs.
+                png_outputs, panel_files = self._export_pdf_to_png(work_pdf, dpi_value, panel_boxes, built.get(outputs[0]))
+                timings["rasterize"] = time.perf_counter() - t0
+                if stager:
+                    stager.publish_all(png_outputs + panel_files)
+                created.extend(shown(png_outputs))
+                msg += "\n\nPNGs:\n" + "\n".join(shown(png_outputs))
+                if panel_files:
+                    panels = [p for p in panel_files if not p.endswith("_safe.png")]
+                    safe_panels = [p for p in panel_files if p.endswith("_safe.png")]
+                    created.extend(shown(panels + safe_panels))
+                    msg += "\n\nPanels:\n" + "\n".join(shown(panels))
+                    if safe_panels:
+                        msg += "\n\nSafe Areas:\n" + "\n".join(shown(safe_panels))
+            elif split_mode in ("trifold", "quadfold"):
+                # No image output requested: split the vector PDF by page boxes, no rasterization.
+                t0 = time.perf_counter()
+                panel_count = 3 if split_mode == "trifold" else 4
+                margin_in = float(self.panel_margin.get().strip() or "0")
+                panels, safe_panels = split_panels_pdf(work_pdf, panel_count, margin_in, panel_widths_in, built.get(outputs[0]))
+                timings["split"] = time.perf_counter() - t0
+                if stager:
+                    stager.publish_all(panels + safe_panels)
+                created.extend(shown(panels + safe_panels))
+                msg += "\n\nPanels (PDF):\n" + "\n".join(shown(panels))
+                if safe_panels:
+                    msg += "\n\nSafe Areas (PDF):\n" + "\n".join(shown(safe_panels))
 
             if self.open_output_in_indesign.get():
                 to_open = png_outputs[0] if png_outputs else outputs[0]
+                t0 = time.perf_counter()
+                if stager:
+                    to_open = stager.wait_for(to_open)
                 self._launch_indesign_file(to_open)
+                timings["launch"] = time.perf_counter() - t0
                 msg += f"\n\nOpening in InDesign:\n{to_open}"
 
+            record_job(job, created, timings, started=started)
+            if stager:
+                msg += "\n\nOutputs are publishing in the background (see status bar)."
+                self._poll_publish()
             messagebox.showinfo("Done", msg)
-            
+
         except Exception as e:
+            if job is not None:
+                record_job(job, created, timings, error=str(e), started=started)
             messagebox.showerror("Error", str(e))
 
 
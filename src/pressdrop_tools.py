@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""Operational tools.
+
+Examples:
+  python src/pressdrop_tools.py stats
+  python src/pressdrop_tools.py stats --since_hours 24 --prom C:/node_exporter/textfile/pressdrop.prom
+  python src/pressdrop_tools.py proof C:/out/batch --out C:/out/batch/proof
+  python src/pressdrop_tools.py qa C:/out/batch --dpi 150
+  python src/pressdrop_tools.py submit //nas/prepress/spool C:/jobs/*.job.json --dpi 600
+  python src/pressdrop_tools.py worker //nas/prepress/spool
+  python src/pressdrop_tools.py spool //nas/prepress/spool
+  python src/pressdrop_tools.py queue submit C:/jobs/reprint.job.json --lane rush
+  python src/pressdrop_tools.py queue list
+  python src/pressdrop_tools.py queue move 12 --top
+  python src/pressdrop_tools.py queue run --workers 2 --lanes rush=2,catalog=1
+"""
+
+import argparse
+import json
+import time
+
+from history import compute_metrics, default_history_path, format_prometheus, load_history, write_prometheus_textfile
+from jobqueue import DEFAULT_LANES, JobQueue, QueueRunner, parse_lane_limits
+from proof import build_proof_sheets, collect_pdfs
+from qa import QAThresholds, check_pdf, format_report
+from spool import SpoolWorker, export_options, spool_status, submit_job
+from staging import OutputStager
+
+
+def cmd_stats(args) -> None:
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    records = load_history(args.history, since=since)
+    metrics = compute_metrics(records)
+    if args.prom:
+        write_prometheus_textfile(metrics, args.prom)
+        print(f"Wrote: {args.prom}")
+    if args.format == "prom":
+        print(format_prometheus(metrics), end="")
+        return
+    print(f"History: {args.history or default_history_path()} ({len(records)} records)")
+    print(f"Jobs: {metrics['jobs_total']:.0f} ({metrics['jobs_failed_total']:.0f} failed)")
+    print(f"Pages: {metrics['pages_total']:.0f}  ({metrics['pages_per_minute']:.1f} pages/min)")
+    print(f"Latency: p50 {metrics['job_latency_p50_seconds']:.2f}s  p95 {metrics['job_latency_p95_seconds']:.2f}s")
+    print(f"Queue depth: last {metrics['queue_depth']:.0f}  max {metrics['queue_depth_max']:.0f}")
+    print(f"Output: {metrics['output_bytes_total'] / 1e6:.1f} MB  cache hits: {metrics['cache_hits_total']:.0f}")
+    for key, value in metrics.items():
+        if key.startswith("stage_seconds_total"):
+            stage = key.split('"')[1]
+            print(f"Stage {stage}: {value:.2f}s")
+
+
+def cmd_proof(args) -> None:
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        raise SystemExit("No PDFs found.")
+    written = build_proof_sheets(
+        pdfs,
+        args.out,
+        dpi=args.dpi,
+        cols=args.cols,
+        rows=args.rows,
+        safe_margin_in=args.safe,
+        gs_path=args.gs,
+        workers=args.workers,
+    )
+    for path in written:
+        print(f"Wrote: {path}")
+
+
+def cmd_qa(args) -> None:
+    pdfs = collect_pdfs(args.inputs)
+    if not pdfs:
+        raise SystemExit("No PDFs found.")
+    limits = QAThresholds(args.min_coverage, args.max_white_gap, args.max_seam_ratio, args.min_seam_step)
+    results = []
+    for pdf in pdfs:
+        results.extend(check_pdf(pdf, dpi=args.dpi, depth_in=args.depth, limits=limits, gs_path=args.gs))
+    for line in format_report(results, verbose=args.verbose):
+        print(line)
+    if any(page.flagged for page in results):
+        raise SystemExit(1)
+
+
+def cmd_queue(args) -> None:
+    queue = JobQueue(args.queue, lanes=parse_lane_limits(getattr(args, "lanes", "")))
+    if args.action == "submit":
+        for path in args.jobs:
+            with open(path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+            print(f"Queued: {queue.submit(job, lane=args.lane, priority=args.priority)} {path}")
+    elif args.action == "list":
+        rows = queue.list(None if args.all else ["queued", "running", "paused"])
+        print(f"Queue: {queue.path} ({queue.depth()} waiting)")
+        for row in rows:
+            job = json.loads(row["job"])
+            name = job.get("inputs", [{}])[0].get("path", "?")
+            progress = f"{row['pages_done']}p" if row["state"] in ("running", "paused", "done") else ""
+            print(f"{row['id']:>5}  {row['lane']:<12} {row['priority']:>4}  {row['state']:<9} {progress:>6}  {name}")
+    elif args.action == "move":
+        queue.move(args.id, before=args.before, top=args.top, bottom=args.bottom)
+    elif args.action == "priority":
+        queue.set_priority(args.id, args.priority)
+    elif args.action == "cancel":
+        print(f"{args.id}: {queue.cancel(args.id)}")
+    elif args.action == "purge":
+        print(f"Removed {queue.purge(args.older_than_hours * 3600)} finished jobs")
+    elif args.action == "run":
+        stager = OutputStager() if args.stage else None
+        runner = QueueRunner(queue, workers=args.workers, stager=stager, poll=args.poll)
+        try:
+            runner.run(until_empty=not args.forever)
+        except KeyboardInterrupt:
+            print("Stopping: running jobs restart from page 1 on the next run.")
+        finally:
+            if stager:
+                for err in stager.wait():
+                    print(f"ERROR: publish {err}")
+                stager.close()
+        print(f"Preemptions: {runner.preemptions}")
+
+
+def cmd_submit(args) -> None:
+    export = export_options(
+        dpi=args.dpi, raster_outputs=args.raster_outputs,
+        panel_count={"trifold": 3, "quadfold": 4}.get(args.panel_split, 0), panel_margin_in=args.panel_margin,
+    )
+    for path in args.jobs:
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        print(f"Submitted: {submit_job(args.spool, job, export)} {path}")
+
+
+def cmd_worker(args) -> None:
+    worker = SpoolWorker(args.spool, node=args.node, gs_path=args.gs, heartbeat_s=args.heartbeat, lease_s=args.lease, poll_s=args.poll)
+    print(f"Worker {worker.node} on {args.spool}")
+    try:
+        worker.run(until_empty=args.until_empty)
+    except KeyboardInterrupt:
+        print("Stopping: a job in progress is picked up by another worker once its lease expires.")
+    print(f"Done: {worker.done}  failed: {worker.failed}  reclaimed: {worker.reclaimed}")
+
+
+def cmd_spool(args) -> None:
+    status = spool_status(args.spool)
+    print("  ".join(f"{name}: {status[name]}" for name in ("pending", "running", "done", "failed")))
+    for job_id, node, age in status["leases"]:
+        print(f"  {job_id}  {node}  heartbeat {age:.0f}s ago")
+
+
+def main():
+    p = argparse.ArgumentParser(description="PressDrop tools")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    sp = sub.add_parser("stats", help="Summarise run history / export Prometheus metrics")
+    sp.add_argument("--history", default=None, help="History file (default: ~/.pressdrop/history.jsonl or PRESSDROP_HISTORY)")
+    sp.add_argument("--since_hours", type=float, default=None, help="Only consider the last N hours")
+    sp.add_argument("--prom", default=None, help="Also write a Prometheus textfile-collector file here")
+    sp.add_argument("--format", default="text", choices=["text", "prom"], help="Console output format")
+    sp.set_defaults(func=cmd_stats)
+
+    pp = sub.add_parser("proof", help="Render low-res contact sheets with trim/bleed/safe overlays")
+    pp.add_argument("inputs", nargs="+", help="Press PDFs or folders of press PDFs")
+    pp.add_argument("--out", required=True, help="Folder for the proof sheets")
+    pp.add_argument("--dpi", type=float, default=36, help="Thumbnail render DPI")
+    pp.add_argument("--cols", type=int, default=4)
+    pp.add_argument("--rows", type=int, default=5)
+    pp.add_argument("--safe", type=float, default=0.125, help="Safe-area margin inside trim (in)")
+    pp.add_argument("--gs", default="", help="Path to the Ghostscript executable")
+    pp.add_argument("--workers", type=int, default=None, help="Parallel renders (default: CPU count)")
+    pp.set_defaults(func=cmd_proof)
+
+    ap = sub.add_parser("qa", help="Check bleed coverage, white slivers and seams from renders of the page edges")
+    ap.add_argument("inputs", nargs="+", help="Press PDFs or folders of press PDFs")
+    ap.add_argument("--dpi", type=float, default=150, help="Band render DPI")
+    ap.add_argument("--depth", type=float, default=0.25, help="How far inside the trim each band reaches (in)")
+    ap.add_argument("--min_coverage", type=float, default=QAThresholds.min_coverage, help="Flag edges where less of the ink at the trim reaches the bleed edge")
+    ap.add_argument("--max_white_gap", type=int, default=QAThresholds.max_white_gap_px, help="Flag white slivers wider than this (px at --dpi)")
+    ap.add_argument("--max_seam_ratio", type=float, default=QAThresholds.max_seam_ratio, help="Flag trim-line steps this many times the content's own")
+    ap.add_argument("--min_seam_step", type=float, default=QAThresholds.min_seam_step, help="Ignore seams fainter than this (0-255)")
+    ap.add_argument("--gs", default="", help="Path to the Ghostscript executable")
+    ap.add_argument("--verbose", action="store_true", help="Also list metrics of pages that pass")
+    ap.set_defaults(func=cmd_qa)
+
+    sp2 = sub.add_parser("submit", help="Put job JSON files into a shared spool folder for worker nodes")
+    sp2.add_argument("spool", help="Shared spool folder (reachable from every node)")
+    sp2.add_argument("jobs", nargs="+", help="Job JSON files; inputs and output folders must be on the share")
+    sp2.add_argument("--dpi", type=int, default=None, help="Also rasterize at this DPI")
+    sp2.add_argument("--raster_outputs", default="", help="Raster encodings, e.g. png,jpeg:85,preview:0.25")
+    sp2.add_argument("--panel_split", default="none", choices=["none", "trifold", "quadfold"])
+    sp2.add_argument("--panel_margin", type=float, default=0.125, help="Panel safe-area margin (in)")
+    sp2.set_defaults(func=cmd_submit)
+
+    wp = sub.add_parser("worker", help="Build and export jobs from a shared spool folder (run one per node)")
+    wp.add_argument("spool", help="Shared spool folder")
+    wp.add_argument("--node", default=None, help="Worker name (default: host-pid)")
+    wp.add_argument("--gs", default="", help="Path to the Ghostscript executable")
+    wp.add_argument("--heartbeat", type=float, default=10.0, help="Seconds between lease renewals")
+    wp.add_argument("--lease", type=float, default=60.0, help="Reclaim jobs whose worker has been silent this long")
+    wp.add_argument("--poll", type=float, default=2.0, help="Seconds between checks of an empty spool")
+    wp.add_argument("--until_empty", action="store_true", help="Exit once nothing is pending or running")
+    wp.set_defaults(func=cmd_worker)
+
+    stp = sub.add_parser("spool", help="Show spool job counts and running leases")
+    stp.add_argument("spool", help="Shared spool folder")
+    stp.set_defaults(func=cmd_spool)
+
+    qp = sub.add_parser("queue", help="Priority job queue: submit, list, reorder, cancel and run jobs")
+    qp.add_argument("--queue", default=None, help="Queue file (default: ~/.pressdrop/queue.sqlite or PRESSDROP_QUEUE)")
+    qsub = qp.add_subparsers(dest="action", required=True)
+    qs = qsub.add_parser("submit", help="Queue job JSON files (as written by make_job / the InDesign export)")
+    qs.add_argument("jobs", nargs="+")
+    qs.add_argument("--lane", default="standard", choices=list(DEFAULT_LANES))
+    qs.add_argument("--priority", type=int, default=None, help="Override the lane's priority (higher runs first)")
+    ql = qsub.add_parser("list", help="Show waiting, running and paused jobs in run order")
+    ql.add_argument("--all", action="store_true", help="Include finished jobs")
+    qm = qsub.add_parser("move", help="Reorder a job among jobs of equal priority")
+    qm.add_argument("id", type=int)
+    where = qm.add_mutually_exclusive_group(required=True)
+    where.add_argument("--top", action="store_true")
+    where.add_argument("--bottom", action="store_true")
+    where.add_argument("--before", type=int, default=None, help="Place just before this job id")
+    qr = qsub.add_parser("priority", help="Change a queued job's priority")
+    qr.add_argument("id", type=int)
+    qr.add_argument("priority", type=int)
+    qc = qsub.add_parser("cancel", help="Drop a queued job or stop a running one at its next page")
+    qc.add_argument("id", type=int)
+    qg = qsub.add_parser("purge", help="Delete finished jobs")
+    qg.add_argument("--older_than_hours", type=float, default=0)
+    qx = qsub.add_parser("run", help="Build queued jobs, highest priority first")
+    qx.add_argument("--workers", type=int, default=2, help="Jobs built at once across all lanes")
+    qx.add_argument("--lanes", default="", help="Per-lane concurrency limits, e.g. rush=2,catalog=1")
+    qx.add_argument("--poll", type=float, default=1.0, help="Seconds between checks for newly submitted jobs")
+    qx.add_argument("--forever", action="store_true", help="Keep waiting for new jobs instead of exiting when the queue is empty")
+    qx.add_argument("--stage", action="store_true", help="Write to local scratch first, then publish (synced folders)")
+    qp.set_defaults(func=cmd_queue)
+
+    args = p.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
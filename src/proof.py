@@ -0,0 +1,166 @@
+"""Low-res proof contact sheets (bleed/trim/safe overlays) for batch review."""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+from pypdf import PdfReader
+
+from core import POINTS_PER_INCH, CompiledLayout, Rect, _rect_from_pypdf_box
+from raster import find_ghostscript, render_pdf_pages
+
+
+BLEED_COLOR = (30, 120, 255)
+TRIM_COLOR = (230, 30, 30)
+SAFE_COLOR = (20, 170, 60)
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".pressdrop", "thumbs")
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _job_boxes(job: Dict) -> Tuple[Rect, Rect]:
+    """Bleed and trim boxes of a job, as build_press_pdf lays them out."""
+    compiled = CompiledLayout.from_layout(job["layout"])
+    return compiled.bleed_box, compiled.trim_box
+
+
+def render_thumbnails(pdf_path: str, dpi: float, gs_path: str, cache_dir: str) -> List[str]:
+    """Render all pages of pdf_path at dpi, reusing cached renders of identical files."""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = f"{file_digest(pdf_path)}_{dpi:g}"
+    page_count = len(PdfReader(pdf_path).pages)
+    paths = [os.path.join(cache_dir, f"{key}_{idx + 1:03d}.png") for idx in range(page_count)]
+    if all(os.path.exists(p) for p in paths):
+        return paths
+    with tempfile.TemporaryDirectory(dir=cache_dir) as tmp:
+        pattern = os.path.join(tmp, "p_%03d.png")
+        render_pdf_pages(pdf_path, pattern, dpi, gs_path)
+        for idx, final in enumerate(paths):
+            os.replace(pattern % (idx + 1), final)
+    return paths
+
+
+def annotate_thumbnail(
+    thumb_path: str,
+    media: Rect,
+    bleed_box: Rect,
+    trim_box: Rect,
+    safe_margin_pt: float,
+) -> Image.Image:
+    """Draw bleed/trim/safe rectangles on a rendered page (media box at the image edges)."""
+    img = Image.open(thumb_path).convert("RGB")
+    sx = img.width / media.width
+    sy = img.height / media.height
+
+    def to_px(r: Rect) -> Tuple[int, int, int, int]:
+        return (
+            int(round((r.x0 - media.x0) * sx)),
+            int(round((media.y1 - r.y1) * sy)),
+            int(round((r.x1 - media.x0) * sx)) - 1,
+            int(round((media.y1 - r.y0) * sy)) - 1,
+        )
+
+    draw = ImageDraw.Draw(img)
+    draw.rectangle(to_px(bleed_box), outline=BLEED_COLOR)
+    draw.rectangle(to_px(trim_box), outline=TRIM_COLOR)
+    if safe_margin_pt > 0:
+        safe = Rect(trim_box.x0 + safe_margin_pt, trim_box.y0 + safe_margin_pt, trim_box.x1 - safe_margin_pt, trim_box.y1 - safe_margin_pt)
+        if safe.width > 0 and safe.height > 0:
+            draw.rectangle(to_px(safe), outline=SAFE_COLOR)
+    return img
+
+
+def build_proof_sheets(
+    pdf_paths: List[str],
+    out_dir: str,
+    *,
+    dpi: float = 36,
+    cols: int = 4,
+    rows: int = 5,
+    cell_px: int = 320,
+    safe_margin_in: float = 0.125,
+    gs_path: str = "",
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    jobs: Optional[Dict[str, Dict]] = None,
+    basename: str = "proof",
+) -> List[str]:
+    """Render, annotate and tile pdf_paths into contact sheets; returns written files.
+
+    jobs optionally maps a PDF path to its job dict, in which case the
+    overlays come from the job geometry instead of the PDF's own boxes.
+    """
+    gs_path = find_ghostscript(gs_path)
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(out_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        renders = list(pool.map(lambda p: render_thumbnails(p, dpi, gs_path, cache_dir), pdf_paths))
+
+    cells: List[Tuple[Image.Image, str]] = []
+    for pdf_path, thumbs in zip(pdf_paths, renders):
+        reader = PdfReader(pdf_path)
+        job = (jobs or {}).get(pdf_path)
+        for idx, thumb in enumerate(thumbs):
+            page = reader.pages[idx]
+            media = _rect_from_pypdf_box(page.mediabox)
+            if job:
+                bleed_box, trim_box = _job_boxes(job)
+            else:
+                bleed_box = _rect_from_pypdf_box(page.bleedbox)
+                trim_box = _rect_from_pypdf_box(page.trimbox)
+            img = annotate_thumbnail(thumb, media, bleed_box, trim_box, safe_margin_in * POINTS_PER_INCH)
+            label = os.path.basename(pdf_path) + (f" p{idx + 1}" if len(thumbs) > 1 else "")
+            cells.append((img, label))
+
+    label_h = 18
+    per_sheet = max(1, cols * rows)
+    sheets: List[Image.Image] = []
+    written: List[str] = []
+    for start in range(0, len(cells), per_sheet):
+        sheet = Image.new("RGB", (cols * cell_px, rows * (cell_px + label_h)), "white")
+        draw = ImageDraw.Draw(sheet)
+        for n, (img, label) in enumerate(cells[start:start + per_sheet]):
+            cx = (n % cols) * cell_px
+            cy = (n // cols) * (cell_px + label_h)
+            img.thumbnail((cell_px - 8, cell_px - 8))
+            sheet.paste(img, (cx + (cell_px - img.width) // 2, cy + (cell_px - img.height) // 2))
+            draw.text((cx + 4, cy + cell_px), label[:48], fill=(0, 0, 0))
+        sheets.append(sheet)
+        out_jpg = os.path.join(out_dir, f"{basename}_{len(sheets):03d}.jpg")
+        sheet.save(out_jpg, quality=85)
+        written.append(out_jpg)
+
+    if sheets:
+        out_pdf = os.path.join(out_dir, f"{basename}.pdf")
+        sheets[0].save(out_pdf, save_all=True, append_images=sheets[1:], resolution=96)
+        written.insert(0, out_pdf)
+    return written
+
+
+def collect_pdfs(paths: List[str]) -> List[str]:
+    """Expand directories to the press PDFs inside (panel splits are skipped)."""
+    found: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pdf in sorted(glob.glob(os.path.join(path, "*.pdf"))):
+                if "_panel_" not in os.path.basename(pdf):
+                    found.append(pdf)
+        else:
+            found.append(path)
+    return found
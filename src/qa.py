@@ -0,0 +1,202 @@
+"""Automated bleed QA (coverage, white gaps, seams) from renders of the page edges only."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import NameObject, RectangleObject
+
+from core import POINTS_PER_INCH, Rect, _rect_from_pypdf_box
+from raster import require_ghostscript
+from strips import read_exact, read_ppm_header
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+# Any channel below this counts as ink; paper white renders at 255.
+WHITE_LEVEL = 245
+
+
+@dataclass(frozen=True)
+class QAThresholds:
+    min_coverage: float = 0.98
+    max_white_gap_px: int = 1
+    max_seam_ratio: float = 3.0
+    min_seam_step: float = 12.0  # seams fainter than this (0-255) are not flagged
+
+
+@dataclass
+class EdgeMetrics:
+    edge: str
+    coverage: float
+    white_gap_px: int
+    seam: float
+    seam_ratio: float
+
+
+@dataclass
+class PageQA:
+    pdf_path: str
+    page: int
+    edges: List[EdgeMetrics] = field(default_factory=list)
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.reasons)
+
+
+def band_rects(bleed_box: Rect, trim_box: Rect, depth_pt: float) -> Dict[str, Tuple[Rect, float]]:
+    """Per edge with bleed: (band rect, bleed width in pt); the band runs along the trim only."""
+    bands: Dict[str, Tuple[Rect, float]] = {}
+    bleed = {
+        "top": bleed_box.y1 - trim_box.y1, "bottom": trim_box.y0 - bleed_box.y0,
+        "left": trim_box.x0 - bleed_box.x0, "right": bleed_box.x1 - trim_box.x1,
+    }
+    if bleed["top"] > 0:
+        bands["top"] = (Rect(trim_box.x0, trim_box.y1 - depth_pt, trim_box.x1, bleed_box.y1), bleed["top"])
+    if bleed["right"] > 0:
+        bands["right"] = (Rect(trim_box.x1 - depth_pt, trim_box.y0, bleed_box.x1, trim_box.y1), bleed["right"])
+    if bleed["bottom"] > 0:
+        bands["bottom"] = (Rect(trim_box.x0, bleed_box.y0, trim_box.x1, trim_box.y0 + depth_pt), bleed["bottom"])
+    if bleed["left"] > 0:
+        bands["left"] = (Rect(bleed_box.x0, trim_box.y0, trim_box.x0 + depth_pt, trim_box.y1), bleed["left"])
+    return bands
+
+
+def _orient(band: "np.ndarray", edge: str) -> "np.ndarray":
+    """Rotate a rendered band so rows run from the bleed edge inwards and columns along the edge."""
+    if edge == "top":
+        return band
+    if edge == "bottom":
+        return band[::-1]
+    if edge == "left":
+        return band.transpose(1, 0, 2)
+    return band.transpose(1, 0, 2)[::-1]
+
+
+def edge_metrics(edge: str, band: "np.ndarray", bleed_px: int) -> EdgeMetrics:
+    """Metrics of one oriented band (rows: bleed edge -> inside trim); bleed_px rows are bleed."""
+    rgb = band.astype(np.int16)
+    ink = rgb.min(axis=2) < WHITE_LEVEL
+    bleed_px = max(1, min(bleed_px, rgb.shape[0] - 2))
+    at_trim = ink[bleed_px] & ink[bleed_px + 1]
+    reaching = int(at_trim.sum())
+    if reaching:
+        coverage = float((ink[:bleed_px].all(axis=0) & at_trim).sum()) / reaching
+        white_rows = (~ink[:bleed_px] & at_trim).sum(axis=1) > reaching * 0.5
+        white_gap = int(white_rows.sum())
+    else:
+        coverage, white_gap = 1.0, 0
+    across = np.abs(rgb[bleed_px] - rgb[bleed_px - 1]).mean()
+    inside = np.abs(np.diff(rgb[bleed_px:], axis=0)).mean() if rgb.shape[0] - bleed_px > 1 else 0.0
+    return EdgeMetrics(edge, round(coverage, 4), white_gap, round(float(across), 2), round(float(across) / (float(inside) + 1.0), 2))
+
+
+def judge(page: PageQA, limits: QAThresholds) -> PageQA:
+    for m in page.edges:
+        if m.coverage < limits.min_coverage:
+            page.reasons.append(f"{m.edge}: bleed coverage {m.coverage:.1%}")
+        if m.white_gap_px > limits.max_white_gap_px:
+            page.reasons.append(f"{m.edge}: {m.white_gap_px}px white gap at the bleed edge")
+        if m.seam_ratio > limits.max_seam_ratio and m.seam > limits.min_seam_step:
+            page.reasons.append(f"{m.edge}: seam at trim (step {m.seam:.0f}, {m.seam_ratio:.1f}x the content)")
+    return page
+
+
+def _band_pdf(pdf_path: str, depth_pt: float, out_path: str) -> List[Tuple[int, str, float, float, float]]:
+    """Write one band page per edge and page; returns (page, edge, bleed pt, band w pt, band h pt) in order."""
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    order: List[Tuple[int, str, float, float, float]] = []
+    for idx, page in enumerate(reader.pages):
+        bands = band_rects(_rect_from_pypdf_box(page.bleedbox), _rect_from_pypdf_box(page.trimbox), depth_pt)
+        if not bands:
+            continue
+        base = writer.add_page(page)
+        for n, (edge, (rect, bleed_pt)) in enumerate(bands.items()):
+            if n == 0:
+                band = base
+            else:
+                # Same content stream and resources, different window onto them.
+                band = PageObject.create_blank_page(writer, rect.width, rect.height)
+                band[NameObject("/Contents")] = base.raw_get("/Contents")
+                band[NameObject("/Resources")] = base.raw_get("/Resources")
+                band = writer.add_page(band)
+            box = RectangleObject([rect.x0, rect.y0, rect.x1, rect.y1])
+            band.mediabox = box
+            band.cropbox = box
+            order.append((idx + 1, edge, bleed_pt, rect.width, rect.height))
+    with open(out_path, "wb") as f:
+        writer.write(f)
+    return order
+
+
+def check_pdf(
+    pdf_path: str,
+    dpi: float = 150,
+    depth_in: float = 0.25,
+    limits: Optional[QAThresholds] = None,
+    gs_path: str = "",
+) -> List[PageQA]:
+    """Render the edge bands of every page of pdf_path in one Ghostscript run and judge them."""
+    if not HAS_NUMPY:
+        raise RuntimeError("NumPy is required for bleed QA")
+    limits = limits or QAThresholds()
+    gs_path = require_ghostscript(gs_path)
+    pages: Dict[int, PageQA] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        band_path = os.path.join(tmp, "bands.pdf")
+        order = _band_pdf(pdf_path, depth_in * POINTS_PER_INCH, band_path)
+        if not order:
+            return []
+        args = [
+            gs_path, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE",
+            "-sDEVICE=ppmraw", f"-r{dpi:g}",
+            "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+            "-sOutputFile=-", band_path,
+        ]
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            for page_no, edge, bleed_pt, _, _ in order:
+                header = read_ppm_header(proc.stdout)
+                if header is None:
+                    raise RuntimeError(f"Ghostscript produced fewer bands than {len(order)}")
+                width, height, _ = header
+                buf = bytearray(width * height * 3)
+                read_exact(proc.stdout, memoryview(buf))
+                band = _orient(np.frombuffer(buf, np.uint8).reshape(height, width, 3), edge)
+                metrics = edge_metrics(edge, band, int(round(bleed_pt / POINTS_PER_INCH * dpi)))
+                pages.setdefault(page_no, PageQA(pdf_path, page_no)).edges.append(metrics)
+            proc.stdout.close()
+            code = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if code != 0:
+            raise RuntimeError(f"Ghostscript failed ({code}) rendering bleed bands of {pdf_path}")
+    return [judge(page, limits) for _, page in sorted(pages.items())]
+
+
+def format_report(results: List[PageQA], verbose: bool = False) -> List[str]:
+    lines: List[str] = []
+    for page in results:
+        name = f"{os.path.basename(page.pdf_path)} p{page.page}"
+        if page.flagged:
+            lines.append(f"FLAG {name}: " + "; ".join(page.reasons))
+        elif verbose:
+            lines.append(f"ok   {name}: " + "  ".join(
+                f"{m.edge} cov {m.coverage:.0%} gap {m.white_gap_px} seam {m.seam:.0f}/{m.seam_ratio:.1f}x" for m in page.edges))
+    flagged = sum(1 for page in results if page.flagged)
+    lines.append(f"QA: {flagged} of {len(results)} pages flagged")
+    return lines
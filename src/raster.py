@@ -0,0 +1,749 @@
+"""Rasterization helpers (Ghostscript) shared by the GUI, CLI and pipeline.
+
+This module does not import core, so core can use it for render-backed
+features without a circular import.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import io
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from pypdf import PdfReader
+
+from strips import CropSink, ImageSink, PngStripWriter, open_strip_writer, read_exact, read_ppm_header, strip_rows
+
+if os.name == "nt":
+    import winreg
+
+
+COMMON_GS_BINS = [
+    r"C:\Program Files\gs\gs10.05.0\bin",
+    r"C:\Program Files\gs\gs10.04.0\bin",
+    r"C:\Program Files\gs\gs10.03.0\bin",
+    r"C:\Program Files\gs\gs10.02.0\bin",
+    r"C:\Program Files\gs\gs10.01.2\bin",
+    r"C:\Program Files\gs\gs10.01.1\bin",
+    r"C:\Program Files\gs\gs10.01.0\bin",
+    r"C:\Program Files\gs\gs10.00.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.05.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.04.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.03.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.02.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.01.2\bin",
+    r"C:\Program Files (x86)\gs\gs10.01.1\bin",
+    r"C:\Program Files (x86)\gs\gs10.01.0\bin",
+    r"C:\Program Files (x86)\gs\gs10.00.0\bin",
+]
+
+
+def resolve_ghostscript_path(path: str) -> str:
+    """Resolve a Windows .lnk shortcut to its target."""
+    if not path:
+        return ""
+    if os.name == "nt" and path.lower().endswith(".lnk"):
+        try:
+            cmd = (
+                "$s=(New-Object -ComObject WScript.Shell).CreateShortcut('"
+                + path.replace("'", "''")
+                + "'); $s.TargetPath"
+            )
+            target = subprocess.check_output(["powershell", "-NoProfile", "-Command", cmd], text=True).strip()
+            return target or path
+        except Exception:
+            return path
+    return path
+
+
+def find_ghostscript_from_registry() -> str:
+    if os.name != "nt":
+        return ""
+    keys = [
+        r"SOFTWARE\Ghostscript\GPL Ghostscript",
+        r"SOFTWARE\WOW6432Node\Ghostscript\GPL Ghostscript",
+        r"SOFTWARE\Ghostscript\AGPL Ghostscript",
+        r"SOFTWARE\WOW6432Node\Ghostscript\AGPL Ghostscript",
+    ]
+    for root in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
+        for key_path in keys:
+            try:
+                with winreg.OpenKey(root, key_path) as key:
+                    idx = 0
+                    versions = []
+                    while True:
+                        try:
+                            versions.append(winreg.EnumKey(key, idx))
+                            idx += 1
+                        except OSError:
+                            break
+                    for version in sorted(versions, reverse=True):
+                        try:
+                            with winreg.OpenKey(key, version) as subkey:
+                                install_dir, _ = winreg.QueryValueEx(subkey, "GS_DLL")
+                                bin_dir = os.path.dirname(install_dir)
+                                for exe_name in ("gswin64c.exe", "gswin32c.exe"):
+                                    candidate = os.path.join(bin_dir, exe_name)
+                                    if os.path.exists(candidate):
+                                        return candidate
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+    return ""
+
+
+_found_gs: Dict[str, str] = {}
+
+
+def find_ghostscript(manual: str = "") -> str:
+    """Locate a Ghostscript executable: manual path, GS env, PATH, registry, common installs.
+
+    The answer is remembered per manual path (while the file exists), so
+    repeated exports skip the .lnk/PATH/registry probing.
+    """
+    manual = (manual or "").strip()
+    cached = _found_gs.get(manual)
+    if cached and os.path.exists(cached):
+        return cached
+    gs_path = resolve_ghostscript_path(manual)
+    gs_path = gs_path or os.environ.get("GS", "").strip()
+    gs_path = gs_path or shutil.which("gswin64c") or shutil.which("gswin32c") or shutil.which("gs") or ""
+    if not gs_path:
+        gs_path = find_ghostscript_from_registry()
+    if not gs_path and os.name == "nt":
+        for bin_path in COMMON_GS_BINS:
+            for exe_name in ("gswin64c.exe", "gswin32c.exe"):
+                candidate = os.path.join(bin_path, exe_name)
+                if os.path.exists(candidate):
+                    os.environ["PATH"] = bin_path + os.pathsep + os.environ.get("PATH", "")
+                    gs_path = candidate
+                    break
+            if gs_path:
+                break
+    if gs_path:
+        os.environ["GS"] = gs_path
+        _found_gs[manual] = gs_path
+    return gs_path
+
+
+GHOSTSCRIPT_MISSING = "Ghostscript was not found on PATH/registry; set GS or PATH and restart."
+
+
+def require_ghostscript(gs_path: str = "") -> str:
+    """gs_path, or the Ghostscript find_ghostscript() locates; RuntimeError if there is none."""
+    gs_path = gs_path or find_ghostscript()
+    if not gs_path:
+        raise RuntimeError(GHOSTSCRIPT_MISSING)
+    return gs_path
+
+
+def png_output_paths(pdf_path: str, page_count: int, ext: str = ".png", suffix: str = "") -> List[str]:
+    """Raster names for a rasterized PDF: base.png, or base_page_001.png ... for multi-page."""
+    stem = os.path.splitext(pdf_path)[0]
+    if page_count <= 1:
+        return [f"{stem}{suffix}{ext}"]
+    return [f"{stem}_page_{idx + 1:03d}{suffix}{ext}" for idx in range(page_count)]
+
+
+def estimate_raster_bytes(pdf_path: str, dpi: float, pdf_data: Optional[bytes] = None) -> int:
+    """RGB bytes of the largest page of pdf_path (or the PDF bytes pdf_data) rendered at dpi (bleed box, as exported)."""
+    largest = 0
+    for page in PdfReader(io.BytesIO(pdf_data) if pdf_data is not None else pdf_path).pages:
+        box = page.bleedbox
+        px = (float(box.width) / 72.0 * dpi) * (float(box.height) / 72.0 * dpi)
+        largest = max(largest, int(px * 3))
+    return largest
+
+
+def ghostscript_png_args(gs_path: str, pdf_path: str, out_pattern: str, dpi: int) -> List[str]:
+    return [
+        gs_path, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE",
+        "-sDEVICE=png16m", f"-r{int(dpi)}", "-dUseBleedBox",
+        "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+        f"-sOutputFile={out_pattern}", pdf_path,
+    ]
+
+
+def render_pdf_pages(
+    pdf_path: str,
+    out_pattern: str,
+    dpi: float,
+    gs_path: str = "",
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None,
+    device: str = "png16m",
+    use_bleed_box: bool = False,
+) -> None:
+    """Render pages of pdf_path to out_pattern (printf-style, e.g. 'x_%03d.png').
+
+    The full media box is rendered unless use_bleed_box is set, in which case
+    the slug (crop marks) is left out.
+    """
+    gs_path = require_ghostscript(gs_path)
+    pool = shared_ghostscript_pool()
+    if pool is not None and device == "png16m":
+        first = int(first_page or 1)
+        last = int(last_page or len(PdfReader(pdf_path).pages))
+        if pool.try_render(pdf_path, [(n, out_pattern % (n - first + 1)) for n in range(first, last + 1)], dpi, use_bleed_box):
+            return
+    args = [
+        gs_path, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE",
+        f"-sDEVICE={device}", f"-r{dpi:g}",
+        "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+    ]
+    if use_bleed_box:
+        args.append("-dUseBleedBox")
+    if first_page:
+        args.append(f"-dFirstPage={int(first_page)}")
+    if last_page:
+        args.append(f"-dLastPage={int(last_page)}")
+    args += [f"-sOutputFile={out_pattern}", pdf_path]
+    subprocess.run(args, check=True, capture_output=True)
+
+
+def _ps_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+class GhostscriptRenderError(RuntimeError):
+    """Ghostscript reported an error for the document itself (the worker is fine)."""
+
+
+class GhostscriptWorker:
+    """One long-lived Ghostscript process fed PostScript on stdin.
+
+    Startup, font setup and interpreter initialisation are paid once; each
+    render opens the PDF with runpdfbegin and writes every requested page
+    to its own PNG by switching /OutputFile. Ghostscript runs under -dSAFER
+    with file access limited to a private scratch folder: inputs are
+    hard-linked (or copied) in and outputs moved out. A line "PDPOOL <n> OK"
+    on stdout marks the end of each request.
+    """
+
+    def __init__(self, gs_path: str, use_bleed_box: bool = True):
+        self.scratch = tempfile.mkdtemp(prefix="pressdrop_gs_")
+        self.pages = 0
+        self._seq = 0
+        self._err = tempfile.TemporaryFile()
+        allowed = self.scratch.replace("\\", "/").rstrip("/") + "/"
+        args = [
+            gs_path, "-q", "-dSAFER", "-dNOPAUSE", "-sDEVICE=png16m",
+            "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+            f"--permit-file-read={allowed}", f"--permit-file-write={allowed}",
+        ]
+        if use_bleed_box:
+            args.append("-dUseBleedBox")
+        self.proc = subprocess.Popen(args + ["-"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._err)
+
+    def render(self, pdf_path: str, pages: List[Tuple[int, str]], dpi: float, timeout: float = 300.0,
+               pdf_data: Optional[bytes] = None) -> None:
+        """Render (1-based page, output PNG path) pairs of pdf_path (or the PDF bytes pdf_data) at dpi."""
+        self._seq += 1
+        tag = f"PDPOOL {self._seq}"
+        local_pdf = os.path.join(self.scratch, f"in_{self._seq}.pdf")
+        if pdf_data is not None:
+            with open(local_pdf, "wb") as f:
+                f.write(pdf_data)
+        else:
+            try:
+                os.link(pdf_path, local_pdf)
+            except OSError:
+                shutil.copyfile(pdf_path, local_pdf)
+        local_out = [os.path.join(self.scratch, f"out_{self._seq}_{n}.png") for n, _ in pages]
+        to_ps = lambda p: _ps_string(p.replace("\\", "/"))
+        ps = [f"{{ {to_ps(local_pdf)} (r) file runpdfbegin"]
+        for (page, _), out in zip(pages, local_out):
+            ps.append(f"<< /OutputFile {to_ps(out)} /HWResolution [{dpi:g} {dpi:g}] >> setpagedevice {int(page)} pdfgetpage pdfshowpage")
+        ps.append(f"runpdfend }} stopped {{ ({tag} ERR\\n) }} {{ ({tag} OK\\n) }} ifelse print flush\n")
+        timer = threading.Timer(timeout, self.proc.kill)
+        timer.start()
+        try:
+            self.proc.stdin.write("\n".join(ps).encode("utf-8"))
+            self.proc.stdin.flush()
+            while True:
+                line = self.proc.stdout.readline()
+                if not line:
+                    raise RuntimeError("Ghostscript worker exited" + self._stderr_tail())
+                line = line.decode("utf-8", "replace").strip()
+                if line.startswith(tag):
+                    break
+        finally:
+            timer.cancel()
+            os.remove(local_pdf)
+        if line.endswith("ERR"):
+            raise GhostscriptRenderError(f"Ghostscript could not render {pdf_path}" + self._stderr_tail())
+        for out, (_, final) in zip(local_out, pages):
+            shutil.move(out, final)
+        self.pages += len(pages)
+
+    def _stderr_tail(self) -> str:
+        self._err.seek(0)
+        tail = self._err.read()[-400:].decode(errors="replace").strip()
+        return f": {tail}" if tail else ""
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.write(b"quit\n")
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+                self.proc.wait()
+        self._err.close()
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+class GhostscriptPool:
+    """Hand renders to the next idle GhostscriptWorker, recycling workers after max_pages or any error.
+
+    Workers start lazily, up to size at once; bleed-box and media-box
+    renders use separate workers since -dUseBleedBox is a startup switch.
+    Whenever a pool render fails, try_render returns False and the caller
+    spawns a one-off Ghostscript as before. After max_failures pool
+    failures in a row (workers dying, timing out, or Ghostscript rejecting
+    the PostScript protocol before any render has worked) the pool is
+    disabled. Errors in a document, once the pool has rendered anything,
+    do not count: the one-off render hits them too.
+    """
+
+    def __init__(self, gs_path: str = "", size: Optional[int] = None, max_pages: int = 500,
+                 timeout: float = 300.0, max_failures: int = 3):
+        self.gs_path = require_ghostscript(gs_path)
+        self.size = max(1, int(size or min(4, os.cpu_count() or 1)))
+        self.max_pages = max(1, int(max_pages))
+        self.timeout = timeout
+        self.max_failures = max(1, int(max_failures))
+        self.broken = False
+        self.renders = 0
+        self.recycled = 0
+        self.failures = 0  # consecutive pool failures
+        self._idle: Dict[bool, "queue.Queue[GhostscriptWorker]"] = {True: queue.Queue(), False: queue.Queue()}
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._workers: List[GhostscriptWorker] = []
+
+    def _retire(self, worker: GhostscriptWorker) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self.recycled += 1
+        worker.close()
+
+    def render(self, pdf_path: str, pages: List[Tuple[int, str]], dpi: float, use_bleed_box: bool = True,
+               pdf_data: Optional[bytes] = None) -> None:
+        idle = self._idle[bool(use_bleed_box)]
+        with self._slots:
+            try:
+                worker = idle.get_nowait()
+            except queue.Empty:
+                self._trim_idle()
+                worker = GhostscriptWorker(self.gs_path, use_bleed_box)
+                with self._lock:
+                    self._workers.append(worker)
+            try:
+                worker.render(pdf_path, pages, dpi, self.timeout, pdf_data)
+            except BaseException:
+                self._retire(worker)
+                raise
+            with self._lock:
+                self.renders += 1
+            if worker.pages >= self.max_pages:
+                self._retire(worker)
+            else:
+                idle.put(worker)
+
+    def _trim_idle(self) -> None:
+        """Keep at most size processes alive: close an idle worker of the other kind before starting one."""
+        with self._lock:
+            if len(self._workers) < self.size:
+                return
+        for other in self._idle.values():
+            try:
+                self._retire(other.get_nowait())
+                return
+            except queue.Empty:
+                continue
+
+    def try_render(self, pdf_path: str, pages: List[Tuple[int, str]], dpi: float, use_bleed_box: bool = True,
+                   pdf_data: Optional[bytes] = None) -> bool:
+        """Render through the pool; False if it failed and the caller should spawn Ghostscript itself."""
+        if self.broken:
+            return False
+        try:
+            self.render(pdf_path, pages, dpi, use_bleed_box, pdf_data)
+        except Exception as exc:
+            with self._lock:
+                if isinstance(exc, GhostscriptRenderError) and self.renders:
+                    return False  # the document, not the pool
+                self.failures += 1
+                if self.failures >= self.max_failures and not self.broken:
+                    self.broken = True
+                    print(f"LOG: Ghostscript pool disabled after {self.failures} failures in a row, spawning per render instead: {exc}")
+            return False
+        with self._lock:
+            self.failures = 0
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+
+_shared_pool: Optional[GhostscriptPool] = None
+
+
+def enable_ghostscript_pool(gs_path: str = "", size: Optional[int] = None, max_pages: int = 500) -> GhostscriptPool:
+    """Route single-file PNG renders (render_pdf_pages, rasterize_pdf) through a process-wide pool.
+
+    Calling it again with a different Ghostscript replaces the pool.
+    """
+    global _shared_pool
+    if _shared_pool is not None and gs_path and _shared_pool.gs_path != gs_path:
+        close_ghostscript_pool()
+    if _shared_pool is None:
+        _shared_pool = GhostscriptPool(gs_path, size, max_pages)
+        atexit.register(close_ghostscript_pool)
+    return _shared_pool
+
+
+def shared_ghostscript_pool() -> Optional[GhostscriptPool]:
+    return _shared_pool
+
+
+def close_ghostscript_pool() -> None:
+    global _shared_pool
+    if _shared_pool is not None:
+        _shared_pool.close()
+        _shared_pool = None
+
+
+def _page_count(pdf_path: str, pdf_data: Optional[bytes] = None) -> int:
+    return len(PdfReader(io.BytesIO(pdf_data) if pdf_data is not None else pdf_path).pages)
+
+
+def _feed_stdin(pipe, data: bytes) -> None:
+    try:
+        pipe.write(data)
+        pipe.close()
+    except OSError:
+        pass  # Ghostscript exited early; its exit code reports why
+
+
+def _gs_pattern(pdf_path: str) -> str:
+    return os.path.splitext(pdf_path)[0] + "_gs_%03d.png"
+
+
+def _collect_gs_outputs(pdf_path: str, page_count: int) -> List[str]:
+    """Rename Ghostscript's numbered files to the PressDrop naming scheme."""
+    pattern = _gs_pattern(pdf_path)
+    outputs = png_output_paths(pdf_path, page_count)
+    for idx, final in enumerate(outputs):
+        os.replace(pattern % (idx + 1), final)
+    return outputs
+
+
+RASTER_EXTENSIONS = {"png": ".png", "tiff": ".tif", "jpeg": ".jpg"}
+
+
+@dataclass(frozen=True)
+class RasterTarget:
+    """One encoding of each rendered page for export_rasters.
+
+    scale < 1 writes a reduced preview (by the nearest integer factor);
+    quality applies to JPEG, compression ("deflate"/"none") and tile_size to TIFF.
+    """
+    fmt: str = "png"
+    suffix: str = ""
+    scale: float = 1.0
+    quality: int = 90
+    compression: str = "deflate"
+    tile_size: int = 0
+    level: int = 6
+
+    @property
+    def reduce(self) -> int:
+        return max(1, int(round(1.0 / self.scale))) if 0 < self.scale < 1 else 1
+
+    @property
+    def ext(self) -> str:
+        return RASTER_EXTENSIONS[self.fmt]
+
+    @property
+    def streams(self) -> bool:
+        """True if encoded strip by strip; JPEG and reduced previews hold their whole (reduced) page."""
+        return self.fmt != "jpeg" and self.reduce == 1
+
+
+def parse_raster_targets(spec: str) -> List[RasterTarget]:
+    """Parse e.g. 'png,jpeg:85,tiff:none,preview:0.25' (preview = reduced JPEG named *_preview.jpg)."""
+    targets: List[RasterTarget] = []
+    for part in (p.strip().lower() for p in str(spec or "").split(",")):
+        if not part:
+            continue
+        name, _, opt = part.partition(":")
+        if name == "png":
+            targets.append(RasterTarget("png"))
+        elif name in ("tif", "tiff"):
+            targets.append(RasterTarget("tiff", compression=opt or "deflate"))
+        elif name in ("jpg", "jpeg"):
+            targets.append(RasterTarget("jpeg", quality=int(opt or 90)))
+        elif name == "preview":
+            targets.append(RasterTarget("jpeg", suffix="_preview", scale=float(opt or 0.25), quality=80))
+        else:
+            raise ValueError(f"Unknown raster output: {part}")
+    if not targets:
+        raise ValueError("No raster outputs given")
+    return targets
+
+
+def panel_crop_boxes(
+    panel_count: int,
+    trim_w_in: float,
+    trim_h_in: float,
+    bleed: Dict[str, float],
+    margin_in: float,
+    panel_widths_in: Optional[List[float]] = None,
+) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+    """Fold panel (+ safe-area) crops as (file suffix, (x0, y0, x1, y1) in inches from the bleed top-left)."""
+    bleed_left = float(bleed["left"])
+    bleed_top = float(bleed["top"])
+    total_w_in = trim_w_in + bleed_left + float(bleed["right"])
+    total_h_in = trim_h_in + bleed_top + float(bleed["bottom"])
+    if panel_widths_in:
+        panel_count = len(panel_widths_in)
+        edges = [0.0]
+        for w in panel_widths_in:
+            edges.append(edges[-1] + w)
+    else:
+        edges = [trim_w_in * i / panel_count for i in range(panel_count + 1)]
+
+    boxes: List[Tuple[str, Tuple[float, float, float, float]]] = []
+    for idx in range(panel_count):
+        x0_in = 0 if idx == 0 else bleed_left + edges[idx]
+        x1_in = total_w_in if idx == panel_count - 1 else bleed_left + edges[idx + 1]
+        boxes.append((f"_panel_{idx + 1}", (x0_in, 0, x1_in, total_h_in)))
+        if margin_in > 0:
+            boxes.append((f"_panel_{idx + 1}_safe", (
+                bleed_left + edges[idx] + margin_in, bleed_top + margin_in,
+                bleed_left + edges[idx + 1] - margin_in, bleed_top + trim_h_in - margin_in,
+            )))
+    return boxes
+
+
+def _crop_px(box_in: Tuple[float, float, float, float], px_per_in_x: float, px_per_in_y: float) -> Tuple[int, int, int, int]:
+    return tuple(int(round(v * (px_per_in_x if i % 2 == 0 else px_per_in_y))) for i, v in enumerate(box_in))
+
+
+def _open_target(target: RasterTarget, path: str, width: int, height: int, dpi: float):
+    if not target.streams:
+        return ImageSink(path, width, height, dpi, target.reduce, "JPEG" if target.fmt == "jpeg" else target.fmt.upper(), target.quality)
+    return open_strip_writer(path, width, height, dpi, tile_size=target.tile_size, level=target.level, compression=target.compression)
+
+
+def export_rasters(
+    pdf_path: str,
+    dpi: int,
+    targets: List[RasterTarget],
+    gs_path: str = "",
+    memory_cap_mb: float = 256,
+    panels: Optional[List[Tuple[str, Tuple[float, float, float, float]]]] = None,
+    workers: Optional[int] = None,
+    pdf_data: Optional[bytes] = None,
+) -> Tuple[List[List[str]], List[str]]:
+    """Render each page of pdf_path once and encode it for every target (and panel crop) from the same strips.
+
+    Ghostscript streams ppmraw rows; each strip is handed to all encoders in
+    parallel (zlib and libjpeg release the GIL) before the next one is read.
+    panels are panel_crop_boxes() results and are written as PNG next to
+    the first target's files. With pdf_data (the PDF's bytes, e.g. from
+    iter_build(keep_pdf=True)) Ghostscript reads the PDF from stdin and
+    pdf_path only names the outputs. Returns (files per target, panel files);
+    on failure every file written so far is removed.
+    memory_cap_mb bounds the strip buffers and the PNG/TIFF encoders only;
+    each JPEG or preview target (RasterTarget.streams False) also holds its
+    whole (reduced) page image.
+    """
+    gs_path = require_ghostscript(gs_path)
+    cap = int(memory_cap_mb * 1024 * 1024)
+    page_count = _page_count(pdf_path, pdf_data)
+    outputs = [png_output_paths(pdf_path, page_count, t.ext, t.suffix) for t in targets]
+    panel_stems = [os.path.splitext(p)[0] for p in png_output_paths(pdf_path, page_count)]
+    panel_outputs: List[str] = []
+    args = [
+        gs_path, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE",
+        "-sDEVICE=ppmraw", f"-r{int(dpi)}", "-dUseBleedBox",
+        "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+        f"-dMaxBitmap={cap // 2}", f"-dBufferSpace={min(cap // 4, 64 * 1024 * 1024)}",
+        "-sOutputFile=-", "-" if pdf_data is not None else pdf_path,
+    ]
+    sink_count = len(targets) + len(panels or [])
+    sinks: list = []
+    written: List[str] = []
+    with tempfile.TemporaryFile() as err, ThreadPoolExecutor(max_workers=workers or min(sink_count, os.cpu_count() or 1)) as pool:
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE if pdf_data is not None else None, stdout=subprocess.PIPE, stderr=err)
+        if pdf_data is not None:
+            # Fed from a thread: Ghostscript may start writing pixels before it has read all of stdin.
+            threading.Thread(target=_feed_stdin, args=(proc.stdin, pdf_data), daemon=True).start()
+        try:
+            for page in range(page_count):
+                header = read_ppm_header(proc.stdout)
+                if header is None:
+                    raise RuntimeError(f"Ghostscript produced fewer pages than {page_count}")
+                width, height, _ = header
+                row_bytes = width * 3
+                tile_size = max((t.tile_size for t in targets), default=0)
+                if tile_size and tile_size * row_bytes * 2 > cap:
+                    raise ValueError(f"A row of {tile_size}px tiles needs more than {memory_cap_mb:g} MB; use smaller tiles")
+                for i, t in enumerate(targets):
+                    written.append(outputs[i][page])
+                    sinks.append(_open_target(t, outputs[i][page], width, height, dpi))
+                if panels:
+                    for suffix, box_in in panels:
+                        x0, y0, x1, y1 = _crop_px(box_in, float(dpi), float(dpi))
+                        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+                        if x1 <= x0 or y1 <= y0:
+                            continue
+                        path = f"{panel_stems[page]}{suffix}.png"
+                        written.append(path)
+                        sinks.append(CropSink(PngStripWriter(path, x1 - x0, y1 - y0, dpi), width, x0, y0, x1, y1))
+                        panel_outputs.append(path)
+                rows = strip_rows(row_bytes, cap)
+                buf = bytearray(rows * row_bytes)
+                done = 0
+                while done < height:
+                    n = min(rows, height - done)
+                    view = memoryview(buf)[:n * row_bytes]
+                    read_exact(proc.stdout, view)
+                    list(pool.map(lambda sink: sink.write(view), sinks))
+                    done += n
+                list(pool.map(lambda sink: sink.close(), sinks))
+                sinks = []
+            proc.stdout.close()
+            code = proc.wait()
+            if code != 0:
+                err.seek(0)
+                raise RuntimeError(f"Ghostscript failed ({code}): {err.read().decode(errors='replace').strip()}")
+        except BaseException:
+            for sink in sinks:
+                sink.abort()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            # No half-written pages (or pages of a failed run) are left for the next step to pick up.
+            for path in written:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+    return outputs, panel_outputs
+
+
+def stream_rasterize_pdf(
+    pdf_path: str,
+    dpi: int,
+    gs_path: str = "",
+    fmt: str = "png",
+    tile_size: int = 0,
+    memory_cap_mb: float = 256,
+    level: int = 6,
+    pdf_data: Optional[bytes] = None,
+) -> List[str]:
+    """Rasterize with bounded memory: Ghostscript streams ppmraw rows, encoded strip by strip.
+
+    fmt is "png" or "tiff" (tile_size > 0 writes a tiled TIFF). Ghostscript
+    is told to band within the same cap, so peak memory does not grow with
+    page size or DPI.
+    """
+    outputs, _ = export_rasters(pdf_path, dpi, [RasterTarget(fmt, tile_size=tile_size, level=level)], gs_path, memory_cap_mb,
+                                pdf_data=pdf_data)
+    return outputs[0]
+
+
+def rasterize_pdf(
+    pdf_path: str,
+    dpi: int,
+    gs_path: str = "",
+    fmt: str = "png",
+    tile_size: int = 0,
+    memory_cap_mb: Optional[float] = None,
+    pdf_data: Optional[bytes] = None,
+) -> List[str]:
+    """Rasterize every page of pdf_path with Ghostscript.
+
+    PNG without a memory cap goes straight through Ghostscript's png16m
+    device; a cap, TIFF output or tiles use the strip-streaming path.
+    pdf_data, if given, is rendered instead of reading pdf_path back.
+    """
+    if memory_cap_mb or fmt != "png" or tile_size:
+        return stream_rasterize_pdf(pdf_path, dpi, gs_path, fmt, tile_size, memory_cap_mb or 256, pdf_data=pdf_data)
+    gs_path = require_ghostscript(gs_path)
+    page_count = _page_count(pdf_path, pdf_data)
+    pool = shared_ghostscript_pool()
+    if pool is not None:
+        outputs = png_output_paths(pdf_path, page_count)
+        if pool.try_render(pdf_path, list(enumerate(outputs, 1)), dpi, pdf_data=pdf_data):
+            return outputs
+    if pdf_data is not None:
+        subprocess.run(ghostscript_png_args(gs_path, "-", _gs_pattern(pdf_path), dpi), input=pdf_data, check=True, capture_output=True)
+    else:
+        subprocess.run(ghostscript_png_args(gs_path, pdf_path, _gs_pattern(pdf_path), dpi), check=True, capture_output=True)
+    return _collect_gs_outputs(pdf_path, page_count)
+
+
+async def rasterize_pdf_async(pdf_path: str, dpi: int, gs_path: str = "") -> List[str]:
+    """Async variant of rasterize_pdf using asyncio.create_subprocess_exec (or the shared pool)."""
+    if shared_ghostscript_pool() is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, rasterize_pdf, pdf_path, dpi, gs_path)
+    gs_path = require_ghostscript(gs_path)
+    page_count = len(PdfReader(pdf_path).pages)
+    proc = await asyncio.create_subprocess_exec(
+        *ghostscript_png_args(gs_path, pdf_path, _gs_pattern(pdf_path), dpi),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    _, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Ghostscript failed ({proc.returncode}): {err.decode(errors='replace').strip()}")
+    return _collect_gs_outputs(pdf_path, page_count)
+
+
+def split_panels(
+    png_path: str,
+    panel_count: int,
+    trim_w_in: float,
+    trim_h_in: float,
+    bleed: Dict[str, float],
+    margin_in: float,
+    panel_widths_in: Optional[List[float]] = None,
+) -> Tuple[List[str], List[str]]:
+    """Crop a rasterized press page into fold panels (+ optional safe-area crops).
+
+    bleed values are in inches. panel_widths_in gives uneven fold widths
+    (roll/gate folds); they must add up to the trim width.
+    """
+    panel_outputs: List[str] = []
+    safe_outputs: List[str] = []
+    total_w_in = trim_w_in + float(bleed["left"]) + float(bleed["right"])
+    total_h_in = trim_h_in + float(bleed["top"]) + float(bleed["bottom"])
+
+    with Image.open(png_path) as img:
+        img = img.convert("RGB")
+        px_per_in_x = img.width / total_w_in
+        px_per_in_y = img.height / total_h_in
+        for suffix, box_in in panel_crop_boxes(panel_count, trim_w_in, trim_h_in, bleed, margin_in, panel_widths_in):
+            path = os.path.splitext(png_path)[0] + f"{suffix}.png"
+            img.crop(_crop_px(box_in, px_per_in_x, px_per_in_y)).save(path)
+            (safe_outputs if suffix.endswith("_safe") else panel_outputs).append(path)
+    return panel_outputs, safe_outputs
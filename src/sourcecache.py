@@ -0,0 +1,117 @@
+"""Warm in-process cache of parsed sources for repeated builds of the same file.
+
+Operators tweak bleed, anchor or fit and run the same file again and again.
+Without a cache every run parses the source PDF twice (make_job counts its
+pages, iter_build places them), and an image input is decoded, converted
+and re-encoded into a one-page PDF each time. With the cache enabled,
+open_source_pdf hands back the PdfReader from the last run, and image
+inputs reuse their wrapped PDF bytes and decoded pixels.
+
+Entries are keyed by absolute path, mtime and size, so a file saved over
+in between is parsed again. The least recently used entries are dropped
+above max_bytes. Sizes are estimates: a reader counts as its file size,
+an image as its decoded pixel bytes. Readers are shared, not copied, so
+enable the cache only where builds run one at a time (the GUI).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image
+from pypdf import PdfReader
+
+
+DEFAULT_MAX_MB = 512
+
+
+class SourceCache:
+    """LRU of parsed source PDFs, wrapped image PDFs and decoded images, capped at max_bytes."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ident(path: str) -> Tuple[str, int, int]:
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def get(self, kind: str, path: str, load: Callable[[], Any], cost: Callable[[Any], int], extra: Tuple = ()) -> Any:
+        """Cached value of kind for the current version of path, calling load() on a miss."""
+        key = (kind,) + self._ident(path) + tuple(extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = load()
+        size = int(cost(value))
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.bytes -= dropped
+        return value
+
+    def pdf_reader(self, path: str) -> PdfReader:
+        return self.get("pdf", path, lambda: PdfReader(path), lambda _: os.path.getsize(path))
+
+    def image_pdf(self, path: str, max_px: Optional[Tuple[int, int]], build: Callable[[], bytes]) -> bytes:
+        """One-page PDF bytes wrapping the image at path (build makes them on a miss)."""
+        return self.get("image_pdf", path, build, len, (max_px,))
+
+    def image(self, path: str) -> Image.Image:
+        """The decoded image at path; callers must not modify it."""
+        def load() -> Image.Image:
+            img = Image.open(path)
+            img.load()  # decodes and, for single-frame files, closes the file
+            return img
+        return self.get("image", path, load, lambda img: img.width * img.height * len(img.getbands()))
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self.bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+_shared_cache: Optional[SourceCache] = None
+
+
+def enable_source_cache(max_mb: float = DEFAULT_MAX_MB) -> SourceCache:
+    """Turn on the process-wide cache used by core.open_source_pdf and iter_build."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = SourceCache(int(max_mb * 1024 * 1024))
+    return _shared_cache
+
+
+def shared_source_cache() -> Optional[SourceCache]:
+    return _shared_cache
+
+
+def disable_source_cache() -> None:
+    global _shared_cache
+    _shared_cache = None
@@ -0,0 +1,285 @@
+"""Multi-node job sharding through a shared spool folder (pending/, running/, done/, failed/)."""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import parse_panel_widths
+from pipeline import PressPipeline
+from raster import parse_raster_targets
+
+
+SPOOL_DIRS = ("pending", "running", "done", "failed")
+HEARTBEAT_S = 10.0
+LEASE_S = 60.0
+MAX_ATTEMPTS = 3
+
+
+def _write_json(path: str, data: Dict) -> None:
+    """Write via a temp name in the same folder so readers never see a partial file."""
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _rewrite_json(path: str, data: Dict) -> None:
+    """Replace a file we hold: rename it aside, write, rename it back. FileNotFoundError if it is gone (never re-creates it)."""
+    aside = f"{path}.rewrite"
+    os.rename(path, aside)
+    _write_json(aside, data)
+    os.replace(aside, path)
+
+
+def _read_json(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _publish_outputs(build_dir: str, outputs: List[str]) -> List[str]:
+    """Move everything built in build_dir up into its parent (the job's output folder); returns outputs' new paths."""
+    out_dir = os.path.dirname(build_dir)
+    for root, _, files in os.walk(build_dir):
+        dest = os.path.join(out_dir, os.path.relpath(root, build_dir))
+        os.makedirs(dest, exist_ok=True)
+        for fname in files:
+            os.replace(os.path.join(root, fname), os.path.join(dest, fname))
+    return [os.path.join(out_dir, os.path.relpath(p, build_dir)) for p in outputs]
+
+
+def init_spool(spool: str) -> None:
+    for name in SPOOL_DIRS:
+        os.makedirs(os.path.join(spool, name), exist_ok=True)
+
+
+def submit_job(spool: str, job: Dict, export: Optional[Dict] = None) -> str:
+    """Queue a make_job dict; export holds PressPipeline settings (see pipeline_for). Returns the job id."""
+    init_spool(spool)
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    doc = {"id": job_id, "job": job, "export": export or {}, "submitted": time.time(), "attempts": 0}
+    tmp = os.path.join(spool, "pending", f".{job_id}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f)
+    os.replace(tmp, os.path.join(spool, "pending", f"{job_id}.json"))
+    return job_id
+
+
+def export_options(
+    dpi: Optional[int] = None,
+    raster_format: str = "png",
+    tile_size: int = 0,
+    raster_mem_mb: Optional[float] = None,
+    raster_outputs: str = "",
+    panel_count: int = 0,
+    panel_margin_in: float = 0.0,
+    panel_widths: str = "",
+) -> Dict:
+    """JSON-safe export settings for submit_job, mirroring the CLI flags."""
+    return {
+        "dpi": dpi, "raster_format": raster_format, "tile_size": tile_size, "raster_mem_mb": raster_mem_mb,
+        "raster_outputs": raster_outputs, "panel_count": panel_count, "panel_margin_in": panel_margin_in,
+        "panel_widths": panel_widths,
+    }
+
+
+def pipeline_for(export: Dict, gs_path: str = "") -> PressPipeline:
+    """A single-job PressPipeline for a spooled job's export settings."""
+    return PressPipeline(
+        dpi=export.get("dpi"),
+        gs_path=gs_path,
+        raster_format=export.get("raster_format") or "png",
+        tile_size=int(export.get("tile_size") or 0),
+        raster_mem_mb=export.get("raster_mem_mb"),
+        raster_targets=parse_raster_targets(export["raster_outputs"]) if export.get("raster_outputs") else None,
+        panel_count=int(export.get("panel_count") or 0),
+        panel_margin_in=float(export.get("panel_margin_in") or 0.0),
+        panel_widths_in=parse_panel_widths(export.get("panel_widths") or ""),
+    )
+
+
+def spool_status(spool: str) -> Dict[str, Any]:
+    """Job counts per state plus (id, node, heartbeat age) of running jobs."""
+    init_spool(spool)
+    status: Dict[str, Any] = {}
+    for name in SPOOL_DIRS:
+        status[name] = sum(1 for f in os.listdir(os.path.join(spool, name)) if f.endswith(".json"))
+    running: List[Tuple[str, str, float]] = []
+    now = time.time()
+    for fname in sorted(os.listdir(os.path.join(spool, "running"))):
+        if fname.endswith(".json") and "@" in fname:
+            job_id, node = fname[:-5].split("@", 1)
+            try:
+                running.append((job_id, node, now - os.path.getmtime(os.path.join(spool, "running", fname))))
+            except FileNotFoundError:
+                continue
+    status["leases"] = running
+    return status
+
+
+class SpoolWorker:
+    """Claim, build/export and finish spooled jobs until stopped (or the spool is empty)."""
+
+    def __init__(
+        self,
+        spool: str,
+        node: Optional[str] = None,
+        gs_path: str = "",
+        heartbeat_s: float = HEARTBEAT_S,
+        lease_s: float = LEASE_S,
+        poll_s: float = 2.0,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.spool = spool
+        self.node = (node or f"{socket.gethostname()}-{os.getpid()}").replace("@", "_")
+        self.gs_path = gs_path
+        self.heartbeat_s = heartbeat_s
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.max_attempts = max(1, int(max_attempts))
+        self.done = 0
+        self.failed = 0
+        self.reclaimed = 0
+        init_spool(spool)
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.spool, name)
+
+    def reclaim_stale(self) -> int:
+        """Return jobs whose lease expired (their node stopped heartbeating) to pending/."""
+        count = 0
+        now = time.time()
+        for fname in os.listdir(self._dir("running")):
+            if not fname.endswith((".json", ".rewrite", ".finishing")) or "@" not in fname:
+                continue
+            path = os.path.join(self._dir("running"), fname)
+            try:
+                if now - os.path.getmtime(path) <= self.lease_s:
+                    continue
+                os.rename(path, os.path.join(self._dir("pending"), fname.split("@", 1)[0] + ".json"))
+            except OSError:
+                continue  # another node reclaimed it first, or its owner just finished
+            print(f"LOG: Reclaimed {fname} (no heartbeat for {self.lease_s:g}s)")
+            count += 1
+        self.reclaimed += count
+        return count
+
+    def claim(self) -> Optional[str]:
+        """Atomically take the oldest pending job; returns its running path or None."""
+        for fname in sorted(os.listdir(self._dir("pending"))):
+            if not fname.endswith(".json") or fname.startswith("."):
+                continue
+            target = os.path.join(self._dir("running"), f"{fname[:-5]}@{self.node}.json")
+            try:
+                os.rename(os.path.join(self._dir("pending"), fname), target)
+            except OSError:
+                continue  # lost the race to another node
+            os.utime(target)
+            return target
+        return None
+
+    def _heartbeat(self, path: str, stop: threading.Event, lost: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_s):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                lost.set()
+                print(f"LOG: Lease on {os.path.basename(path)} was taken over; its result will be discarded")
+                return
+            except OSError as exc:
+                print(f"LOG: Heartbeat failed for {os.path.basename(path)}: {exc}")
+
+    def process(self, running_path: str) -> Optional[str]:
+        """Run one claimed job; returns "done"/"failed", or None if the lease was lost.
+
+        The job is built into a hidden folder inside its output folder, and
+        its files are moved into place only once the lease is proven in
+        _finish, so a node that lost its lease never touches the outputs.
+        """
+        job_id = os.path.basename(running_path).split("@", 1)[0]
+        try:
+            doc = _read_json(running_path)
+            if not isinstance(doc, dict) or not isinstance(doc.get("job"), dict):
+                raise ValueError("not a spooled job")
+        except (OSError, ValueError) as exc:
+            # Fail it here: thrown back to pending/ it would stop every node that claims it.
+            return self._finish(running_path, {"id": job_id, "node": self.node, "error": f"unreadable job file: {exc}"},
+                                "failed")
+        doc["id"] = job_id
+        doc["attempts"] = int(doc.get("attempts", 0)) + 1
+        doc["node"] = self.node
+        doc["started"] = time.time()
+        if doc["attempts"] > self.max_attempts:
+            doc["error"] = f"gave up after {self.max_attempts} attempts (workers lost while running it)"
+            return self._finish(running_path, doc, "failed")
+        try:
+            _rewrite_json(running_path, doc)
+        except FileNotFoundError:
+            print(f"LOG: Lease on {job_id} was lost before it started")
+            return None
+
+        output = doc["job"].get("output") or {}
+        out_dir = os.path.abspath(output.get("dir") or os.getcwd())
+        build_dir = os.path.join(out_dir, f".{job_id}@{self.node}.partial")
+        stop, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(running_path, stop, lost), daemon=True)
+        beat.start()
+        try:
+            pipeline = pipeline_for(doc.get("export") or {}, self.gs_path)
+            res = pipeline.run_sync([dict(doc["job"], output=dict(output, dir=build_dir))])[0]
+            doc["job"] = dict(res.job, output=output)
+            doc["outputs"] = res.outputs + res.pngs + res.rasters + res.panels + res.safe_panels
+            doc["timings"] = res.timings
+            doc["error"] = res.error
+        except Exception as exc:
+            doc["error"] = str(exc)
+        finally:
+            stop.set()
+            beat.join()
+        doc["finished"] = time.time()
+        try:
+            if lost.is_set():
+                print(f"LOG: Lease on {job_id} was lost while it ran; result discarded")
+                return None
+            return self._finish(running_path, doc, "failed" if doc.get("error") else "done", build_dir)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    def _finish(self, running_path: str, doc: Dict, state: str, build_dir: Optional[str] = None) -> Optional[str]:
+        # Renaming out of the lease first proves we still hold it; a reclaimed file is simply gone.
+        finishing = running_path[:-len(".json")] + ".finishing"
+        try:
+            os.rename(running_path, finishing)
+        except FileNotFoundError:
+            print(f"LOG: Lease on {doc['id']} was lost before it finished; result discarded")
+            return None
+        if build_dir and state == "done":
+            doc["outputs"] = _publish_outputs(build_dir, doc.get("outputs") or [])
+        _write_json(finishing, doc)
+        os.replace(finishing, os.path.join(self._dir(state), f"{doc['id']}.json"))
+        if state == "done":
+            self.done += 1
+        else:
+            self.failed += 1
+            print(f"ERROR: {doc['id']}: {doc.get('error')}")
+        return state
+
+    def run(self, until_empty: bool = False, stop: Optional[threading.Event] = None) -> None:
+        """Work the spool. With until_empty, return once nothing is pending or running anywhere."""
+        while not (stop is not None and stop.is_set()):
+            self.reclaim_stale()
+            running_path = self.claim()
+            if running_path:
+                name = os.path.basename(running_path)
+                state = self.process(running_path)
+                print(f"{self.node}: {name.split('@', 1)[0]} {state or 'lost'}")
+                continue
+            if until_empty and not os.listdir(self._dir("running")):
+                return
+            time.sleep(self.poll_s)
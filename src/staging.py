@@ -0,0 +1,328 @@
+"""Local output staging with background publishing, and input read-ahead.
+
+Synced folders (OneDrive, NAS shares) hook every write, so building straight
+into them is slow and uploads half-written files. OutputStager hands out
+local scratch paths for every artifact, and publish() copies finished files
+to the real destination on a background thread pool under a temporary name,
+then renames them into place in one step.
+
+InputPrefetcher is the other direction: it copies the next few inputs of a
+batch to local scratch while the current one builds.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+WRITE_BUFFER = 8 * 1024 * 1024
+COPY_CHUNK = 4 * 1024 * 1024
+
+
+class OutputStager:
+    """Scratch paths for outputs plus a background pool that publishes them.
+
+    Writing a file that is already queued for publishing (a re-run of the
+    same job) gets a fresh scratch folder, so the earlier copy is never
+    truncated mid-publish; its scratch file is removed once it is published.
+    Publishes of the same path land in the order they were queued.
+    """
+
+    def __init__(self, scratch_dir: Optional[str] = None, workers: int = 2):
+        self.scratch_dir = scratch_dir or tempfile.mkdtemp(prefix="pressdrop_stage_")
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="publish")
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, str] = {}  # scratch subdir -> destination dir
+        self._locals: Dict[str, str] = {}  # final path -> current scratch path
+        self._futures: Dict[str, Future] = {}  # final path -> latest publish future
+        self._published: List[Tuple[str, Future]] = []  # every publish, in order
+        self._total_bytes = 0
+        self._done_bytes = 0
+
+    def local_path(self, final_path: str, fresh: bool = False) -> str:
+        """Scratch path that stands in for final_path until it is published.
+
+        Pass fresh=True when about to (re)write the file: if final_path was
+        already queued for publishing, a new scratch path is handed out.
+        """
+        final_path = os.path.abspath(final_path)
+        if self.is_local(final_path):
+            return final_path
+        dest_dir, name = os.path.split(final_path)
+        with self._lock:
+            current = self._locals.get(final_path)
+            if current is not None and not (fresh and final_path in self._futures):
+                return current
+        if current is None:
+            local_dir = os.path.join(self.scratch_dir, hashlib.sha1(dest_dir.encode("utf-8")).hexdigest()[:12])
+            os.makedirs(local_dir, exist_ok=True)
+        else:
+            local_dir = tempfile.mkdtemp(prefix="run_", dir=self.scratch_dir)
+        local = os.path.join(local_dir, name)
+        with self._lock:
+            self._dirs[local_dir] = dest_dir
+            self._locals[final_path] = local
+        return local
+
+    def is_local(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(os.path.abspath(self.scratch_dir) + os.sep)
+
+    def final_path(self, local_path: str) -> str:
+        local_dir, name = os.path.split(os.path.abspath(local_path))
+        with self._lock:
+            dest_dir = self._dirs.get(local_dir)
+        if dest_dir is None:
+            raise ValueError(f"Not a staged path: {local_path}")
+        return os.path.join(dest_dir, name)
+
+    def open(self, final_path: str, mode: str = "wb"):
+        """Open a fresh staged file for final_path with a large write buffer."""
+        return open(self.local_path(final_path, fresh="w" in mode), mode, buffering=WRITE_BUFFER)
+
+    def _copy_and_rename(self, local: str, final: str, size: int, previous: Optional[Future] = None) -> str:
+        if previous is not None:
+            # An earlier publish of the same file must land first, or its older copy would win.
+            try:
+                previous.result()
+            except Exception:
+                pass
+        dest_dir, name = os.path.split(final)
+        os.makedirs(dest_dir, exist_ok=True)
+        # Temp names that sync clients typically skip; the rename makes the finished file appear in one step.
+        partial = os.path.join(dest_dir, f"~${name}.partial.tmp")
+        try:
+            shutil.copyfile(local, partial)
+            os.replace(partial, final)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        with self._lock:
+            self._done_bytes += size
+            superseded = self._locals.get(final) != local
+        if superseded:
+            os.remove(local)  # a later run already writes elsewhere; nobody reads this copy again
+        return final
+
+    def publish(self, path: str) -> Future:
+        """Queue a staged file (given by its local or final path) for publishing."""
+        if self.is_local(path):
+            local, final = os.path.abspath(path), self.final_path(path)
+            with self._lock:
+                self._locals[final] = local
+        else:
+            local, final = self.local_path(path), os.path.abspath(path)
+        size = os.path.getsize(local)
+        with self._lock:
+            self._total_bytes += size
+            fut = self._pool.submit(self._copy_and_rename, local, final, size, self._futures.get(final))
+            self._futures[final] = fut
+            self._published.append((final, fut))
+        return fut
+
+    def publish_all(self, paths: List[str]) -> List[Future]:
+        return [self.publish(p) for p in paths]
+
+    def wait_for(self, path: str, timeout: Optional[float] = None) -> str:
+        final = self.final_path(path) if self.is_local(path) else os.path.abspath(path)
+        with self._lock:
+            fut = self._futures.get(final)
+        return fut.result(timeout) if fut else final
+
+    def progress(self) -> Tuple[int, int, int, int]:
+        """(files published, files queued, bytes published, bytes queued)."""
+        with self._lock:
+            futures = [fut for _, fut in self._published]
+            total_bytes = self._total_bytes
+            done_bytes = self._done_bytes
+        done = sum(1 for f in futures if f.done())
+        return done, len(futures), done_bytes, total_bytes
+
+    def errors(self) -> List[str]:
+        with self._lock:
+            items = list(self._published)
+        return [f"{final}: {fut.exception()}" for final, fut in items if fut.done() and fut.exception()]
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        with self._lock:
+            futures = [fut for _, fut in self._published]
+        for fut in futures:
+            try:
+                fut.result(timeout)
+            except Exception:
+                pass
+        return self.errors()
+
+    def close(self, remove_scratch: bool = True) -> None:
+        self._pool.shutdown(wait=True)
+        if remove_scratch:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+class InputPrefetcher:
+    """Copy upcoming inputs to local scratch ahead of the builder.
+
+    prefetch() queues paths in batch order; at most depth of them are copied
+    ahead of the caller, and local copies never exceed max_bytes in total
+    (bigger files are read in place). Each copy is verified: the source's
+    size and mtime must not change during the copy and the local file must
+    match its size; verify_hash also re-reads the source and compares SHA-1.
+    local_copy() waits for a file and returns the local path, or the
+    original path if it could not be fetched; release() frees it.
+    """
+
+    def __init__(self, scratch_dir: Optional[str] = None, depth: int = 2, max_bytes: int = 2 * 1024 ** 3,
+                 workers: int = 2, verify_hash: bool = False):
+        self.scratch_dir = scratch_dir or tempfile.mkdtemp(prefix="pressdrop_prefetch_")
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self.depth = max(1, int(depth))
+        self.max_bytes = int(max_bytes)
+        self.verify_hash = verify_hash
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._cond = threading.Condition()
+        self._queue: List[str] = []
+        self._futures: "OrderedDict[str, Future]" = OrderedDict()
+        self._seq = 0
+        self._next_grant = 0
+        self._held = 0
+        self._closed = False
+        self.fetched = 0
+        self.fetched_bytes = 0
+        self.fetch_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.skipped = 0
+
+    def _local_name(self, path: str) -> str:
+        """Same file name as the source (output names derive from it), in a folder per source directory."""
+        key = hashlib.sha1(os.path.dirname(os.path.abspath(path)).encode("utf-8")).hexdigest()[:12]
+        local_dir = os.path.join(self.scratch_dir, key)
+        os.makedirs(local_dir, exist_ok=True)
+        return os.path.join(local_dir, os.path.basename(path))
+
+    def _fetch(self, path: str, seq: int) -> Tuple[str, int]:
+        """Copy path to scratch once the byte budget allows; returns (local path, bytes held)."""
+        try:
+            before = os.stat(path)
+        except OSError:
+            before = None  # the builder reports it
+        need = before.st_size if before and before.st_size <= self.max_bytes else 0
+        with self._cond:
+            # Budget is granted in batch order, so a later input can never hold the space an earlier one needs.
+            self._cond.wait_for(lambda: self._closed or (seq == self._next_grant and self._held + need <= self.max_bytes))
+            if self._closed:
+                return path, 0
+            self._next_grant += 1
+            self._held += need
+            self._cond.notify_all()
+            if not need:
+                self.skipped += before is not None
+                return path, 0
+        local = self._local_name(path)
+        start = time.perf_counter()
+        try:
+            digest = hashlib.sha1()
+            with open(path, "rb") as src, open(local, "wb", buffering=WRITE_BUFFER) as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            after = os.stat(path)
+            if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns) or os.path.getsize(local) != after.st_size:
+                raise OSError(f"{path} changed while it was being fetched")
+            if self.verify_hash and _file_sha1(path) != digest.hexdigest():
+                raise OSError(f"{path} does not match its local copy")
+        except OSError as exc:
+            print(f"LOG: Prefetch of {path} failed ({exc}); reading it in place.")
+            self._drop(local, before.st_size)
+            return path, 0
+        with self._cond:
+            self.fetched += 1
+            self.fetched_bytes += before.st_size
+            self.fetch_seconds += time.perf_counter() - start
+        return local, before.st_size
+
+    def _drop(self, local: str, size: int) -> None:
+        if os.path.exists(local):
+            os.remove(local)
+        with self._cond:
+            self._held -= size
+            self._cond.notify_all()
+
+    def _submit(self, path: str) -> Future:
+        """Caller holds the lock."""
+        self._seq += 1
+        return self._pool.submit(self._fetch, path, self._seq - 1)
+
+    def _fill(self) -> None:
+        with self._cond:
+            while self._queue and len(self._futures) < self.depth:
+                path = self._queue.pop(0)
+                if path not in self._futures:
+                    self._futures[path] = self._submit(path)
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        with self._cond:
+            self._queue.extend(os.path.abspath(p) for p in paths)
+        self._fill()
+
+    def local_copy(self, path: str, timeout: Optional[float] = None) -> str:
+        """Local copy of path (fetched now if it was not queued), or path itself if fetching failed."""
+        path = os.path.abspath(path)
+        with self._cond:
+            fut = self._futures.get(path)
+            if fut is None:
+                if path in self._queue:
+                    self._queue.remove(path)
+                fut = self._futures[path] = self._submit(path)
+        start = time.perf_counter()
+        local, _ = fut.result(timeout)
+        with self._cond:
+            self.wait_seconds += time.perf_counter() - start
+        return local
+
+    def release(self, path: str) -> None:
+        """Delete the local copy of path and start fetching the next queued input."""
+        with self._cond:
+            fut = self._futures.pop(os.path.abspath(path), None)
+        if fut is not None:
+            local, size = fut.result()
+            if size:
+                self._drop(local, size)
+        self._fill()
+
+    def report(self) -> Dict[str, float]:
+        """Fetch totals; overlap is the share of fetch time hidden behind the caller's own work."""
+        with self._cond:
+            hidden = max(0.0, self.fetch_seconds - self.wait_seconds)
+            return {
+                "files": self.fetched,
+                "bytes": self.fetched_bytes,
+                "skipped": self.skipped,
+                "fetch_seconds": self.fetch_seconds,
+                "wait_seconds": self.wait_seconds,
+                "overlap": hidden / self.fetch_seconds if self.fetch_seconds else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,393 @@
+"""Strip-streaming raster encoders.
+
+A 24x36in poster at 1200 DPI is ~1.2 gigapixels (3.5 GB as RGB), far too big
+to hold as one Pillow image. These writers take RGB rows in horizontal strips
+(as Ghostscript's ppmraw device emits them) and encode PNG or TIFF
+incrementally, so peak memory is a few strips regardless of page size.
+Several sinks can share one strip: CropSink feeds a rectangle of it to
+another writer and ImageSink collects a (downscaled) copy for JPEG.
+"""
+
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import BinaryIO, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_FLUSH = 1024 * 1024
+BIGTIFF_THRESHOLD = 2 ** 32 - 2 ** 26
+
+
+def read_ppm_header(stream: BinaryIO) -> Optional[Tuple[int, int, int]]:
+    """Read a binary PPM (P6) header; returns (width, height, maxval) or None at EOF."""
+    tokens: List[bytes] = []
+    token = b""
+    while len(tokens) < 4:
+        ch = stream.read(1)
+        if not ch:
+            if not tokens and not token:
+                return None
+            raise ValueError("Truncated PPM header")
+        if ch == b"#" and not token:
+            while ch not in (b"\n", b""):
+                ch = stream.read(1)
+            continue
+        if ch.isspace():
+            if token:
+                tokens.append(token)
+                token = b""
+            continue
+        token += ch
+    if tokens[0] != b"P6":
+        raise ValueError(f"Unsupported raster stream: {tokens[0]!r}")
+    width, height, maxval = (int(t) for t in tokens[1:])
+    if maxval != 255:
+        raise ValueError("Only 8-bit PPM streams are supported")
+    return width, height, maxval
+
+
+def read_exact(stream: BinaryIO, buf: memoryview) -> None:
+    pos = 0
+    while pos < len(buf):
+        n = stream.readinto(buf[pos:])
+        if not n:
+            raise ValueError("Raster stream ended early")
+        pos += n
+
+
+def strip_rows(row_bytes: int, memory_cap: int) -> int:
+    """Rows per strip so a strip, its filtered copy and the compressor fit in memory_cap."""
+    return max(1, memory_cap // (4 * row_bytes))
+
+
+class PngStripWriter:
+    """Write an RGB PNG row-strip by row-strip (Up filter when NumPy is available)."""
+
+    def __init__(self, path: str, width: int, height: int, dpi: Optional[float] = None, level: int = 6):
+        self.width = width
+        self.height = height
+        self.row_bytes = width * 3
+        self.rows_written = 0
+        self._f = open(path, "wb")
+        self._z = zlib.compressobj(level)
+        self._pending: List[bytes] = []
+        self._pending_len = 0
+        self._prev = None
+        self._f.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        if dpi:
+            ppm = int(round(dpi / 0.0254))
+            self._chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._f.write(struct.pack(">I", len(data)))
+        self._f.write(kind)
+        self._f.write(data)
+        self._f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _emit(self, data: bytes) -> None:
+        if data:
+            self._pending.append(data)
+            self._pending_len += len(data)
+        if self._pending_len >= IDAT_FLUSH:
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending, self._pending_len = [], 0
+
+    def write(self, rows) -> None:
+        rows = memoryview(rows)
+        n = len(rows) // self.row_bytes
+        if HAS_NUMPY:
+            cur = np.frombuffer(rows, dtype=np.uint8).reshape(n, self.row_bytes)
+            prev = np.zeros((1, self.row_bytes), np.uint8) if self._prev is None else self._prev
+            filtered = np.empty((n, self.row_bytes + 1), np.uint8)
+            filtered[:, 0] = 2  # Up
+            np.subtract(cur[:1], prev, out=filtered[:1, 1:])
+            np.subtract(cur[1:], cur[:-1], out=filtered[1:, 1:])
+            self._prev = cur[-1:].copy()
+            self._emit(self._z.compress(filtered.tobytes()))
+        else:
+            for i in range(n):
+                self._emit(self._z.compress(b"\x00"))
+                self._emit(self._z.compress(rows[i * self.row_bytes:(i + 1) * self.row_bytes]))
+        self.rows_written += n
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if self.rows_written != self.height:
+            self._f.close()
+            raise ValueError(f"PNG got {self.rows_written} of {self.height} rows")
+        self._emit(self._z.flush())
+        if self._pending:
+            self._chunk(b"IDAT", b"".join(self._pending))
+        self._chunk(b"IEND", b"")
+        self._f.close()
+
+    def abort(self) -> None:
+        """Close the file without finishing it (the caller removes it)."""
+        self._f.close()
+
+
+_SHORT, _LONG, _RATIONAL, _LONG8 = 3, 4, 5, 16
+TIFF_COMPRESSION = {"none": 1, "deflate": 8}  # 8 = Adobe Deflate
+_TYPE_FMT = {_SHORT: "H", _LONG: "I", _RATIONAL: "II", _LONG8: "Q"}
+
+
+class TiffStripWriter:
+    """Write an RGB TIFF in strips or tiles, Deflate-compressed, switching to BigTIFF for huge pages.
+
+    Rows are buffered only up to one strip (or one row of tiles); the IFD is
+    written at the end once all offsets are known.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        width: int,
+        height: int,
+        dpi: Optional[float] = None,
+        tile_size: int = 0,
+        rows_per_strip: int = 64,
+        level: int = 6,
+        bigtiff: Optional[bool] = None,
+        compression: str = "deflate",
+    ):
+        if tile_size and tile_size % 16:
+            raise ValueError("TIFF tile size must be a multiple of 16")
+        if compression not in TIFF_COMPRESSION:
+            raise ValueError(f"Unsupported TIFF compression: {compression}")
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.tile = int(tile_size)
+        self.block_rows = self.tile or max(1, int(rows_per_strip))
+        self.row_bytes = width * 3
+        self.level = level
+        self.compression = compression
+        self.big = bigtiff if bigtiff is not None else width * height * 3 > BIGTIFF_THRESHOLD
+        self.rows_written = 0
+        self._offsets: List[int] = []
+        self._counts: List[int] = []
+        self._buf = bytearray()
+        self._f = open(path, "wb")
+        if self.big:
+            self._f.write(b"II+\x00" + struct.pack("<HHQ", 8, 0, 0))
+        else:
+            self._f.write(b"II*\x00" + struct.pack("<I", 0))
+
+    def _put(self, data: bytes) -> None:
+        self._offsets.append(self._f.tell())
+        comp = zlib.compress(data, self.level) if self.compression == "deflate" else data
+        self._counts.append(len(comp))
+        self._f.write(comp)
+
+    def _flush_block(self, block: bytes, rows: int) -> None:
+        if not self.tile:
+            self._put(block)
+            return
+        tile_bytes = self.tile * 3
+        for x in range(0, self.width, self.tile):
+            x0 = x * 3
+            x1 = min(x + self.tile, self.width) * 3
+            parts = []
+            for r in range(self.tile):
+                if r < rows:
+                    row = block[r * self.row_bytes + x0:r * self.row_bytes + x1]
+                    parts.append(row + b"\x00" * (tile_bytes - len(row)))
+                else:
+                    parts.append(b"\x00" * tile_bytes)
+            self._put(b"".join(parts))
+
+    def write(self, rows) -> None:
+        self._buf += rows
+        block_bytes = self.block_rows * self.row_bytes
+        while len(self._buf) >= block_bytes:
+            self._flush_block(bytes(self._buf[:block_bytes]), self.block_rows)
+            del self._buf[:block_bytes]
+            self.rows_written += self.block_rows
+
+    def _entries(self) -> List[Tuple[int, int, list]]:
+        off_type = _LONG8 if self.big else _LONG
+        res = float(self.dpi or 72)
+        entries = [
+            (256, _LONG, [self.width]),
+            (257, _LONG, [self.height]),
+            (258, _SHORT, [8, 8, 8]),
+            (259, _SHORT, [TIFF_COMPRESSION[self.compression]]),
+            (262, _SHORT, [2]),  # RGB
+        ]
+        if self.tile:
+            entries += [(277, _SHORT, [3])]
+        else:
+            entries += [
+                (273, off_type, self._offsets),
+                (277, _SHORT, [3]),
+                (278, _LONG, [self.block_rows]),
+                (279, off_type, self._counts),
+            ]
+        entries += [
+            (282, _RATIONAL, [(int(round(res * 100)), 100)]),
+            (283, _RATIONAL, [(int(round(res * 100)), 100)]),
+            (284, _SHORT, [1]),
+            (296, _SHORT, [2]),  # inch
+        ]
+        if self.tile:
+            entries += [
+                (322, _LONG, [self.tile]),
+                (323, _LONG, [self.tile]),
+                (324, off_type, self._offsets),
+                (325, off_type, self._counts),
+            ]
+        return entries
+
+    def _write_ifd(self) -> int:
+        if self._f.tell() % 2:
+            self._f.write(b"\x00")
+        ifd_pos = self._f.tell()
+        entries = self._entries()
+        count_fmt, entry_size, slot, next_fmt = ("<Q", 20, 8, "<Q") if self.big else ("<H", 12, 4, "<I")
+        data_pos = ifd_pos + struct.calcsize(count_fmt) + entry_size * len(entries) + struct.calcsize(next_fmt)
+        table = [struct.pack(count_fmt, len(entries))]
+        extra = []
+        for tag, typ, values in entries:
+            flat = [v for item in values for v in (item if isinstance(item, tuple) else (item,))]
+            payload = struct.pack("<" + _TYPE_FMT[typ] * len(values), *flat)
+            head = struct.pack("<HHQ" if self.big else "<HHI", tag, typ, len(values))
+            if len(payload) <= slot:
+                table.append(head + payload.ljust(slot, b"\x00"))
+            else:
+                table.append(head + struct.pack("<Q" if self.big else "<I", data_pos))
+                extra.append(payload)
+                data_pos += len(payload) + (len(payload) % 2)
+                if len(payload) % 2:
+                    extra.append(b"\x00")
+        table.append(struct.pack(next_fmt, 0))
+        self._f.write(b"".join(table))
+        self._f.write(b"".join(extra))
+        if not self.big and self._f.tell() > 2 ** 32:
+            raise ValueError("TIFF exceeded 4 GB; retry with bigtiff=True")
+        return ifd_pos
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if self._buf:
+            rows = len(self._buf) // self.row_bytes
+            block = bytes(self._buf)
+            if not self.tile:
+                self._put(block)
+            else:
+                self._flush_block(block, rows)
+            self.rows_written += rows
+            self._buf = bytearray()
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"TIFF got {self.rows_written} of {self.height} rows")
+            ifd_pos = self._write_ifd()
+            self._f.seek(8 if self.big else 4)
+            self._f.write(struct.pack("<Q" if self.big else "<I", ifd_pos))
+        finally:
+            self._f.close()
+
+    def abort(self) -> None:
+        """Close the file without writing the directory (the caller removes it)."""
+        self._f.close()
+
+
+def open_strip_writer(path: str, width: int, height: int, dpi: Optional[float] = None, tile_size: int = 0, level: int = 6,
+                      compression: str = "deflate"):
+    """PNG or TIFF writer chosen by the file extension."""
+    if path.lower().endswith((".tif", ".tiff")):
+        return TiffStripWriter(path, width, height, dpi, tile_size=tile_size, level=level, compression=compression)
+    return PngStripWriter(path, width, height, dpi, level=level)
+
+
+class CropSink:
+    """Pass the x0:x1, y0:y1 rectangle of incoming full-width strips to another strip writer."""
+
+    def __init__(self, writer, page_width: int, x0: int, y0: int, x1: int, y1: int):
+        self.writer = writer
+        self.page_row = page_width * 3
+        self.x0, self.x1 = x0 * 3, x1 * 3
+        self.y0, self.y1 = y0, y1
+        self.row = 0
+
+    def write(self, rows) -> None:
+        rows = memoryview(rows)
+        n = len(rows) // self.page_row
+        first, last = max(self.y0, self.row), min(self.y1, self.row + n)
+        self.row += n
+        if first >= last:
+            return
+        if HAS_NUMPY:
+            block = np.frombuffer(rows, dtype=np.uint8).reshape(n, self.page_row)
+            start = first - (self.row - n)
+            self.writer.write(np.ascontiguousarray(block[start:start + last - first, self.x0:self.x1]).reshape(-1).data)
+        else:
+            base = self.row - n
+            self.writer.write(b"".join(rows[(r - base) * self.page_row + self.x0:(r - base) * self.page_row + self.x1] for r in range(first, last)))
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def abort(self) -> None:
+        self.writer.abort()
+
+
+class ImageSink:
+    """Collect strips into a Pillow image (reduced by an integer factor) and save it on close.
+
+    For encoders that cannot stream (JPEG); memory is the output image, so
+    full-size JPEGs of huge pages should be avoided.
+    """
+
+    def __init__(self, path: str, width: int, height: int, dpi: Optional[float] = None, reduce: int = 1,
+                 fmt: str = "JPEG", quality: int = 90):
+        self.path = path
+        self.width = width
+        self.reduce = max(1, int(reduce))
+        self.dpi = dpi / self.reduce if dpi else None
+        self.fmt = fmt
+        self.quality = quality
+        self.image = Image.new("RGB", (-(-width // self.reduce), -(-height // self.reduce)))
+        self._carry = b""
+        self._y = 0
+
+    def _put(self, data: bytes) -> None:
+        strip = Image.frombuffer("RGB", (self.width, len(data) // (self.width * 3)), data, "raw", "RGB", 0, 1)
+        if self.reduce > 1:
+            strip = strip.reduce(self.reduce)
+        self.image.paste(strip, (0, self._y))
+        self._y += strip.height
+
+    def write(self, rows) -> None:
+        data = self._carry + bytes(rows)
+        group = self.width * 3 * self.reduce
+        usable = len(data) - len(data) % group
+        self._carry = data[usable:]
+        if usable:
+            self._put(data[:usable])
+
+    def close(self) -> None:
+        if self.image is None:
+            return
+        if self._carry:
+            self._put(self._carry)
+        options = {"quality": self.quality, "optimize": True} if self.fmt == "JPEG" else {}
+        if self.dpi:
+            options["dpi"] = (self.dpi, self.dpi)
+        self.image.save(self.path, self.fmt, **options)
+        self.image = None
+
+    def abort(self) -> None:
+        self.image = None
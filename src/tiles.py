@@ -0,0 +1,275 @@
+"""Deep-zoom tile pyramids of exported pages, rendered band by band and cached on disk."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from pypdf import PdfReader
+
+from core import CompiledLayout, Rect, _rect_from_pypdf_box
+from raster import require_ghostscript
+from strips import read_exact, read_ppm_header, strip_rows
+
+
+TILE_SIZE = 256
+MANIFEST = "pyramid.json"
+
+
+def default_tile_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".pressdrop", "tiles")
+
+
+class _PyramidLevel:
+    """Cut incoming full-width rows into tiles and pass a half-size copy to the next level."""
+
+    def __init__(self, root: str, level: int, width: int, height: int, tile: int):
+        self.dir = os.path.join(root, str(level))
+        os.makedirs(self.dir, exist_ok=True)
+        self.level = level
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.row_bytes = width * 3
+        self.band = 0
+        self._buf = bytearray()
+        self.next = _PyramidLevel(root, level + 1, -(-width // 2), -(-height // 2), tile) if max(width, height) > tile else None
+
+    def _emit(self, data: bytes, rows: int) -> None:
+        img = Image.frombuffer("RGB", (self.width, rows), data, "raw", "RGB", 0, 1)
+        for col, x in enumerate(range(0, self.width, self.tile)):
+            img.crop((x, 0, min(x + self.tile, self.width), rows)).save(
+                os.path.join(self.dir, f"{col}_{self.band}.png"), compress_level=1)
+        self.band += 1
+        if self.next:
+            self.next.write(img.reduce(2).tobytes())
+
+    def write(self, rows) -> None:
+        self._buf += rows
+        band_bytes = self.tile * self.row_bytes
+        while len(self._buf) >= band_bytes:
+            self._emit(bytes(self._buf[:band_bytes]), self.tile)
+            del self._buf[:band_bytes]
+
+    def close(self) -> None:
+        if self._buf:
+            self._emit(bytes(self._buf), len(self._buf) // self.row_bytes)
+            self._buf = bytearray()
+        if self.next:
+            self.next.close()
+
+    def count(self) -> int:
+        return 1 + (self.next.count() if self.next else 0)
+
+
+class PyramidSink:
+    """Strip sink (like strips.PngStripWriter) that writes a tile pyramid into root."""
+
+    def __init__(self, root: str, width: int, height: int, tile: int = TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self._top = _PyramidLevel(root, 0, width, height, tile)
+
+    def write(self, rows) -> None:
+        self._top.write(rows)
+
+    def close(self) -> None:
+        self._top.close()
+
+    @property
+    def levels(self) -> int:
+        return self._top.count()
+
+
+@dataclass(frozen=True)
+class Pyramid:
+    """A built pyramid: level 0 is full resolution, each level above halves it."""
+    root: str
+    width: int
+    height: int
+    dpi: float
+    tile: int
+    levels: int
+    overlays: Dict[str, Tuple[float, float, float, float]]
+
+    @classmethod
+    def load(cls, root: str) -> "Pyramid":
+        with open(os.path.join(root, MANIFEST), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(root, data["width"], data["height"], data["dpi"], data["tile"], data["levels"],
+                   {k: tuple(v) for k, v in data.get("overlays", {}).items()})
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        w, h = self.width, self.height
+        for _ in range(level):
+            w, h = -(-w // 2), -(-h // 2)
+        return w, h
+
+    def level_for(self, zoom: float) -> int:
+        """Coarsest level that still has at least one pixel per screen pixel at zoom (screen px per full-res px)."""
+        if zoom >= 1:
+            return 0
+        return max(0, min(self.levels - 1, int(math.floor(math.log2(1.0 / zoom)))))
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.root, str(level), f"{col}_{row}.png")
+
+    def visible_tiles(self, level: int, x0: float, y0: float, x1: float, y1: float) -> List[Tuple[int, int]]:
+        """(col, row) of the level's tiles overlapping the full-resolution rectangle x0,y0-x1,y1."""
+        scale = 2 ** level
+        w, h = self.level_size(level)
+        c0, c1 = max(0, int(x0 / scale) // self.tile), min(-(-w // self.tile), int(math.ceil(x1 / scale / self.tile)))
+        r0, r1 = max(0, int(y0 / scale) // self.tile), min(-(-h // self.tile), int(math.ceil(y1 / scale / self.tile)))
+        return [(c, r) for r in range(r0, r1) for c in range(c0, c1)]
+
+
+def overlay_boxes(bleed_box: Rect, trim_box: Rect, dpi: float, safe_margin_pt: float = 0.0) -> Dict[str, Tuple[float, float, float, float]]:
+    """Trim (and safe) rectangles in pixels of a page rendered from its bleed box at dpi."""
+    k = dpi / 72.0
+
+    def to_px(r: Rect) -> Tuple[float, float, float, float]:
+        return ((r.x0 - bleed_box.x0) * k, (bleed_box.y1 - r.y1) * k, (r.x1 - bleed_box.x0) * k, (bleed_box.y1 - r.y0) * k)
+
+    boxes = {"bleed": to_px(bleed_box), "trim": to_px(trim_box)}
+    if safe_margin_pt > 0:
+        m = safe_margin_pt
+        boxes["safe"] = to_px(Rect(trim_box.x0 + m, trim_box.y0 + m, trim_box.x1 - m, trim_box.y1 - m))
+    return boxes
+
+
+def build_pyramid(
+    pdf_path: str,
+    page: int,
+    dpi: float,
+    root: str,
+    gs_path: str = "",
+    overlays: Optional[Dict[str, Tuple[float, float, float, float]]] = None,
+    memory_cap_mb: float = 64,
+    tile: int = TILE_SIZE,
+) -> Pyramid:
+    """Render one page (1-based, bleed box) of pdf_path at dpi straight into a tile pyramid in root."""
+    gs_path = require_ghostscript(gs_path)
+    cap = int(memory_cap_mb * 1024 * 1024)
+    args = [
+        gs_path, "-q", "-dSAFER", "-dBATCH", "-dNOPAUSE",
+        "-sDEVICE=ppmraw", f"-r{dpi:g}", "-dUseBleedBox",
+        "-dTextAlphaBits=4", "-dGraphicsAlphaBits=4",
+        f"-dFirstPage={int(page)}", f"-dLastPage={int(page)}",
+        f"-dMaxBitmap={cap // 2}", f"-dBufferSpace={min(cap // 4, 64 * 1024 * 1024)}",
+        "-sOutputFile=-", pdf_path,
+    ]
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=err)
+        try:
+            header = read_ppm_header(proc.stdout)
+            if header is None:
+                raise RuntimeError(f"Ghostscript rendered no page {page} of {pdf_path}")
+            width, height, _ = header
+            sink = PyramidSink(root, width, height, tile)
+            row_bytes = width * 3
+            rows = max(tile, strip_rows(row_bytes, cap))
+            buf = bytearray(rows * row_bytes)
+            done = 0
+            while done < height:
+                n = min(rows, height - done)
+                view = memoryview(buf)[:n * row_bytes]
+                read_exact(proc.stdout, view)
+                sink.write(view)
+                done += n
+            sink.close()
+            proc.stdout.close()
+            code = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if code != 0:
+            err.seek(0)
+            raise RuntimeError(f"Ghostscript failed ({code}): {err.read().decode(errors='replace').strip()}")
+    manifest = {"width": width, "height": height, "dpi": dpi, "tile": tile, "levels": sink.levels,
+                "source": os.path.abspath(pdf_path), "page": page, "overlays": overlays or {}}
+    with open(os.path.join(root, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return Pyramid.load(root)
+
+
+class TileCache:
+    """Pyramids on disk keyed by source file (path, size, mtime), page and DPI, evicted LRU above max_bytes."""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = 2 * 1024 ** 3, gs_path: str = ""):
+        self.root = root or default_tile_dir()
+        self.max_bytes = int(max_bytes)
+        self.gs_path = gs_path
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, pdf_path: str, page: int, dpi: float) -> str:
+        st = os.stat(pdf_path)
+        ident = f"{os.path.abspath(pdf_path)}|{st.st_size}|{st.st_mtime_ns}|{page}|{dpi:g}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+    def pyramid(self, pdf_path: str, page: int, dpi: float, job: Optional[Dict] = None, safe_margin_in: float = 0.125) -> Pyramid:
+        """Open the cached pyramid for a page, building it on first use.
+
+        Overlays come from the job geometry when given, else from the
+        page's own bleed/trim boxes.
+        """
+        root = os.path.join(self.root, self.key(pdf_path, page, dpi))
+        manifest = os.path.join(root, MANIFEST)
+        if os.path.exists(manifest):
+            os.utime(manifest)
+            return Pyramid.load(root)
+        if job:
+            compiled = CompiledLayout.from_layout(job["layout"])
+            bleed_box, trim_box = compiled.bleed_box, compiled.trim_box
+        else:
+            pdf_page = PdfReader(pdf_path).pages[page - 1]
+            bleed_box, trim_box = _rect_from_pypdf_box(pdf_page.bleedbox), _rect_from_pypdf_box(pdf_page.trimbox)
+        tmp = tempfile.mkdtemp(prefix=".build_", dir=self.root)
+        try:
+            build_pyramid(pdf_path, page, dpi, tmp, self.gs_path, overlay_boxes(bleed_box, trim_box, dpi, safe_margin_in * 72.0))
+            os.replace(tmp, root)
+        except OSError:
+            # Another viewer finished the same pyramid first; use theirs.
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(manifest):
+                raise
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=root)
+        return Pyramid.load(root)
+
+    def usage(self) -> List[Tuple[float, int, str]]:
+        """(last opened, bytes, dir) of every cached pyramid."""
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            manifest = os.path.join(path, MANIFEST)
+            if name.startswith(".") or not os.path.exists(manifest):
+                continue
+            size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+            found.append((os.path.getmtime(manifest), size, path))
+        return found
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently opened pyramids until the cache fits max_bytes; returns bytes freed."""
+        entries = sorted(self.usage())
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in entries:
+            if total - freed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            freed += size
+        return freed
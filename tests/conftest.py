@@ -0,0 +1,64 @@
+import os
+import sys
+
+# The modules live flat in src/ and import each other by name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import zlib  # noqa: E402
+
+from pypdf import PdfWriter  # noqa: E402
+from pypdf.generic import DictionaryObject, NameObject, NumberObject, StreamObject  # noqa: E402
+
+from core import _add_indirect, make_job  # noqa: E402
+
+
+def image(data, width, height, colorspace="/DeviceRGB", **extra):
+    """An 8-bit image XObject for image_pdf; extra entries (SMask=..., Mask=...) may hold other images."""
+    return {"data": data, "size": (width, height), "colorspace": colorspace, "extra": extra}
+
+
+def image_pdf(path, pages, page_size=(612, 792)):
+    """Write a PDF with one page per entry of pages, each a list of (image, (x, y, w, h)) draws.
+
+    Every page also fills a small rectangle, so pages without draws still have content.
+    An image used in several draws is written once.
+    """
+    writer = PdfWriter()
+    refs = {}
+
+    def add(spec):
+        if id(spec) not in refs:
+            stream = StreamObject()
+            stream.set_data(zlib.compress(spec["data"]))
+            stream.update({
+                NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+                NameObject("/Width"): NumberObject(spec["size"][0]), NameObject("/Height"): NumberObject(spec["size"][1]),
+                NameObject("/ColorSpace"): NameObject(spec["colorspace"]), NameObject("/BitsPerComponent"): NumberObject(8),
+                NameObject("/Filter"): NameObject("/FlateDecode"),
+            })
+            for key, value in spec["extra"].items():
+                stream[NameObject("/" + key)] = add(value) if isinstance(value, dict) else value
+            refs[id(spec)] = _add_indirect(writer, stream)
+        return refs[id(spec)]
+
+    for draws in pages:
+        page = writer.add_blank_page(*page_size)
+        xobjects = DictionaryObject()
+        ops = [b"0 0 1 rg 10 10 100 100 re f"]
+        for n, (spec, (x, y, w, h)) in enumerate(draws):
+            xobjects[NameObject(f"/Im{n}")] = add(spec)
+            ops.append(b"q %g 0 0 %g %g %g cm /Im%d Do Q" % (w, h, x, y, n))
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+        content = StreamObject()
+        content.set_data(b"\n".join(ops) + b"\n")
+        page[NameObject("/Contents")] = _add_indirect(writer, content)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def press_job(src, out_dir, trim="8.5x11in", bleed="0.125", crop_marks=False, basename="job", **options):
+    """make_job for all pages of src, fitted proportionally to the trim."""
+    return make_job(input_path=str(src), pages_spec="all", pdf_box="auto", trim_size_spec=trim, bleed_spec=bleed,
+                    fit_mode="fit_trim_proportional", anchor="center", crop_marks=crop_marks, out_dir=str(out_dir),
+                    basename=basename, **options)
@@ -0,0 +1,55 @@
+import re
+
+import pytest
+from pypdf import PdfReader
+
+from conftest import image_pdf, press_job
+from core import CROP_MARK_LENGTH, CROP_MARK_NAME, CROP_MARK_OFFSET, CROP_MARK_SLUG, build_press_pdf
+
+PT = 72.0
+CARD_W, CARD_H, BLEED = 3.5 * PT, 2.0 * PT, 0.125 * PT
+
+
+def _build(tmp_path, crop_marks):
+    src = image_pdf(str(tmp_path / "card.pdf"), [[]], page_size=(CARD_W, CARD_H))
+    job = press_job(src, tmp_path / "out", trim="3.5x2in", crop_marks=crop_marks, basename="card")
+    return PdfReader(build_press_pdf(job)[0]).pages[0]
+
+
+def _box(box):
+    return tuple(round(float(v), 3) for v in (box.left, box.bottom, box.right, box.top))
+
+
+def test_boxes_with_crop_marks(tmp_path):
+    page = _build(tmp_path, crop_marks=True)
+    slug = CROP_MARK_SLUG
+    media_w, media_h = CARD_W + 2 * BLEED + 2 * slug, CARD_H + 2 * BLEED + 2 * slug
+    assert _box(page.mediabox) == (0, 0, media_w, media_h)
+    assert _box(page.cropbox) == _box(page.mediabox)
+    assert _box(page.bleedbox) == (slug, slug, media_w - slug, media_h - slug)
+    assert _box(page.trimbox) == (slug + BLEED, slug + BLEED, slug + BLEED + CARD_W, slug + BLEED + CARD_H)
+
+
+def test_marks_sit_in_the_slug(tmp_path):
+    page = _build(tmp_path, crop_marks=True)
+    form = page["/Resources"]["/XObject"][CROP_MARK_NAME].get_object()
+    segments = [tuple(map(float, m)) for m in re.findall(rb"([\d.]+) ([\d.]+) m ([\d.]+) ([\d.]+) l S", form.get_data())]
+    assert len(segments) == 8
+    bl, bb, br, bt = _box(page.bleedbox)
+    tl, tb, tr, tt = _box(page.trimbox)
+    for x0, y0, x1, y1 in segments:
+        if y0 == y1:  # horizontal: on a trim line, starting CROP_MARK_OFFSET outside the bleed
+            assert y0 in (pytest.approx(tb), pytest.approx(tt))
+            assert x0 in (pytest.approx(bl - CROP_MARK_OFFSET), pytest.approx(br + CROP_MARK_OFFSET))
+        else:
+            assert x0 == x1 and x0 in (pytest.approx(tl), pytest.approx(tr))
+            assert y0 in (pytest.approx(bb - CROP_MARK_OFFSET), pytest.approx(bt + CROP_MARK_OFFSET))
+        assert abs(x1 - x0) + abs(y1 - y0) == pytest.approx(CROP_MARK_LENGTH)
+        assert min(x0, x1, y0, y1) >= 0
+
+
+def test_boxes_without_crop_marks(tmp_path):
+    page = _build(tmp_path, crop_marks=False)
+    full = (0, 0, CARD_W + 2 * BLEED, CARD_H + 2 * BLEED)
+    assert _box(page.mediabox) == _box(page.bleedbox) == _box(page.cropbox) == full
+    assert _box(page.trimbox) == (BLEED, BLEED, BLEED + CARD_W, BLEED + CARD_H)
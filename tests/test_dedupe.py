@@ -0,0 +1,45 @@
+import os
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import FloatObject, NameObject, NumberObject
+
+from conftest import image, image_pdf, press_job
+from core import build_press_pdf
+
+
+def _shared_content(pages):
+    """Index groups of output pages that point at the same content object."""
+    groups = {}
+    for n, page in enumerate(pages):
+        groups.setdefault(page.raw_get("/Contents").idnum, []).append(n)
+    return sorted(groups.values())
+
+
+def test_identical_pages_share_content(tmp_path):
+    logo = image(os.urandom(64 * 64 * 3), 64, 64)
+    other = image(os.urandom(64 * 64 * 3), 64, 64)
+    # Pages 0, 1 and 3 draw the same image with byte-identical (but separate) content streams.
+    src = image_pdf(str(tmp_path / "src.pdf"), [[(logo, (100, 100, 200, 200))]] * 2 + [[(other, (100, 100, 200, 200))],
+                                                                                       [(logo, (100, 100, 200, 200))]])
+    job = press_job(src, tmp_path / "out", crop_marks=True, basename="dd")
+    out = build_press_pdf(job)[0]
+    pages = PdfReader(out).pages
+    assert job["report"]["shared_pages"] == 2
+    assert _shared_content(pages) == [[0, 1, 3], [2]]
+    assert pages[0].raw_get("/Resources") == pages[3].raw_get("/Resources")
+
+    plain = press_job(src, tmp_path / "out", crop_marks=True, basename="plain", dedupe_pages=False)
+    assert os.path.getsize(out) < os.path.getsize(build_press_pdf(plain)[0])
+
+
+def test_rotation_and_user_unit_are_not_merged(tmp_path):
+    logo = image(os.urandom(64 * 64 * 3), 64, 64)
+    src = image_pdf(str(tmp_path / "src.pdf"), [[(logo, (100, 100, 200, 200))]] * 4)
+    writer = PdfWriter(clone_from=src)
+    writer.pages[1][NameObject("/Rotate")] = NumberObject(90)
+    writer.pages[2][NameObject("/UserUnit")] = FloatObject(2)
+    writer.write(src)
+    job = press_job(src, tmp_path / "out", basename="rot")
+    pages = PdfReader(build_press_pdf(job)[0]).pages
+    assert job["report"]["shared_pages"] == 1
+    assert _shared_content(pages) == [[0, 3], [1], [2]]
@@ -0,0 +1,44 @@
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, NumberObject
+
+from conftest import image, image_pdf, press_job
+from core import build_press_pdf
+
+SIZE = 1200  # px, drawn 1in wide: 1200 ppi
+
+
+def _masked_pdf(path):
+    """Three 1200 ppi images: one with a soft mask, one with a colour-key mask, one plain."""
+    ramp = bytes(x * 255 // SIZE for x in range(SIZE)) * SIZE
+    rgb = bytes(v for x in ramp[:SIZE] for v in (x, 255 - x, 128)) * SIZE
+    soft = image(rgb, SIZE, SIZE, SMask=image(ramp, SIZE, SIZE, "/DeviceGray"))
+    keyed = image(rgb, SIZE, SIZE, Mask=ArrayObject([NumberObject(0), NumberObject(10)] * 3))
+    plain = image(rgb, SIZE, SIZE)
+    return image_pdf(path, [[(soft, (72, 72, 72, 72)), (keyed, (216, 72, 72, 72)), (plain, (360, 72, 72, 72))]])
+
+
+def test_soft_mask_follows_its_image(tmp_path):
+    src = _masked_pdf(str(tmp_path / "masked.pdf"))
+    job = press_job(src, tmp_path / "out", bleed="0", basename="ds", downsample_ppi=300, downsample_codec="flate")
+    out = build_press_pdf(job)[0]
+    report = job["report"]
+    assert len(report["downsample"]) == 2
+    assert report["downsample_skipped_masked"] == 1
+
+    xobjects = {}
+    page = PdfReader(out).pages[0]
+
+    def walk(resources):
+        for name, ref in resources.get("/XObject", {}).items():
+            obj = ref.get_object()
+            if obj["/Subtype"] == "/Form":
+                walk(obj.get("/Resources", {}))
+            else:
+                xobjects[name] = obj
+    walk(page["/Resources"])
+    soft = next(o for o in xobjects.values() if "/SMask" in o)
+    keyed = next(o for o in xobjects.values() if "/Mask" in o)
+    mask = soft["/SMask"].get_object()
+    assert (soft["/Width"], soft["/Height"]) == (mask["/Width"], mask["/Height"]) == (300, 300)
+    assert len(mask.get_data()) == 300 * 300
+    assert keyed["/Width"] == SIZE
@@ -0,0 +1,53 @@
+import pytest
+
+from history import compute_metrics, format_prometheus
+
+
+def _record(ts, started, duration, pages=2, output_bytes=1_234_567, error=None, stages=None, queue_depth=0):
+    return {"ts": ts, "started": started, "duration": duration, "pages": pages, "output_bytes": output_bytes,
+            "cache_hits": 1, "queue_depth": queue_depth, "error": error, "stages": stages or {}}
+
+
+def test_compute_metrics():
+    records = [
+        _record(100.0, 90.0, 10.0, stages={"build": 6.0, "rasterize": 4.0}, queue_depth=3),
+        _record(130.0, 120.0, 10.0, stages={"build": 5.0}),
+        _record(140.0, 135.0, 5.0, stages={"build": 4.0}, queue_depth=1),
+        _record(150.0, 149.0, 1.0, error="boom", stages={"build": 99.0}),
+    ]
+    m = compute_metrics(records)
+    assert m["jobs_total"] == 4
+    assert m["jobs_failed_total"] == 1
+    assert m["pages_total"] == 6
+    assert m["output_bytes_total"] == 3 * 1_234_567
+    assert m["cache_hits_total"] == 4
+    assert m["job_latency_p50_seconds"] == 10.0
+    assert m["job_latency_p95_seconds"] == pytest.approx(10.0)
+    assert m["pages_per_minute"] == pytest.approx(6 / (50.0 / 60.0))  # ok jobs span 90 .. 140
+    assert m["queue_depth"] == 0 and m["queue_depth_max"] == 3
+    assert m['stage_seconds_total{stage="build"}'] == 15.0  # failed jobs are left out
+    assert m['stage_seconds_total{stage="rasterize"}'] == 4.0
+
+
+def test_compute_metrics_empty():
+    m = compute_metrics([])
+    assert m["jobs_total"] == 0 and m["pages_per_minute"] == 0.0 and m["job_latency_p95_seconds"] == 0.0
+
+
+def test_format_prometheus():
+    text = format_prometheus({
+        "jobs_total": 3.0,
+        "output_bytes_total": 123456789.0,
+        "job_latency_p50_seconds": 1.23456789,
+        "pages_per_minute": float("nan"),
+        'stage_seconds_total{stage="build"}': 2.5,
+        'stage_seconds_total{stage="split"}': 1.0,
+    })
+    lines = text.splitlines()
+    assert "pressdrop_output_bytes_total 123456789" in lines
+    assert "pressdrop_job_latency_p50_seconds 1.23456789" in lines
+    assert "pressdrop_pages_per_minute NaN" in lines
+    assert 'pressdrop_stage_seconds_total{stage="build"} 2.5' in lines
+    assert lines.count("# TYPE pressdrop_stage_seconds_total counter") == 1
+    assert lines.index("# TYPE pressdrop_jobs_total counter") < lines.index("pressdrop_jobs_total 3")
+    assert text.endswith("\n")
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+import jobqueue
+from core import BuildEvent
+from jobqueue import JobQueue, QueueRunner, parse_lane_limits
+
+
+@pytest.fixture
+def builds(tmp_path, monkeypatch):
+    """Replace the press build with a scripted one: hooks[(name, page)] run before that page is placed."""
+    log, hooks, running, peak = [], {}, {}, {}
+    lock = threading.Lock()
+
+    def iter_build(job, stager=None, cancel=None):
+        lane = job.get("lane", "")
+        with lock:
+            running[lane] = running.get(lane, 0) + 1
+            peak[lane] = max(peak.get(lane, 0), running[lane])
+        try:
+            for page in range(job["pages"]):
+                if cancel.is_set():
+                    yield BuildEvent("cancelled")
+                    return
+                log.append((job["name"], page))
+                hooks.get((job["name"], page), lambda: time.sleep(job.get("sleep", 0)))()
+                yield BuildEvent("page_placed", page=page + 1)
+            yield BuildEvent("file_written", path=f"{job['name']}.pdf")
+        finally:
+            with lock:
+                running[lane] -= 1
+
+    monkeypatch.setattr(jobqueue, "iter_build", iter_build)
+    monkeypatch.setattr(jobqueue, "CHECKPOINT_INTERVAL", 0.0)
+    monkeypatch.setenv("PRESSDROP_HISTORY", str(tmp_path / "history.jsonl"))
+    return log, hooks, peak
+
+
+def _job(name, pages, **extra):
+    return {"name": name, "pages": pages, **extra}
+
+
+def test_rush_job_preempts_and_the_paused_job_resumes(tmp_path, builds):
+    log, hooks, _ = builds
+    queue = JobQueue(str(tmp_path / "q.sqlite"))
+    slow = queue.submit(_job("slow", 3), lane="catalog")
+    rush = []
+    hooks[("slow", 0)] = lambda: rush.append(queue.submit(_job("rush", 2), lane="rush"))
+    runner = QueueRunner(queue, workers=1, poll=0.05)
+    runner.run()
+    assert log == [("slow", 0), ("rush", 0), ("rush", 1), ("slow", 1), ("slow", 2)]
+    assert runner.preemptions == 1
+    for job_id, pages in ((slow, 3), (rush[0], 2)):
+        row = queue.get(job_id)
+        assert (row["state"], row["pages_done"]) == ("done", pages)
+
+
+def test_cancelling_a_paused_job(tmp_path, builds):
+    log, hooks, _ = builds
+    queue = JobQueue(str(tmp_path / "q.sqlite"))
+    slow = queue.submit(_job("slow", 3), lane="catalog")
+    states = []
+    hooks[("slow", 0)] = lambda: queue.submit(_job("rush", 2), lane="rush")
+    hooks[("rush", 0)] = lambda: states.append(queue.cancel(slow))
+    QueueRunner(queue, workers=1, poll=0.05).run()
+    assert states == ["paused"]
+    assert log == [("slow", 0), ("rush", 0), ("rush", 1)]
+    row = queue.get(slow)
+    assert (row["state"], row["pages_done"]) == ("cancelled", 1)
+    assert [r["state"] for r in queue.list()] == ["done", "cancelled"]
+
+
+def test_lane_limits(tmp_path, builds):
+    _, _, peak = builds
+    queue = JobQueue(str(tmp_path / "q.sqlite"), lanes=parse_lane_limits("catalog=2"))
+    for n in range(4):
+        queue.submit(_job(f"cat{n}", 3, lane="catalog", sleep=0.02), lane="catalog")
+    for n in range(2):
+        queue.submit(_job(f"wide{n}", 3, lane="wide-format", sleep=0.02), lane="wide-format")
+    QueueRunner(queue, workers=4, poll=0.05).run()
+    assert peak == {"catalog": 2, "wide-format": 1}
+    assert {r["state"] for r in queue.list()} == {"done"}
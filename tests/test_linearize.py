@@ -0,0 +1,55 @@
+import os
+import re
+import shutil
+
+import pytest
+
+import core
+from conftest import image, image_pdf, press_job
+from core import build_press_pdf
+
+FIRST_PAGE_KB = 32
+
+
+def _heavy_pdf(path, pages=4):
+    """Page 1 is a small rectangle; later pages also draw a ~190 KB image of random pixels.
+
+    Random pixels keep the later pages big after the linearizer recompresses.
+    """
+    heavy = [[(image(os.urandom(256 * 256 * 3), 256, 256), (150, 300, 300, 300))] for _ in range(pages - 1)]
+    return image_pdf(path, [[]] + heavy)
+
+
+def _job(src, out_dir, linearize=True):
+    return press_job(src, out_dir, basename="lin", linearize=linearize)
+
+
+@pytest.mark.skipif(not (core.HAS_PIKEPDF or shutil.which("qpdf")), reason="linearizing needs pikepdf or qpdf")
+def test_first_page_objects_come_first(tmp_path):
+    src = str(tmp_path / "src.pdf")
+    _heavy_pdf(src)
+    job = _job(src, str(tmp_path / "out"))
+    out = build_press_pdf(job)[0]
+    assert job["report"]["linearized"] is True
+
+    data = open(out, "rb").read()
+    assert len(data) > 4 * FIRST_PAGE_KB * 1024
+    lin = re.search(rb"/Linearized\s+1(.*?)>>", data[:2048], re.S)
+    assert lin, "no linearization dictionary at the start of the file"
+    first_page_obj = int(re.search(rb"/O\s+(\d+)", lin.group(1)).group(1))
+    end_of_first_page = int(re.search(rb"/E\s+(\d+)", lin.group(1)).group(1))
+    obj_at = re.search(rb"(?<![0-9])%d 0 obj" % first_page_obj, data).start()
+    assert obj_at < end_of_first_page <= FIRST_PAGE_KB * 1024
+
+
+def test_linearizer_failure_keeps_the_build(tmp_path, monkeypatch):
+    def broken(path):
+        raise RuntimeError("qpdf crashed")
+
+    monkeypatch.setattr(core, "linearize_pdf", broken)
+    src = str(tmp_path / "src.pdf")
+    _heavy_pdf(src, pages=1)
+    job = _job(src, str(tmp_path / "out"))
+    out = build_press_pdf(job)[0]
+    assert os.path.getsize(out) > 0
+    assert job["report"]["linearized"] is False
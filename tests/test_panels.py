@@ -0,0 +1,81 @@
+import os
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, ContentStream, DictionaryObject, FloatObject, NameObject, StreamObject
+
+from conftest import _add_indirect, image, image_pdf, press_job
+from core import PANEL_FORM_NAME, build_press_pdf, split_panels_pdf
+
+
+def _trifold(path, pages=1):
+    """11x8.5in pages with one 200 px image of random pixels centred in each third (the same images on every page)."""
+    draws = [(image(os.urandom(200 * 200 * 3), 200, 200), (32 + i * 264, 200, 200, 200)) for i in range(3)]
+    return image_pdf(path, [draws] * pages, page_size=(792, 612))
+
+
+def _wrap_in_form(path):
+    """Move each page's content into a Form XObject that the page draws, as layout apps often export."""
+    writer = PdfWriter(clone_from=path)
+    for page in writer.pages:
+        form = StreamObject()
+        form.set_data(page.get_contents().get_data())
+        form.update({NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Form"),
+                     NameObject("/BBox"): ArrayObject(FloatObject(v) for v in page.mediabox),
+                     NameObject("/Resources"): page["/Resources"]})
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): DictionaryObject(
+            {NameObject("/Fm0"): _add_indirect(writer, form)})})
+        content = StreamObject()
+        content.set_data(b"/Fm0 Do")
+        page[NameObject("/Contents")] = _add_indirect(writer, content)
+    writer.write(path)
+    return path
+
+
+def _drawn(stream):
+    return [operands[0] for operands, op in ContentStream(stream, None).operations if op == b"Do"]
+
+
+def _panel_form(page):
+    ops = page.get_contents().operations
+    assert [op for _, op in ops] == [b"q", b"re", b"W", b"n", b"Do", b"Q"] and ops[4][0] == [PANEL_FORM_NAME]
+    return page["/Resources"]["/XObject"].raw_get(PANEL_FORM_NAME)
+
+
+def _split(tmp_path, src):
+    job = press_job(src, tmp_path / "out", trim="11x8.5in", crop_marks=True, basename="tri")
+    built = build_press_pdf(job)[0]
+    return built, split_panels_pdf(built, 3, margin_in=0.25)
+
+
+def test_panels_carry_only_their_images(tmp_path):
+    built, (panels, safes) = _split(tmp_path, _trifold(str(tmp_path / "tri.pdf")))
+    for path in panels + safes:
+        page = PdfReader(path).pages[0]
+        drawn = _drawn(_panel_form(page).get_object())
+        assert len(page.images) == 1
+        assert "/PDCropMarks" in drawn and len(drawn) == 2
+        assert os.path.getsize(path) < os.path.getsize(built) / 2
+
+
+def test_identical_pages_share_one_panel_form(tmp_path):
+    built, (panels, _) = _split(tmp_path, _trifold(str(tmp_path / "tri.pdf"), pages=3))
+    for path in panels:
+        pages = PdfReader(path).pages
+        assert len(pages) == 3 and len(pages[0].images) == 1
+        assert len({_panel_form(p).idnum for p in pages}) == 1
+        assert len({p.raw_get("/Contents").idnum for p in pages}) == 1
+        assert os.path.getsize(path) < os.path.getsize(built) / 2
+
+
+def test_nested_forms_across_a_fold_are_pruned(tmp_path):
+    built, (panels, safes) = _split(tmp_path, _wrap_in_form(_trifold(str(tmp_path / "tri.pdf"))))
+    outer = PdfReader(built).pages[0]["/Resources"]["/XObject"]
+    assert len(_drawn(outer["/Fm0"].get_object())) == 3  # the source form draws all three images
+    for path in panels + safes:
+        page = PdfReader(path).pages[0]
+        form = _panel_form(page).get_object()
+        assert sorted(_drawn(form)) == ["/Fm0", "/PDCropMarks"]
+        nested = form["/Resources"]["/XObject"]["/Fm0"].get_object()
+        assert len(_drawn(nested)) == 1 and len(nested["/Resources"]["/XObject"]) == 1
+        assert len(page.images) == 1
+        assert os.path.getsize(path) < os.path.getsize(built) / 2
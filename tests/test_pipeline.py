@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import staging
+from conftest import image_pdf, press_job
+from pipeline import MemoryBudget, PressPipeline
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_budget_admits_in_arrival_order():
+    async def scenario():
+        budget = MemoryBudget(100)
+        order = []
+
+        async def job(name, nbytes, hold):
+            reserved = await budget.acquire(nbytes)
+            order.append(name)
+            await hold.wait()
+            await budget.release(reserved)
+
+        holds = {name: asyncio.Event() for name in "abcd"}
+        tasks = [asyncio.create_task(job("a", 60, holds["a"]))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("b", 80, holds["b"])))  # must wait for a
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("c", 10, holds["c"])))  # would fit now, but queues behind b
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["a"] and budget.used == 60
+        holds["a"].set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["a", "b", "c"] and budget.used == 90
+        tasks.append(asyncio.create_task(job("d", 500, holds["d"])))  # bigger than the budget: runs alone
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["a", "b", "c"]
+        holds["b"].set()
+        holds["c"].set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["a", "b", "c", "d"] and budget.used == 100
+        holds["d"].set()
+        await asyncio.gather(*tasks)
+        assert budget.used == 0 and budget.peak == 100
+
+    _run(scenario())
+
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    async def scenario():
+        budget = MemoryBudget(100)
+        first = await budget.acquire(100)
+        stuck = asyncio.create_task(budget.acquire(50))
+        behind = asyncio.create_task(budget.acquire(30))
+        await asyncio.sleep(0)
+        stuck.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await stuck
+        await budget.release(first)
+        assert await asyncio.wait_for(behind, 1) == 30
+        assert budget.used == 30
+
+    _run(scenario())
+
+
+def test_prefetch_wait_is_not_build_time(tmp_path, monkeypatch):
+    srcs = [image_pdf(str(tmp_path / f"in{n}.pdf"), [[]]) for n in range(2)]
+    real_local_copy = staging.InputPrefetcher.local_copy
+
+    def slow_local_copy(self, path, timeout=None):
+        time.sleep(0.3)  # a slow share: the builder is blocked, not working
+        return real_local_copy(self, path, timeout)
+    monkeypatch.setattr(staging.InputPrefetcher, "local_copy", slow_local_copy)
+    pipeline = PressPipeline(prefetch=1, history=False, build_executor=ThreadPoolExecutor(1))
+    results = pipeline.run_sync([press_job(src, tmp_path / "out", basename=f"p{n}") for n, src in enumerate(srcs)])
+    assert [r.error for r in results] == [None, None]
+    for res in results:
+        assert res.timings["build_wait"] >= 0.3
+        assert res.timings["build"] < res.timings["build_wait"]
+    stats = pipeline.stats["build"]
+    assert stats.waited == pytest.approx(sum(r.timings["build_wait"] for r in results))
+    assert stats.busy == pytest.approx(sum(r.timings["build"] for r in results))
+
+
+def test_pipeline_runs_every_stage_and_isolates_failures(tmp_path):
+    srcs = [image_pdf(str(tmp_path / f"in{n}.pdf"), [[]], page_size=(792, 612)) for n in range(3)]
+    jobs = [press_job(src, tmp_path / "out", trim="11x8.5in", basename=f"tri{n}") for n, src in enumerate(srcs)]
+    broken = press_job(srcs[0], tmp_path / "out", trim="11x8.5in", basename="broken")
+    broken["inputs"][0]["path"] = str(tmp_path / "missing.pdf")
+    jobs.insert(1, broken)
+    launched = []
+    pipeline = PressPipeline(panel_count=3, history=False, build_executor=ThreadPoolExecutor(2), build_workers=2,
+                             launch=launched.append)
+    results = pipeline.run_sync(jobs)
+
+    assert [r.job for r in results] == jobs  # results keep the submission order
+    assert results[1].error.startswith("build:") and not results[1].panels
+    ok = [r for r in results if r.error is None]
+    assert len(ok) == 3
+    for res in ok:
+        assert len(res.outputs) == 1 and all(os.path.exists(p) for p in res.outputs + res.panels)
+        assert len(res.panels) == 3
+        assert set(res.timings) >= {"build", "rasterize", "split", "launch"}
+    assert sorted(launched) == sorted(r.outputs[0] for r in ok)
+    assert {name: s.items for name, s in pipeline.stats.items()} == {"build": 4, "rasterize": 3, "split": 3, "launch": 3}
+    assert pipeline.wall > 0 and len(pipeline.utilization_report()) > 1
@@ -0,0 +1,62 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+from conftest import image, image_pdf
+from raster import GhostscriptPool, RasterTarget, export_rasters, rasterize_pdf
+
+# Stands in for a Ghostscript that renders two pages (the second cut to `keep` of its bytes) and exits 1.
+FAILING_GS = """#!{python}
+import sys
+w, h = 40, 30
+page = b"P6\\n%d %d\\n255\\n" % (w, h) + bytes(w * h * 3)
+sys.stdout.buffer.write(page + page[:int(len(page) * {keep})])
+sys.stderr.write("page 2: rangecheck")
+sys.exit(1)
+"""
+
+
+@pytest.mark.parametrize("keep, error", [(0.5, "ended early"), (1, "rangecheck")])
+def test_failed_export_leaves_no_outputs(tmp_path, keep, error):
+    gs = tmp_path / "gs"
+    gs.write_text(FAILING_GS.format(python=sys.executable, keep=keep))
+    gs.chmod(0o755)
+    src = image_pdf(str(tmp_path / "two.pdf"), [[], []])
+    targets = [RasterTarget("png"), RasterTarget("tiff"), RasterTarget("jpeg", suffix="_proof")]
+    with pytest.raises((ValueError, RuntimeError), match=error):
+        export_rasters(src, 5, targets, gs_path=str(gs), panels=[("_left", (0, 0, 4, 11))])
+    assert sorted(os.listdir(tmp_path)) == ["gs", "two.pdf"]
+
+
+def _real_ghostscript():
+    gs = shutil.which("gswin64c") or shutil.which("gswin32c") or shutil.which("gs")
+    if not gs or subprocess.run([gs, "--version"], capture_output=True).returncode != 0:
+        pytest.skip("Ghostscript is not installed")
+    return gs
+
+
+def test_pool_renders_like_a_one_off_ghostscript(tmp_path):
+    gs = _real_ghostscript()
+    logo = image(bytes(range(256)) * 48, 64, 64)
+    src = image_pdf(str(tmp_path / "pool.pdf"), [[(logo, (100, 100, 200, 200))], [], [(logo, (0, 0, 612, 792))]])
+    expected = rasterize_pdf(src, 36, gs)
+    reference = [Image.open(p).tobytes() for p in expected]
+    for path in expected:
+        os.remove(path)
+
+    pool = GhostscriptPool(gs, size=1, max_pages=4)
+    try:
+        for _ in range(3):
+            assert pool.try_render(src, list(enumerate(expected, 1)), 36)
+            assert [Image.open(p).tobytes() for p in expected] == reference
+        bad = tmp_path / "bad.pdf"
+        bad.write_bytes(b"%PDF-1.4\nnot a pdf")
+        assert not pool.try_render(str(bad), [(1, str(tmp_path / "bad.png"))], 36)
+        assert pool.try_render(src, list(enumerate(expected, 1)), 36)  # a fresh worker takes over
+    finally:
+        pool.close()
+    assert pool.renders == 4 and pool.recycled >= 2 and not pool.broken
@@ -0,0 +1,82 @@
+import json
+import os
+import time
+
+import pytest
+
+import spool
+from conftest import image_pdf, press_job
+from pipeline import PressPipeline
+from spool import SpoolWorker, spool_status, submit_job
+
+
+@pytest.fixture(autouse=True)
+def _history(tmp_path, monkeypatch):
+    monkeypatch.setenv("PRESSDROP_HISTORY", str(tmp_path / "history.jsonl"))
+
+
+def _submit(tmp_path, name):
+    src = image_pdf(str(tmp_path / f"{name}.pdf"), [[]])
+    return submit_job(str(tmp_path / "spool"), press_job(src, tmp_path / "out", basename=name))
+
+
+def _doc(tmp_path, state, job_id):
+    with open(tmp_path / "spool" / state / f"{job_id}.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_stale_lease_is_reclaimed_and_finished_by_another_node(tmp_path):
+    job_id = _submit(tmp_path, "card")
+    dead = SpoolWorker(str(tmp_path / "spool"), node="dead")
+    running = dead.claim()
+    os.utime(running, (time.time() - 120, time.time() - 120))  # its node stopped heartbeating
+
+    worker = SpoolWorker(str(tmp_path / "spool"), node="live", lease_s=60, poll_s=0.01)
+    worker.run(until_empty=True)
+    assert worker.reclaimed == 1 and worker.done == 1
+    doc = _doc(tmp_path, "done", job_id)
+    assert doc["node"] == "live" and doc["attempts"] == 1
+    assert doc["outputs"] == [str(tmp_path / "out" / "card.pdf")] and os.path.exists(doc["outputs"][0])
+    assert doc["job"]["output"]["dir"] == str(tmp_path / "out")
+    assert os.listdir(tmp_path / "out") == ["card.pdf"]
+
+
+def test_lost_lease_discards_the_build(tmp_path, monkeypatch):
+    job_id = _submit(tmp_path, "card")
+    worker = SpoolWorker(str(tmp_path / "spool"), node="slow", heartbeat_s=0.01)
+    real_run_sync = PressPipeline.run_sync
+
+    def run_sync(self, jobs):
+        results = real_run_sync(self, jobs)
+        # Meanwhile another node decided this lease had expired and took the job back.
+        (lease,) = os.listdir(tmp_path / "spool" / "running")
+        os.rename(tmp_path / "spool" / "running" / lease, tmp_path / "spool" / "pending" / f"{job_id}.json")
+        time.sleep(0.2)
+        return results
+    monkeypatch.setattr(PressPipeline, "run_sync", run_sync)
+    assert worker.process(worker.claim()) is None
+    assert os.listdir(tmp_path / "out") == []  # nothing published, build folder removed
+    status = spool_status(str(tmp_path / "spool"))
+    assert (status["pending"], status["running"], status["done"]) == (1, 0, 0)
+
+
+def test_unreadable_job_file_fails_without_stopping_the_worker(tmp_path):
+    good = _submit(tmp_path, "card")
+    (tmp_path / "spool" / "pending" / "0-bad.json").write_text('{"id": "0-bad", "job": ')
+    worker = SpoolWorker(str(tmp_path / "spool"), node="n1", poll_s=0.01)
+    worker.run(until_empty=True)
+    assert (worker.done, worker.failed) == (1, 1)
+    assert "unreadable job file" in _doc(tmp_path, "failed", "0-bad")["error"]
+    assert _doc(tmp_path, "done", good)["error"] is None
+    assert os.listdir(tmp_path / "spool" / "running") == []
+
+
+def test_rewrite_never_recreates_a_lost_file(tmp_path):
+    path = str(tmp_path / "lease.json")
+    spool._write_json(path, {"attempts": 0})
+    spool._rewrite_json(path, {"attempts": 1})
+    assert json.load(open(path)) == {"attempts": 1} and os.listdir(tmp_path) == ["lease.json"]
+    os.remove(path)
+    with pytest.raises(FileNotFoundError):
+        spool._rewrite_json(path, {"attempts": 2})
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+import staging
+from staging import InputPrefetcher, OutputStager
+
+
+def test_publish_renames_a_complete_copy_into_place(tmp_path, monkeypatch):
+    dest = tmp_path / "share" / "job.pdf"
+    stager = OutputStager(str(tmp_path / "scratch"))
+    payload = os.urandom(3 * staging.COPY_CHUNK // 2)
+    seen = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        # At the rename the final name does not exist yet and the temp copy is complete.
+        seen.append((os.path.basename(src), os.path.exists(dst), open(src, "rb").read() == payload))
+        real_replace(src, dst)
+    monkeypatch.setattr(staging.os, "replace", replace)
+    try:
+        local = stager.local_path(str(dest), fresh=True)
+        assert stager.is_local(local) and not os.path.exists(dest)
+        with open(local, "wb") as f:
+            f.write(payload)
+        assert stager.publish(local).result() == str(dest)
+        assert stager.wait() == []
+    finally:
+        stager.close()
+    assert seen == [("~$job.pdf.partial.tmp", False, True)]
+    assert dest.read_bytes() == payload
+    assert os.listdir(dest.parent) == ["job.pdf"]
+    assert stager.progress() == (1, 1, len(payload), len(payload))
+
+
+def test_rewrite_while_queued_gets_a_fresh_scratch_path(tmp_path):
+    dest = str(tmp_path / "share" / "job.pdf")
+    stager = OutputStager(str(tmp_path / "scratch"))
+    try:
+        first = stager.local_path(dest, fresh=True)
+        with open(first, "wb") as f:
+            f.write(b"first")
+        stager.publish(first)
+        second = stager.local_path(dest, fresh=True)
+        assert second != first
+        with open(second, "wb") as f:
+            f.write(b"second")
+        stager.publish(second)
+        assert stager.wait() == []
+    finally:
+        stager.close()
+    with open(dest, "rb") as f:
+        assert f.read() == b"second"
+
+
+def _inputs(tmp_path, sizes):
+    paths = []
+    for n, size in enumerate(sizes):
+        path = tmp_path / "share" / f"in{n}.pdf"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(os.urandom(size))
+        paths.append(str(path))
+    return paths
+
+
+def test_prefetch_grants_the_budget_in_batch_order(tmp_path):
+    a, big, b, c = _inputs(tmp_path, [100, 400, 100, 100])
+    prefetcher = InputPrefetcher(str(tmp_path / "scratch"), depth=4, max_bytes=250)
+    try:
+        prefetcher.prefetch([a, big, b, c])
+        local_a = prefetcher.local_copy(a, timeout=5)
+        assert prefetcher.local_copy(big, timeout=5) == big  # larger than the whole budget: read in place
+        local_b = prefetcher.local_copy(b, timeout=5)
+        assert local_a != a and os.path.basename(local_b) == os.path.basename(b)
+        with open(local_b, "rb") as f, open(b, "rb") as src:
+            assert f.read() == src.read()
+        with pytest.raises(TimeoutError):
+            prefetcher.local_copy(c, timeout=0.2)  # a and b hold 200 of 250 bytes
+        prefetcher.release(a)
+        assert not os.path.exists(local_a)
+        assert prefetcher.local_copy(c, timeout=5) != c
+        assert prefetcher.report()["files"] == 3 and prefetcher.report()["skipped"] == 1
+    finally:
+        prefetcher.close()
+
+
+def test_prefetch_reads_in_place_when_the_source_changes(tmp_path, monkeypatch):
+    (src,) = _inputs(tmp_path, [1000])
+    real_stat = os.stat
+    calls = []
+
+    def stat(path, *args, **kwargs):
+        if path == src:
+            calls.append(path)
+            if len(calls) == 2:  # the re-check after copying: another node touched the file meanwhile
+                st = real_stat(path)
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(staging.os, "stat", stat)
+    prefetcher = InputPrefetcher(str(tmp_path / "scratch"), depth=1, max_bytes=10_000)
+    try:
+        assert prefetcher.local_copy(src, timeout=5) == src
+        assert prefetcher._held == 0 and prefetcher.report()["files"] == 0
+        assert os.listdir(os.path.dirname(prefetcher._local_name(src))) == []
+    finally:
+        prefetcher.close()